@@ -0,0 +1,83 @@
+"""
+Cold-start guard for ``import whereshallwemeet.caller``.
+
+Imports the module in fresh interpreters, takes the median cumulative
+import time reported by ``python -X importtime`` and fails (exit code 1)
+if it exceeds the budget or if any of the heavy optional dependencies got
+pulled in on the way.
+
+    python benchmarks/importtime.py --budget 150
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULE = "whereshallwemeet.caller"
+
+# must only be imported once the plotting/geometry helpers are used
+HEAVY = ("plotly", "scipy", "numpy", "shapely", "pointpats", "googlemaps")
+
+
+def importTime(module: str = MODULE) -> float:
+    """
+    Cumulative import time of module in a fresh interpreter, in ms.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if fields[-1] == module:
+            return int(fields[1]) / 1000
+
+    raise RuntimeError(f"{module} not found in -X importtime output.")
+
+
+def heavyImports(module: str = MODULE) -> list[str]:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = result.stdout.split()
+    return [
+        name
+        for name in loaded
+        if name.split(".")[0] in HEAVY and "." not in name
+    ]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=150.0, help="ms")
+    parser.add_argument("--repeat", type=int, default=7)
+    opts = parser.parse_args(args)
+
+    times = [importTime() for _ in range(opts.repeat)]
+    median = statistics.median(times)
+    heavy = heavyImports()
+
+    print(
+        f"import {MODULE}: median {median:.1f} ms "
+        f"(min {min(times):.1f}, max {max(times):.1f}, "
+        f"budget {opts.budget:.0f} ms)"
+    )
+    if heavy:
+        print(f"heavy modules imported eagerly: {', '.join(heavy)}")
+
+    return 0 if (median <= opts.budget) and not heavy else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""
+Offline benchmark of the planning pipeline on synthetic rosters.
+
+The gmaps client is replaced by ReplayClient, which answers without network
+access: directions replay the recorded responses in examples/, distance
+matrices are synthesized from straight-line distances and the average
+speeds of those recordings. Everything is seeded, so runs of different
+versions see the same rosters and the same travel times.
+
+For every roster size and transit mode it times (median over --repeat
+runs) _loadFriends, _friendsMatrix, _json2Matrix and a cold getMatrix,
+and with --memory also their peak traced allocations.
+
+    python benchmarks/pipeline.py --sizes 10 100 1000 5000 --out new.json
+    python benchmarks/pipeline.py --compare old.json
+
+Only the original WhereShallWeMeet internals are used, so the script runs
+against any version of the package.
+"""
+
+import argparse
+import copy
+import csv
+import json
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime as dt
+from math import asin, cos, radians, sin, sqrt
+from typing import Optional
+
+from whereshallwemeet.caller import WhereShallWeMeet
+
+EXAMPLES = pathlib.Path(__file__).resolve().parents[1] / "examples"
+
+MODES = ("transit", "best", "custom")
+PREFERRED = ("transit", "driving", "bicycling", "walking")
+
+# fixed so that cache keys and departure handling are reproducible
+DEPARTURE = dt(2030, 1, 7, 18, 0)
+
+DETOUR = 1.3
+
+EARTH_RADIUS = 6_371_000
+
+# m/s for modes without a recording
+SPEEDS = {"bicycling": 15 / 3.6, "walking": 5 / 3.6}
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle distance in meters.
+    """
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * asin(sqrt(a))
+
+
+def _leg(route: dict) -> dict:
+    return route["legs"][0]
+
+
+class ReplayClient:
+    """
+    Deterministic stand-in for googlemaps.Client. Addresses are "lat,lng"
+    strings; `latency` seconds are slept per request to mimic the network.
+    """
+
+    def __init__(self, latency: float = 0.0):
+
+        with open(EXAMPLES / "home2home.json", "r") as f:
+            transit = json.load(f)
+        with open(EXAMPLES / "directionsResponse.json", "r") as f:
+            driving = json.load(f)["routes"][0]
+        self.routes = {"transit": transit, "driving": driving}
+
+        self.speeds = dict(SPEEDS)
+        for mode, route in self.routes.items():
+            leg = _leg(route)
+            self.speeds[mode] = leg["distance"]["value"] / (
+                DETOUR * leg["duration"]["value"]
+            )
+
+        self.latency = latency
+        self.requests = 0
+        self.elements = 0
+
+    @staticmethod
+    def _coords(address) -> tuple[float, float]:
+        lat, lng = str(address).split(",")
+        return float(lat), float(lng)
+
+    def _element(self, origin, destination, mode) -> dict:
+        meters = DETOUR * haversine(
+            *self._coords(origin), *self._coords(destination)
+        )
+        # a little deterministic noise so that hosts don't tie
+        noise = zlib.crc32(f"{origin}|{destination}|{mode}".encode()) % 120
+        seconds = meters / self.speeds[mode] + noise
+        return {
+            "distance": {"text": "", "value": round(meters)},
+            "duration": {"text": "", "value": round(seconds)},
+            "status": "OK",
+        }
+
+    def distance_matrix(
+        self, origins, destinations, mode="driving", departure_time=None
+    ):
+        if isinstance(origins, str):
+            origins = [origins]
+        if isinstance(destinations, str):
+            destinations = [destinations]
+        time.sleep(self.latency)
+        self.requests += 1
+        self.elements += len(origins) * len(destinations)
+
+        return {
+            "destination_addresses": [str(d) for d in destinations],
+            "origin_addresses": [str(o) for o in origins],
+            "rows": [
+                {"elements": [self._element(o, d, mode) for d in destinations]}
+                for o in origins
+            ],
+            "status": "OK",
+        }
+
+    def directions(
+        self, origin, destination, mode="driving", departure_time=None
+    ):
+        time.sleep(self.latency)
+        self.requests += 1
+
+        route = copy.deepcopy(self.routes.get(mode, self.routes["driving"]))
+        leg = _leg(route)
+        leg["start_address"], leg["end_address"] = origin, destination
+        return [route]
+
+    def geocode(self, address):
+        time.sleep(self.latency)
+        self.requests += 1
+
+        lat, lng = self._coords(address)
+        return [
+            {
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+                "formatted_address": address,
+            }
+        ]
+
+
+def roster(
+    path: pathlib.Path, n: int, hosts: int = 20, seed: int = 0
+) -> pathlib.Path:
+    """
+    Writes a friends csv with n friends living within ~15 km of the
+    recorded transit start, `hosts` of whom can host.
+    """
+    rng = random.Random(seed)
+    with open(EXAMPLES / "home2home.json", "r") as f:
+        center = _leg(json.load(f))["start_location"]
+
+    hostIds = set(rng.sample(range(n), min(hosts, n)))
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["name", "address", "preferredTransitMode", "host", "joins"]
+        )
+        for i in range(n):
+            lat = center["lat"] + rng.uniform(-0.135, 0.135)
+            lng = center["lng"] + rng.uniform(-0.2, 0.2)
+            writer.writerow(
+                [
+                    f"friend{i:05d}",
+                    f"{lat:.6f},{lng:.6f}",
+                    rng.choice(PREFERRED),
+                    "yes" if i in hostIds else "",
+                    "yes",
+                ]
+            )
+
+    return path
+
+
+def measure(fn, memory: bool = False) -> tuple[Optional[float], int]:
+    """
+    Wall time of fn() in seconds (None if it raised, e.g. a phase the
+    measured version gets wrong) and, with memory, its peak traced
+    allocation in bytes.
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        fn()
+        seconds = time.perf_counter() - start
+    except Exception as exc:
+        print(f"failed: {exc!r}", file=sys.stderr)
+        seconds = None
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return seconds, peak
+
+
+def runOnce(friendsFile: str, mode: str, latency: float, memory: bool) -> dict:
+    client = ReplayClient(latency)
+    results = {}
+
+    planner = WhereShallWeMeet(friendsFile)
+    planner._gmaps = client
+    results["_loadFriends"] = measure(planner._loadFriends, memory)
+
+    results["_friendsMatrix"] = measure(
+        lambda: planner._friendsMatrix(mode, DEPARTURE), memory
+    )
+    # older versions return nothing, the fetched matrices are in _DM
+    results["_json2Matrix"] = measure(
+        lambda: [planner._json2Matrix(DM) for DM in planner._DM.values()],
+        memory,
+    )
+
+    planner = WhereShallWeMeet(friendsFile)
+    planner._gmaps = ReplayClient(latency)
+    results["getMatrix"] = measure(
+        lambda: planner.getMatrix(mode, departureTime=DEPARTURE), memory
+    )
+
+    results["requests"] = client.requests
+    results["elements"] = client.elements
+    return results
+
+
+def benchmark(
+    sizes: list[int],
+    modes: tuple[str] = MODES,
+    hosts: int = 20,
+    repeat: int = 3,
+    latency: float = 0.0,
+    memory: bool = False,
+    seed: int = 0,
+) -> list[dict]:
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            friendsFile = roster(
+                pathlib.Path(tmp) / f"friends{n}.csv", n, hosts, seed
+            )
+            for mode in modes:
+                runs = [
+                    runOnce(str(friendsFile), mode, latency, memory)
+                    for _ in range(repeat)
+                ]
+                for phase in (
+                    "_loadFriends",
+                    "_friendsMatrix",
+                    "_json2Matrix",
+                    "getMatrix",
+                ):
+                    seconds = [run[phase][0] for run in runs]
+                    rows.append(
+                        {
+                            "friends": n,
+                            "mode": mode,
+                            "phase": phase,
+                            "seconds": (
+                                None
+                                if None in seconds
+                                else statistics.median(seconds)
+                            ),
+                            "peakBytes": max(run[phase][1] for run in runs),
+                            "requests": runs[0]["requests"],
+                            "elements": runs[0]["elements"],
+                        }
+                    )
+
+    return rows
+
+
+def report(rows: list[dict], baseline: list[dict] = None) -> str:
+    before = {}
+    for row in baseline or []:
+        before[(row["friends"], row["mode"], row["phase"])] = row
+
+    lines = [
+        f"{'friends':>8} {'mode':<8} {'phase':<15} {'ms':>10} "
+        f"{'peak MiB':>9} {'elements':>9}"
+        + (f" {'vs base':>8}" if baseline else "")
+    ]
+    for row in rows:
+        ms = (
+            f"{'failed':>10}"
+            if row["seconds"] is None
+            else f"{1000 * row['seconds']:>10.2f}"
+        )
+        line = (
+            f"{row['friends']:>8} {row['mode']:<8} {row['phase']:<15} {ms} "
+            f"{row['peakBytes'] / 2**20:>9.2f} {row['elements']:>9}"
+        )
+        old = before.get((row["friends"], row["mode"], row["phase"]))
+        if row["seconds"] is not None and old and old["seconds"]:
+            line += f" {row['seconds'] / old['seconds']:>7.2f}x"
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument("--modes", nargs="+", default=list(MODES))
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per request"
+    )
+    parser.add_argument(
+        "--memory", action="store_true", help="trace peak allocations"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as json")
+    parser.add_argument("--compare", help="json of an earlier run")
+    opts = parser.parse_args(args)
+
+    rows = benchmark(
+        opts.sizes,
+        modes=tuple(opts.modes),
+        hosts=opts.hosts,
+        repeat=opts.repeat,
+        latency=opts.latency,
+        memory=opts.memory,
+        seed=opts.seed,
+    )
+
+    baseline = None
+    if opts.compare:
+        with open(opts.compare, "r") as f:
+            baseline = json.load(f)["results"]
+    print(report(rows, baseline))
+
+    if opts.out:
+        with open(opts.out, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "options": vars(opts),
+                    "results": rows,
+                },
+                f,
+                indent=2,
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
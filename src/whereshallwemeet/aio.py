@@ -0,0 +1,515 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from typing import Union
+
+from . import snapshot
+from .caller import WhereShallWeMeet
+from .completion import Completion
+from .heatmap import Surface
+from .matrix import asList, buildResponse
+from .routes import Route
+from .scenarios import VenueOutlook
+from .solver import HostScore, SweepResult
+from .utils import defaultDeparture
+
+
+class AsyncWhereShallWeMeet(WhereShallWeMeet):
+    """
+    asyncio flavour of WhereShallWeMeet: `await getMatrix(...)`.
+
+    All matrices of a request (one per mode, one per tile) are issued
+    concurrently on the running event loop. The googlemaps client itself is
+    blocking, so its calls are handed to the loop's default executor, and at
+    most `maxWorkers` of them are in flight per instance.
+
+    Every public method of WhereShallWeMeet is a coroutine here. Searches
+    driven by a blocking loop (sweep, searchVenues, heatmap,
+    approximateHosts) run that loop in a thread of their own, its requests
+    are still made on the event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._slots = None
+        # coroutines sharing an instance fetch a stale matrix only once
+        self._matrixLock = None
+
+    async def _call(self, fn, *args, **kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxWorkers)
+
+        async with self._slots:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _inThread(self, fn, *args, **kwargs):
+        # a thread of its own: blocked on _fromThread calls, it must not
+        # take one of the default executor's threads those calls need
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return await loop.run_in_executor(
+                pool, functools.partial(fn, *args, **kwargs)
+            )
+
+    def _fromThread(self, coroutineFunction):
+        """
+        Blocking version of a coroutine function for code running in
+        _inThread: its coroutines run on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(
+                coroutineFunction(*args, **kwargs), loop
+            ).result()
+
+        return call
+
+    async def _updateMatrix(
+        self,
+        mode: str,
+        startAddresses: list[str],
+        potentialHosts: list[str],
+        departureTime: dt,
+        force=False,
+    ) -> dict:
+
+        have, blocks = self._missingBlocks(
+            mode, startAddresses, potentialHosts, departureTime, force
+        )
+        responses = await asyncio.gather(
+            *(
+                self._getDistMatrix(
+                    startAddresses=blockOrigins,
+                    destinationAddresses=blockDestinations,
+                    transitMode=mode,
+                    departureTime=departureTime,
+                    force=force,
+                )
+                for blockOrigins, blockDestinations in blocks
+            )
+        )
+
+        return self._mergeBlocks(
+            startAddresses, potentialHosts, have, blocks, responses
+        )
+
+    async def _friendsMatrix(
+        self, transitMode: str, departureTime: dt, force=False
+    ) -> tuple[str]:
+
+        requests, potentialHosts, stale = self._staleMatrices(
+            transitMode, departureTime, force
+        )
+        dms = await asyncio.gather(
+            *(
+                self._updateMatrix(
+                    mode,
+                    requests[mode][1],
+                    potentialHosts,
+                    departureTime,
+                    force,
+                )
+                for mode in stale
+            )
+        )
+
+        return self._storeMatrices(
+            requests, potentialHosts, departureTime, stale, dms
+        )
+
+    async def getMatrix(
+        self,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        force=False,
+    ):
+
+        departureTime = defaultDeparture(departureTime)
+        if self._matrixLock is None:
+            self._matrixLock = asyncio.Lock()
+
+        async with self._matrixLock:
+            modes = await self._friendsMatrix(
+                transitMode=transitMode,
+                departureTime=departureTime,
+                force=force,
+            )
+
+            with self.metrics.phase("assemble"):
+                return self._assembleMatrix(modes, objective=objective)
+
+    async def bestHosts(
+        self,
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        force=False,
+    ) -> list[HostScore]:
+
+        Mbest, _ = await self.getMatrix(
+            transitMode=transitMode,
+            departureTime=departureTime,
+            objective=objective,
+            force=force,
+        )
+
+        return self._bestHosts(Mbest, k, rankBy, weights)
+
+    async def robustHosts(
+        self,
+        attendance: dict = None,
+        availability: dict = None,
+        k: int = 3,
+        by: Union[str, float] = "expected",
+        nScenarios: int = 1000,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        percentiles: tuple[float] = (50, 90),
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        seed: int = None,
+        processes: int = None,
+    ) -> list[VenueOutlook]:
+
+        self._checkBy(by, percentiles)
+        Mbest, _ = await self.getMatrix(
+            transitMode=transitMode,
+            departureTime=departureTime,
+            objective=objective,
+        )
+
+        # simulating takes a while (and maybe a process pool)
+        return await self._inThread(
+            self._robustHosts,
+            Mbest,
+            attendance=attendance,
+            availability=availability,
+            k=k,
+            by=by,
+            nScenarios=nScenarios,
+            rankBy=rankBy,
+            weights=weights,
+            percentiles=percentiles,
+            seed=seed,
+            processes=processes,
+        )
+
+    async def approximateHosts(
+        self,
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        sample: float = 0.1,
+        maxElements: int = None,
+        confidence: float = 0.95,
+        rank: int = 1,
+        batchSize: int = None,
+        seed: int = None,
+    ) -> tuple[list[HostScore], Completion]:
+
+        requests, potentialHosts = self._matrixRequests(transitMode)
+        homes = await self._getLocation(
+            [friend.address for friend in self.friends]
+        )
+
+        return await self._inThread(
+            self._approximateHosts,
+            homes,
+            requests,
+            potentialHosts,
+            self._fromThread(self._getDistMatrix),
+            k=k,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            sample=sample,
+            maxElements=maxElements,
+            confidence=confidence,
+            rank=rank,
+            batchSize=batchSize,
+            seed=seed,
+        )
+
+    async def sweep(
+        self,
+        departureTimes: list[Union[str, dt]],
+        transitModes: tuple[str] = ("transit",),
+        rankBy: str = "minisum",
+        weights: dict = None,
+        objective="duration",
+        force=False,
+    ) -> SweepResult:
+
+        return await self._inThread(
+            self._sweep,
+            departureTimes,
+            transitModes,
+            self._fromThread(self._getDistMatrix),
+            rankBy=rankBy,
+            weights=weights,
+            objective=objective,
+            force=force,
+        )
+
+    async def searchVenues(
+        self,
+        venues: list[tuple[float, float]] = None,
+        nSamples: int = 50,
+        k: int = 1,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        batchSize: int = 10,
+    ) -> list[HostScore]:
+
+        requests, _ = self._matrixRequests(transitMode)
+        homes = await self._getLocation(
+            [friend.address for friend in self.friends]
+        )
+
+        return await self._inThread(
+            self._searchVenues,
+            homes,
+            requests,
+            self._fromThread(self._getDistMatrix),
+            venues=venues,
+            nSamples=nSamples,
+            k=k,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            batchSize=batchSize,
+        )
+
+    async def heatmap(
+        self,
+        resolution: int = 200,
+        maxElements: int = 5000,
+        initial: int = 6,
+        maxDepth: int = 4,
+        tolerance: float = 0.1,
+        keep: float = 0.5,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        batchSize: int = 25,
+    ) -> Surface:
+
+        requests, _ = self._matrixRequests(transitMode)
+        homes = await self._getLocation(
+            [friend.address for friend in self.friends]
+        )
+
+        return await self._inThread(
+            self._heatmap,
+            homes,
+            requests,
+            self._fromThread(self._getDistMatrix),
+            resolution=resolution,
+            maxElements=maxElements,
+            initial=initial,
+            maxDepth=maxDepth,
+            tolerance=tolerance,
+            keep=keep,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            batchSize=batchSize,
+        )
+
+    async def saveSnapshot(
+        self,
+        path: str,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        force=False,
+    ):
+        await self.getMatrix(
+            transitMode=transitMode, departureTime=departureTime, force=force
+        )
+        # nothing awaited since, so these are the matrices just assembled
+        tensor = self._parsed[1]
+        await asyncio.to_thread(snapshot.save, tensor, path)
+
+    async def _getDirections(
+        self,
+        startAddress: str,
+        destinationAddress: str,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+    ) -> tuple[Route, float]:
+
+        departureTime = defaultDeparture(departureTime)
+
+        return self._route(
+            await self._call(
+                self._directions,
+                startAddress,
+                destinationAddress,
+                transitMode,
+                departureTime,
+            )
+        )
+
+    async def routes(
+        self,
+        hosts: list,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        names: list[str] = None,
+    ) -> dict:
+
+        departureTime = defaultDeparture(departureTime)
+        requests = self._routeRequests(hosts, transitMode, names=names)
+
+        fetched = await asyncio.gather(
+            *(
+                self._getDirections(
+                    startAddress,
+                    hostAddress,
+                    transitMode=mode,
+                    departureTime=departureTime,
+                )
+                for _, _, startAddress, hostAddress, mode in requests
+            )
+        )
+
+        return self._routesByHost(requests, [route for route, _ in fetched])
+
+    async def _getDistMatrix(
+        self,
+        startAddresses: Union[str, list[str]],
+        destinationAddresses: Union[str, list[str]],
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        force=False,
+    ) -> dict:
+
+        departureTime = defaultDeparture(departureTime)
+
+        # may need to geocode, which blocks
+        origins, destinations, expand = await self._call(
+            self._dedupe, asList(startAddresses), asList(destinationAddresses)
+        )
+
+        return expand(
+            await self._cachedDistMatrix(
+                origins,
+                destinations,
+                transitMode=transitMode,
+                departureTime=departureTime,
+                force=force,
+            )
+        )
+
+    async def _cachedDistMatrix(
+        self,
+        startAddresses: list[str],
+        destinationAddresses: list[str],
+        transitMode: str,
+        departureTime: Union[str, dt],
+        force=False,
+    ) -> dict:
+
+        if self.cache is None:
+            return await self._fetchDistMatrix(
+                startAddresses,
+                destinationAddresses,
+                transitMode=transitMode,
+                departureTime=departureTime,
+            )
+
+        origins = asList(startAddresses)
+        destinations = asList(destinationAddresses)
+
+        cacheMode = self.backend.cacheKey(transitMode)
+        # sqlite blocks; forced: fetch everything again
+        lookup = (
+            {}
+            if force
+            else await self._call(
+                self.cache.get, origins, destinations, cacheMode, departureTime
+            )
+        )
+        blocks = self._cacheMisses(origins, destinations, lookup)
+        fetched = self._blockElements(
+            blocks,
+            await asyncio.gather(
+                *(
+                    self._fetchDistMatrix(
+                        blockOrigins,
+                        blockDestinations,
+                        transitMode=transitMode,
+                        departureTime=departureTime,
+                    )
+                    for blockOrigins, blockDestinations in blocks
+                )
+            ),
+        )
+        if fetched:
+            await self._call(self.cache.put, fetched, cacheMode, departureTime)
+        lookup.update(fetched)
+
+        return buildResponse(origins, destinations, lookup)
+
+    async def _fetchDistMatrix(
+        self,
+        startAddresses: Union[str, list[str]],
+        destinationAddresses: Union[str, list[str]],
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+    ) -> dict:
+
+        departureTime = defaultDeparture(departureTime)
+
+        origins = asList(startAddresses)
+        destinations = asList(destinationAddresses)
+
+        tileSlices = self._tiles(origins, destinations)
+        responses = await asyncio.gather(
+            *(
+                self._call(
+                    self._fetchTile,
+                    origins[oSlice],
+                    destinations[dSlice],
+                    transitMode,
+                    departureTime,
+                )
+                for oSlice, dSlice in tileSlices
+            )
+        )
+
+        return self._stitchTiles(origins, destinations, tileSlices, responses)
+
+    async def _getLocation(self, addresses) -> list[tuple[float, float]]:
+        if self.geocodeCache is not None:
+            return await self._call(super()._getLocation, addresses)
+
+        unique = list(dict.fromkeys(addresses))
+        locations = dict(
+            zip(
+                unique,
+                await asyncio.gather(
+                    *(self._call(self._geocode, addy) for addy in unique)
+                ),
+            )
+        )
+        return [locations[addy] for addy in addresses]
@@ -0,0 +1,431 @@
+"""
+Where travel times come from.
+
+WhereShallWeMeet talks to a Backend instead of the googlemaps client
+directly. Every backend answers distance matrix, directions and geocoding
+requests in the layout of the Google APIs, so everything downstream
+(caching, tiling, _json2Matrix, getMatrix) works unchanged:
+
+- GoogleBackend asks the Google Maps APIs (the default), through one
+  sharedClient per API key.
+- SpeedModelBackend estimates from straight-line distance and a per-mode
+  speed, free and instantaneous.
+- GraphBackend runs shortest paths on a local road/transit graph.
+
+The offline backends need coordinates: locations can be given as (lat, lng)
+tuples or "lat,lng" strings, looked up in a `locations` dict, or resolved
+by an optional `geocoder` backend.
+"""
+
+import heapq
+import json
+import threading
+from datetime import datetime as dt
+from math import inf
+from typing import Union
+
+from .candidates import haversine
+from .geocode import Place
+from .grid import GridIndex
+from .matrix import GOOGLE_LIMITS
+
+# rough average door-to-door speeds in m/s
+SPEEDS = {
+    "driving": 50 / 3.6,
+    "transit": 30 / 3.6,
+    "bicycling": 15 / 3.6,
+    "walking": 5 / 3.6,
+}
+
+# roads and rails are not straight lines
+DETOUR = 1.3
+
+# speed for getting from a location to the nearest graph node, in m/s
+ACCESS_SPEED = 5 / 3.6
+
+
+def element(seconds: float, meters: float) -> dict:
+    if seconds == inf:
+        return {"status": "ZERO_RESULTS"}
+
+    return {
+        "distance": {
+            "text": f"{meters / 1000:.1f} km",
+            "value": round(meters),
+        },
+        "duration": {
+            "text": f"{seconds / 60:.0f} mins",
+            "value": round(seconds),
+        },
+        "status": "OK",
+    }
+
+
+def parseLatLng(location) -> Union[tuple[float, float], None]:
+    if isinstance(location, (tuple, list)) and len(location) == 2:
+        return float(location[0]), float(location[1])
+    try:
+        lat, lng = str(location).split(",")
+        return float(lat), float(lng)
+    except ValueError:
+        return None
+
+
+class Backend:
+    # tells cached elements of different backends apart
+    name = None
+
+    # estimated USD per billed unit (matrix element or request) per API
+    prices = {}
+
+    # per-request matrix.Limits, larger matrices are tiled; None asks for
+    # whole matrices, e.g. GraphBackend runs one search per destination
+    limits = None
+
+    def cacheKey(self, mode: str) -> str:
+        return mode if self.name is None else f"{self.name}:{mode}"
+
+    @property
+    def source(self):
+        """
+        Whatever answers the requests; identical requests in flight to the
+        same source are only sent once.
+        """
+        return self
+
+    def distanceMatrix(
+        self,
+        origins: list,
+        destinations: list,
+        mode: str = "transit",
+        departureTime: Union[str, dt] = "now",
+    ) -> dict:
+        raise NotImplementedError
+
+    def directions(
+        self,
+        origin,
+        destination,
+        mode: str = "transit",
+        departureTime: Union[str, dt] = "now",
+    ) -> list[dict]:
+        raise NotImplementedError
+
+    def geocode(self, address: str) -> tuple[float, float]:
+        raise NotImplementedError
+
+    def place(self, address: str) -> Place:
+        lat, lng = self.geocode(address)
+        return Place(None, lat, lng, str(address))
+
+
+# seconds the googlemaps client keeps retrying 5xx answers on its own;
+# everything else is retried by the Scheduler only
+CLIENT_RETRY_TIMEOUT = 1
+
+# API key -> googlemaps client, see sharedClient
+_clients = {}
+_clientsLock = threading.Lock()
+
+
+def sharedClient(key: str, poolSize: int = 10) -> "googlemaps.Client":
+    """
+    The googlemaps client of an API key, created once per process, so that
+    every planner shares its HTTP connection pool and client-side rate
+    limit. The pool keeps at least poolSize connections.
+
+    The client gives up on rate limits and errors at once, so that they
+    reach the Scheduler's retries and backoff instead of being retried
+    twice.
+    """
+    with _clientsLock:
+        client, size = _clients.get(key, (None, 0))
+        if client is None:
+            import googlemaps
+            import requests
+
+            client = googlemaps.Client(
+                key=key,
+                requests_session=requests.Session(),
+                retry_timeout=CLIENT_RETRY_TIMEOUT,
+                retry_over_query_limit=False,
+            )
+        if size < poolSize:
+            from requests.adapters import HTTPAdapter
+
+            client.session.mount(
+                "https://", HTTPAdapter(pool_maxsize=poolSize)
+            )
+            size = poolSize
+        _clients[key] = (client, size)
+
+    return client
+
+
+class GoogleBackend(Backend):
+    # basic tier list prices (per element for the distance matrix)
+    prices = {"distance_matrix": 0.005, "directions": 0.005, "geocode": 0.005}
+
+    limits = GOOGLE_LIMITS
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def source(self):
+        return self.client
+
+    def distanceMatrix(
+        self, origins, destinations, mode="transit", departureTime="now"
+    ):
+        return self.client.distance_matrix(
+            origins, destinations, mode=mode, departure_time=departureTime
+        )
+
+    def directions(
+        self, origin, destination, mode="transit", departureTime="now"
+    ):
+        return self.client.directions(
+            origin, destination, mode=mode, departure_time=departureTime
+        )
+
+    def geocode(self, address):
+        place = self.place(address)
+        return place.lat, place.lng
+
+    def place(self, address):
+        results = self.client.geocode(address)
+        if not results:
+            raise ValueError(f"No location found for {address!r}.")
+
+        result = results[0]
+        location = result["geometry"]["location"]
+        return Place(
+            result.get("place_id"),
+            location["lat"],
+            location["lng"],
+            result.get("formatted_address", address),
+        )
+
+
+class _OfflineBackend(Backend):
+    def __init__(self, locations: dict = None, geocoder: Backend = None):
+        self.locations = dict(locations or {})
+        self.geocoder = geocoder
+
+    def geocode(self, address):
+        if isinstance(address, list):
+            address = tuple(address)
+        if address in self.locations:
+            return self.locations[address]
+
+        location = parseLatLng(address)
+        if location is None:
+            if self.geocoder is None:
+                raise ValueError(
+                    f"No coordinates for {address}, pass them in locations "
+                    "or give the backend a geocoder."
+                )
+            location = self.geocoder.geocode(address)
+
+        self.locations[address] = location
+        return location
+
+    def _route(self, origin, destination, mode, departureTime) -> list[dict]:
+        elem = self.distanceMatrix(
+            [origin], [destination], mode, departureTime
+        )["rows"][0]["elements"][0]
+        if elem["status"] != "OK":
+            return []
+
+        start = self.geocode(origin)
+        end = self.geocode(destination)
+        return [
+            {
+                "legs": [
+                    {
+                        "distance": elem["distance"],
+                        "duration": elem["duration"],
+                        "start_address": str(origin),
+                        "end_address": str(destination),
+                        "start_location": {"lat": start[0], "lng": start[1]},
+                        "end_location": {"lat": end[0], "lng": end[1]},
+                        "steps": [],
+                    }
+                ],
+                "summary": self.name,
+            }
+        ]
+
+    def directions(
+        self, origin, destination, mode="transit", departureTime="now"
+    ):
+        return self._route(origin, destination, mode, departureTime)
+
+
+class SpeedModelBackend(_OfflineBackend):
+    """
+    Travel time = DETOUR x great-circle distance / speed of the mode.
+    """
+
+    name = "speed"
+
+    def __init__(
+        self,
+        speeds: dict = None,
+        detour: float = DETOUR,
+        locations: dict = None,
+        geocoder: Backend = None,
+    ):
+        super().__init__(locations=locations, geocoder=geocoder)
+
+        self.speeds = dict(SPEEDS, **(speeds or {}))
+        self.detour = detour
+
+    def distanceMatrix(
+        self, origins, destinations, mode="transit", departureTime="now"
+    ):
+        speed = self.speeds[mode]
+        starts = [self.geocode(o) for o in origins]
+        ends = [self.geocode(d) for d in destinations]
+
+        rows = []
+        for start in starts:
+            meters = [self.detour * haversine(*start, *end) for end in ends]
+            rows.append({"elements": [element(m / speed, m) for m in meters]})
+
+        return {
+            "destination_addresses": [str(d) for d in destinations],
+            "origin_addresses": [str(o) for o in origins],
+            "rows": rows,
+            "status": "OK",
+        }
+
+
+class GraphBackend(_OfflineBackend):
+    """
+    Shortest travel times on a local graph, loaded with fromFile from json:
+
+        {"nodes": {"id": [lat, lng], ...},
+         "edges": [{"from": "id", "to": "id", "seconds": 60,
+                    "meters": 800, "modes": ["driving"], "oneway": false},
+                   ...]}
+
+    Edges without "modes" are usable by every mode and edges without
+    "meters" get the great-circle distance between their nodes. Locations
+    are snapped to the nearest node, walking the straight line to it.
+
+    One Dijkstra run per destination on the reversed graph answers all
+    origins at once, so a matrix costs len(destinations) searches.
+    """
+
+    name = "graph"
+
+    def __init__(
+        self,
+        nodes: dict,
+        edges: list[dict],
+        accessSpeed: float = ACCESS_SPEED,
+        locations: dict = None,
+        geocoder: Backend = None,
+    ):
+        super().__init__(locations=locations, geocoder=geocoder)
+
+        self.accessSpeed = accessSpeed
+        self.nodeIds = list(nodes)
+        self.nodeCoords = [tuple(nodes[n]) for n in self.nodeIds]
+        nodeIndex = {n: i for i, n in enumerate(self.nodeIds)}
+
+        # reversed adjacency per mode: reverse[mode][v] = [(u, s, m), ...]
+        self._edges = []
+        for edge in edges:
+            u, v = nodeIndex[edge["from"]], nodeIndex[edge["to"]]
+            meters = edge.get("meters")
+            if meters is None:
+                meters = haversine(*self.nodeCoords[u], *self.nodeCoords[v])
+            modes = edge.get("modes")
+            self._edges.append((u, v, edge["seconds"], meters, modes))
+            if not edge.get("oneway", False):
+                self._edges.append((v, u, edge["seconds"], meters, modes))
+        self._reverse = {}
+
+        self._grid = GridIndex(self.nodeCoords)
+        self._snapped = {}
+
+    @classmethod
+    def fromFile(cls, path: str, **kwargs) -> "GraphBackend":
+        with open(path, "r") as f:
+            graph = json.load(f)
+
+        return cls(graph["nodes"], graph["edges"], **kwargs)
+
+    def _reversed(self, mode: str) -> list[list[tuple]]:
+        if mode not in self._reverse:
+            adjacency = [[] for _ in self.nodeIds]
+            for u, v, seconds, meters, modes in self._edges:
+                if (modes is None) or (mode in modes):
+                    adjacency[v].append((u, seconds, meters))
+            self._reverse[mode] = adjacency
+
+        return self._reverse[mode]
+
+    def _snap(self, location) -> tuple[int, float, float]:
+        """
+        Nearest node of a location and the time and distance to reach it.
+        """
+        key = str(location)
+        if key not in self._snapped:
+            coords = self.geocode(location)
+            node = self._grid.nearest([coords])[0]
+            meters = haversine(*coords, *self.nodeCoords[node])
+            self._snapped[key] = (node, meters / self.accessSpeed, meters)
+
+        return self._snapped[key]
+
+    def _toTarget(self, target: int, mode: str) -> tuple[list, list]:
+        """
+        Dijkstra towards target: fastest time and its distance from every
+        node.
+        """
+        adjacency = self._reversed(mode)
+        seconds = [inf] * len(self.nodeIds)
+        meters = [inf] * len(self.nodeIds)
+        seconds[target], meters[target] = 0, 0
+        heap = [(0, target)]
+        while heap:
+            s, v = heapq.heappop(heap)
+            if s > seconds[v]:
+                continue
+            for u, es, em in adjacency[v]:
+                if s + es < seconds[u]:
+                    seconds[u] = s + es
+                    meters[u] = meters[v] + em
+                    heapq.heappush(heap, (seconds[u], u))
+
+        return seconds, meters
+
+    def distanceMatrix(
+        self, origins, destinations, mode="transit", departureTime="now"
+    ):
+        starts = [self._snap(o) for o in origins]
+
+        columns = []
+        for destination in destinations:
+            node, accessSeconds, accessMeters = self._snap(destination)
+            seconds, meters = self._toTarget(node, mode)
+            columns.append(
+                [
+                    element(
+                        s0 + seconds[n] + accessSeconds,
+                        m0 + meters[n] + accessMeters,
+                    )
+                    for n, s0, m0 in starts
+                ]
+            )
+
+        return {
+            "destination_addresses": [str(d) for d in destinations],
+            "origin_addresses": [str(o) for o in origins],
+            "rows": [{"elements": list(row)} for row in zip(*columns)],
+            "status": "OK",
+        }
@@ -0,0 +1,165 @@
+"""
+Plans many groups at once (e.g. one dinner per team) against a single
+shared element cache and backend.
+
+All groups' (origin, host) pairs are collected per mode first, so a pair
+that shows up in several groups is fetched once; the fetched elements land
+in the shared cache, from which every group's getMatrix is then served.
+"""
+
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from typing import NamedTuple, Union
+
+from .backends import Backend
+from .cache import MatrixCache
+from .caller import WhereShallWeMeet
+from .matrix import pairBlocks
+from .metrics import Metrics
+from .scheduler import BATCH, Scheduler
+from .solver import HostRanker, HostScore
+from .utils import defaultDeparture
+
+
+class GroupPlan(NamedTuple):
+    Mbest: list[list]
+    bestmode: list[list[str]]
+    ranking: list[HostScore]
+
+
+class BatchPlanner:
+    def __init__(
+        self,
+        groups: dict,
+        configPath: str = None,
+        cache: Union[str, MatrixCache] = None,
+        backend: Backend = None,
+        maxWorkers: int = 8,
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        priority: int = BATCH,
+    ):
+        """
+        groups maps a group name to a friends file or a WhereShallWeMeet
+        instance. Instances are switched over to the shared cache, backend,
+        metrics and scheduler, and their requests queue in the `priority`
+        lane (behind interactive ones by default).
+        """
+        if cache is None:
+            cache = MatrixCache()
+        elif isinstance(cache, (str, pathlib.Path)):
+            cache = MatrixCache(cache)
+        self.cache = cache
+        self.maxWorkers = maxWorkers
+        # one bound on requests in flight across all groups and pools
+        self._inFlight = threading.BoundedSemaphore(maxWorkers)
+        self.metrics = Metrics() if metrics is None else metrics
+        self.scheduler = Scheduler() if scheduler is None else scheduler
+
+        self.groups = {}
+        for name, group in groups.items():
+            if not isinstance(group, WhereShallWeMeet):
+                group = WhereShallWeMeet(
+                    friendsFile=group,
+                    configPath=configPath,
+                    maxWorkers=maxWorkers,
+                )
+            group.cache = self.cache
+            group.metrics = self.metrics
+            group.scheduler = self.scheduler
+            group._inFlight = self._inFlight
+            group.priority = priority
+            self.groups[name] = group
+
+        self._backend = backend
+
+    @property
+    def backend(self) -> Backend:
+
+        # one client (and connection pool) for all groups
+        if self._backend is None:
+            self._backend = next(iter(self.groups.values())).backend
+        for group in self.groups.values():
+            group._backend = self._backend
+
+        return self._backend
+
+    def prefetch(
+        self,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+    ) -> int:
+        """
+        Fetches every distinct (origin, host) pair all groups need for
+        transitMode into the shared cache. Returns the number of pairs.
+        """
+        departureTime = defaultDeparture(departureTime)
+        self.backend
+
+        needed = {}
+        for group in self.groups.values():
+            requests, potentialHosts = group._matrixRequests(transitMode)
+            for mode, (_, startAddresses) in requests.items():
+                for origin in startAddresses:
+                    needed.setdefault(mode, {}).setdefault(
+                        origin, set()
+                    ).update(potentialHosts)
+
+        # the cache-aware fetch of any group only requests missing pairs
+        driver = next(iter(self.groups.values()))
+        jobs = [
+            (mode, blockOrigins, blockDestinations)
+            for mode, pairs in needed.items()
+            for blockOrigins, blockDestinations in pairBlocks(pairs)
+        ]
+
+        def fetch(job):
+            mode, blockOrigins, blockDestinations = job
+            driver._getDistMatrix(
+                startAddresses=blockOrigins,
+                destinationAddresses=blockDestinations,
+                transitMode=mode,
+                departureTime=departureTime,
+            )
+
+        if jobs:
+            with ThreadPoolExecutor(
+                max_workers=min(self.maxWorkers, len(jobs))
+            ) as pool:
+                list(pool.map(fetch, jobs))
+
+        return sum(
+            len(dests) for pairs in needed.values() for dests in pairs.values()
+        )
+
+    def plan(
+        self,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        objective="duration",
+    ) -> dict:
+        """
+        Returns {group name: GroupPlan} with every group's matrix and its
+        top k hosts.
+        """
+        departureTime = defaultDeparture(departureTime)
+        self.prefetch(transitMode=transitMode, departureTime=departureTime)
+
+        plans = {}
+        for name, group in self.groups.items():
+            Mbest, bestmode = group.getMatrix(
+                transitMode=transitMode,
+                departureTime=departureTime,
+                objective=objective,
+            )
+            ranking = HostRanker(
+                Mbest, group.friendNames, group.hostNames
+            ).rank(rankBy, k=k, weights=weights)
+            plans[name] = GroupPlan(Mbest, bestmode, ranking)
+
+        return plans
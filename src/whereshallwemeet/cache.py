@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime as dt
+from typing import Union
+
+# element states worth remembering; anything else (OVER_QUERY_LIMIT,
+# UNKNOWN_ERROR, ...) is transient and must be asked for again
+CACHEABLE = ("OK", "ZERO_RESULTS", "NOT_FOUND")
+
+# addresses per IN (...) list, well below SQLite's variable limit
+CHUNK = 400
+
+# hits are only marked as used again once they weren't for this long
+TOUCH_SECONDS = 60
+
+# layout of the elements table; caches of another layout only hold what
+# can be fetched again and are dropped
+SCHEMA = 2
+
+# element fields kept as value and text columns (duration_in_traffic comes
+# with every driving request that has a departure time)
+FIELDS = ("distance", "duration", "duration_in_traffic")
+# default ttl of elements, and of recurring ones (which a weekly run at the
+# same time has to find again a week later)
+TTL = 7 * 24 * 3600
+RECURRING_TTL = 35 * 24 * 3600
+
+COLUMNS = (
+    "status, distance, distanceText, duration, durationText, "
+    "traffic, trafficText, extra"
+)
+
+
+def _columns(elem: dict) -> tuple:
+    """
+    Element as table columns. Elements made of status and FIELDS, as nearly
+    all are, are rebuilt without parsing any json; anything else is kept
+    as json in extra.
+    """
+    plain = set(elem) <= {"status", *FIELDS} and all(
+        set(elem[field]) == {"text", "value"}
+        for field in FIELDS
+        if field in elem
+    )
+    if not plain:
+        return (elem.get("status"), *[None] * 6, json.dumps(elem))
+
+    columns = [elem["status"]]
+    for field in FIELDS:
+        value = elem.get(field, {})
+        columns += [value.get("value"), value.get("text")]
+    return (*columns, None)
+
+
+def _element(
+    status,
+    distance,
+    distanceText,
+    duration,
+    durationText,
+    traffic,
+    trafficText,
+    extra,
+) -> dict:
+
+    if extra is not None:
+        return json.loads(extra)
+
+    elem = {}
+    if distance is not None:
+        elem["distance"] = {"text": distanceText, "value": distance}
+    if duration is not None:
+        elem["duration"] = {"text": durationText, "value": duration}
+    if traffic is not None:
+        elem["duration_in_traffic"] = {"text": trafficText, "value": traffic}
+    elem["status"] = status
+    return elem
+
+
+class MatrixCache:
+    """
+    Persistent store for single distance matrix elements.
+
+    Elements are keyed by (origin, destination, mode, departure bucket),
+    where the bucket is the departure time rounded down to `bucketSeconds`
+    ("now" is the current time, so live traffic expires with its bucket).
+    With recurring, buckets are a weekday and time of day instead, so that
+    planning every Wednesday 18:00 reuses last week's elements. Entries
+    older than `ttl` seconds (by default 7 days, 35 with recurring) are
+    dropped on read, and once more than `maxEntries` are stored the least
+    recently used ones are evicted.
+
+    Pass ":memory:" as path for a cache that lives as long as the process.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        ttl: float = None,
+        maxEntries: int = 100_000,
+        bucketSeconds: int = 15 * 60,
+        recurring: bool = False,
+    ):
+
+        self.path = str(path)
+        if ttl is None:
+            ttl = RECURRING_TTL if recurring else TTL
+        self.ttl = ttl
+        self.recurring = recurring
+        self.maxEntries = maxEntries
+        self.bucketSeconds = bucketSeconds
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA:
+                self._db.execute("DROP TABLE IF EXISTS elements")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS elements ("
+                "origin TEXT, destination TEXT, mode TEXT, bucket TEXT, "
+                "status TEXT, distance INTEGER, distanceText TEXT, "
+                "duration INTEGER, durationText TEXT, "
+                "traffic INTEGER, trafficText TEXT, extra TEXT, "
+                "created REAL, accessed REAL, "
+                "PRIMARY KEY (origin, destination, mode, bucket))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS lru ON elements (accessed)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS age ON elements (created)"
+            )
+
+    def bucket(self, departureTime: Union[str, dt]) -> str:
+        if departureTime == "now":
+            # live traffic is never recurring
+            stamp = int(time.time())
+            return str(stamp - stamp % self.bucketSeconds)
+        if isinstance(departureTime, dt) and self.recurring:
+            seconds = (
+                departureTime.hour * 3600
+                + departureTime.minute * 60
+                + departureTime.second
+            )
+            return (
+                f"weekday{departureTime.weekday()}:"
+                f"{seconds - seconds % self.bucketSeconds}"
+            )
+        if isinstance(departureTime, dt):
+            stamp = int(departureTime.timestamp())
+            return str(stamp - stamp % self.bucketSeconds)
+        return str(departureTime)
+
+    def get(
+        self,
+        origins: list[str],
+        destinations: list[str],
+        mode: str,
+        departureTime: Union[str, dt],
+    ) -> dict:
+        """
+        Returns {(origin, destination): element} for all fresh hits.
+        """
+        bucket = self.bucket(departureTime)
+        now = time.time()
+        hits = {}
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM elements WHERE created < ?", (now - self.ttl,)
+            )
+            # one query per block of addresses, not per pair
+            origins = list(dict.fromkeys(origins))
+            destinations = list(dict.fromkeys(destinations))
+            for i in range(0, len(origins), CHUNK):
+                blockOrigins = origins[i : i + CHUNK]
+                for j in range(0, len(destinations), CHUNK):
+                    blockDestinations = destinations[j : j + CHUNK]
+                    where = (
+                        "mode = ? AND bucket = ? AND origin IN ("
+                        + ",".join("?" * len(blockOrigins))
+                        + ") AND destination IN ("
+                        + ",".join("?" * len(blockDestinations))
+                        + ")"
+                    )
+                    params = (mode, bucket, *blockOrigins, *blockDestinations)
+                    for origin, dest, *columns in self._db.execute(
+                        f"SELECT origin, destination, {COLUMNS} "
+                        f"FROM elements WHERE {where}",
+                        params,
+                    ):
+                        hits[(origin, dest)] = _element(*columns)
+                    self._db.execute(
+                        f"UPDATE elements SET accessed = ? WHERE {where} "
+                        "AND accessed < ?",
+                        (now, *params, now - TOUCH_SECONDS),
+                    )
+
+        return hits
+
+    def put(
+        self, lookup: dict, mode: str, departureTime: Union[str, dt]
+    ) -> None:
+        bucket = self.bucket(departureTime)
+        now = time.time()
+        rows = [
+            (origin, dest, mode, bucket, *_columns(elem), now, now)
+            for (origin, dest), elem in lookup.items()
+            if elem.get("status") in CACHEABLE
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO elements VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            excess = len(self) - self.maxEntries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM elements WHERE rowid IN (SELECT rowid FROM "
+                    "elements ORDER BY accessed ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM elements")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM elements"
+            ).fetchone()[0]
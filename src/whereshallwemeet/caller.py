@@ -1,226 +1,1150 @@
 import os
 import pathlib
 import sys
-import googlemaps
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
 from math import inf
 
-from .utils import onDay, argmin
+from .backends import Backend, GoogleBackend, parseLatLng, sharedClient
+from .cache import MatrixCache
+from .completion import Completion, complete
+from .friends import Friend, Roster, load as loadRoster
+from .geocode import GeocodeCache, Place, normalizeAddress
+from .heatmap import Surface, surface
+from .metrics import Metrics
+from .routes import Route
+from .scenarios import VenueOutlook, simulate
+from .scheduler import INTERACTIVE, TRANSIENT, Scheduler
+from . import snapshot
+from .candidates import (
+    branchAndBound,
+    locationKey,
+    lowerBounds,
+    sampleCandidates,
+)
+from .matrix import (
+    asList,
+    buildResponse,
+    elementLookup,
+    missingBlocks,
+    TravelTimeTensor,
+    stitch,
+    tiles,
+)
+from .solver import HostRanker, HostScore, SweepResult
+from .utils import convexArea, defaultDeparture
 
 from typing import Union
 
+# departure time sweep matrices kept per instance, see sweep()
+MAX_SLICES = 256
+
 MODES = ("transit", "driving")
 # "walking" -> if walking is a viable option, usually suggested when picking transit
 
 
 class WhereShallWeMeet:
-    def __init__(self, friendsFile: str = None, configPath: str = None):
+    def __init__(
+        self,
+        friendsFile: str = None,
+        configPath: str = None,
+        cache: Union[str, MatrixCache] = None,
+        maxWorkers: int = 8,
+        backend: Backend = None,
+        geocodeCache: Union[str, GeocodeCache] = None,
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        priority: int = INTERACTIVE,
+    ):
 
         self.configPath = configPath
 
+        # optional persistent element cache shared across runs
+        if isinstance(cache, (str, pathlib.Path)):
+            cache = MatrixCache(cache)
+        self.cache = cache
+
+        # upper bound on concurrent requests of this instance, however
+        # many pools (sweep slices, tiles, routes) are nested
+        self.maxWorkers = maxWorkers
+        self._inFlight = threading.BoundedSemaphore(maxWorkers)
+
         self._gmaps = None
 
+        # where travel times come from, Google unless told otherwise
+        self._backend = backend
+
+        # optional persistent address -> place store; with it, addresses
+        # are geocoded once and matrix requests only contain unique places
+        if isinstance(geocodeCache, (str, pathlib.Path)):
+            geocodeCache = GeocodeCache(geocodeCache)
+        self.geocodeCache = geocodeCache
+
+        # API latency, billed units, cost, cache hit rates and CPU phases
+        self.metrics = Metrics() if metrics is None else metrics
+
+        # quota, retries and priority lane of every API request; without a
+        # shared scheduler requests are unthrottled but still retried
+        self.scheduler = Scheduler() if scheduler is None else scheduler
+        self.priority = priority
+
+        # guards the check-then-fill of matrices, so that threads sharing
+        # an instance don't fetch the same twice, and the lazy properties
+        # (which worker threads may initialize while _lock is held)
+        self._lock = threading.RLock()
+        self._lazyLock = threading.RLock()
+
         self.friendsFile = friendsFile
-        self._friends = None
+        self._roster = None
 
         self._DM = {}
         self._starts = {}
+        self._origins = {}
+        self._destinations = {}
+        self._departures = {}
+        self._tensor = None
+        # (modes, names, hosts) and the tensor all objectives were parsed to
+        self._parsed = None
+
+        # matrices of departure time sweeps, least recently used first,
+        # see sweep(); guarded by _lock
+        self._slices = {}
 
     @property
-    def friends(self):
+    def roster(self) -> Roster:
 
-        if self._friends is None:
-            self._loadFriends()
+        if self._roster is None:
+            with self._lazyLock:
+                if self._roster is None:
+                    self._loadFriends()
 
-        return self._friends
+        return self._roster
+
+    @property
+    def friends(self) -> list[Friend]:
+        return self.roster.friends
 
     @property
-    def friendNames(self):
-        return [friend["name"] for friend in self.friends]
+    def friendNames(self) -> list[str]:
+        return self.roster.names
+
+    @property
+    def hostNames(self) -> list[str]:
+        return self.roster.hosts
 
     @property
     def gmaps(self):
 
         if self._gmaps is None:
-            self._establishConnection()
+            with self._lazyLock:
+                if self._gmaps is None:
+                    self._establishConnection()
 
         return self._gmaps
 
-    def _friendsMatrix(self, transitMode: str, departureTime: dt, force=False):
+    @property
+    def backend(self) -> Backend:
+
+        if self._backend is None:
+            with self._lazyLock:
+                if self._backend is None:
+                    self._backend = GoogleBackend(self.gmaps)
 
-        startAddresses = [friend["address"] for friend in self.friends]
+        return self._backend
+
+    def reloadFriends(self) -> dict:
+        """
+        Re-reads the friends file. Matrices are not thrown away: the next
+        getMatrix only fetches rows and columns of new or changed addresses.
+
+        Returns the names that were added, removed or changed.
+        """
+        with self._lock:
+            old = {
+                friend.name: friend
+                for friend in (self._roster.friends if self._roster else [])
+            }
+            self._loadFriends()
+            new = {friend.name: friend for friend in self._roster.friends}
+
+        return {
+            "added": sorted(new.keys() - old.keys()),
+            "removed": sorted(old.keys() - new.keys()),
+            "changed": sorted(
+                name
+                for name in new.keys() & old.keys()
+                if new[name] != old[name]
+            ),
+        }
+
+    def _isStale(
+        self,
+        mode: str,
+        names: list[str],
+        startAddresses: list[str],
+        potentialHosts: list[str],
+        departureTime: dt,
+        force=False,
+    ) -> bool:
+        return (
+            force
+            or (mode not in self._DM)
+            or (self._starts.get(mode) != names)
+            or (self._origins.get(mode) != startAddresses)
+            or (self._destinations.get(mode) != potentialHosts)
+            or (self._departures.get(mode) != departureTime)
+        )
+
+    def _reusableElements(
+        self, mode: str, departureTime: dt, force=False
+    ) -> dict:
+        """
+        Elements of the current matrix of `mode` that are still valid for
+        departureTime, keyed by (origin, destination) address.
+        """
+        if (
+            force
+            or (mode not in self._DM)
+            or (self._departures.get(mode) != departureTime)
+        ):
+            return {}
+
+        return elementLookup(
+            self._DM[mode], self._origins[mode], self._destinations[mode]
+        )
+
+    def _matrixRequests(self, transitMode: str) -> tuple[dict, list[str]]:
+        """
+        Works out which matrices a transitMode needs. Returns
+        {mode: (names, startAddresses)} and the addresses of potential hosts.
+        """
+        startAddresses = [friend.address for friend in self.friends]
 
         # remove people that can't host from destination
-        potentialHosts = [
-            addie
-            for i, addie in enumerate(startAddresses)
-            if self.friends[i]["availableToHost"]
-        ]
+        potentialHosts = [startAddresses[i] for i in self.roster.hostIndex]
 
         if transitMode == "best":
-            for mode in MODES:
-                if (mode not in self._DM.keys()) or force:
-                    self._DM[mode] = self._getDistMatrix(
-                        startAddresses=startAddresses,
-                        destinationAddresses=potentialHosts,
-                        transitMode=mode,
-                        departureTime=departureTime,
-                    )
-                    self._starts[mode] = [
-                        friend["name"] for friend in self.friends
-                    ]
+            requests = {
+                mode: (self.friendNames, startAddresses) for mode in MODES
+            }
         elif transitMode == "custom":
             friendModes = {
-                friend["name"]: friend["preferredTransitMode"]
+                friend.name: friend.preferredTransitMode
                 for friend in self.friends
             }
-            modes = set(friendModes.values())
-            for mode in modes:
-                if (mode not in self._DM.keys()) or force:
-                    # calc dist matrix for everyone with this mode
-                    startPoints = [
-                        startAddresses[i]
-                        for i, friend in enumerate(friendModes)
-                        if friendModes[friend] == mode
-                    ]
-                    self._DM[mode] = self._getDistMatrix(
-                        startAddresses=startPoints,
-                        destinationAddresses=potentialHosts,
-                        transitMode=mode,
-                        departureTime=departureTime,
-                    )
-                    self._starts[mode] = [
+            requests = {}
+            for mode in sorted(set(friendModes.values())):
+                # calc dist matrix for everyone with this mode
+                requests[mode] = (
+                    [
                         friend
                         for friend, friendmode in friendModes.items()
                         if friendmode == mode
-                    ]
-        else:
-            if (transitMode not in self._DM.keys()) or force:
-                self._DM[transitMode] = self._getDistMatrix(
-                    startAddresses=startAddresses,
-                    destinationAddresses=potentialHosts,
-                    transitMode=transitMode,
-                    departureTime=departureTime,
+                    ],
+                    [
+                        startAddresses[i]
+                        for i, friend in enumerate(friendModes)
+                        if friendModes[friend] == mode
+                    ],
                 )
-                self._starts[transitMode] = [
-                    friend["name"] for friend in self.friends
-                ]
+        else:
+            requests = {transitMode: (self.friendNames, startAddresses)}
+
+        return requests, potentialHosts
+
+    def _storeMatrix(
+        self,
+        mode: str,
+        names: list[str],
+        dm: dict,
+        startAddresses: list[str],
+        potentialHosts: list[str],
+        departureTime: dt,
+    ):
+        self._DM[mode] = dm
+        self._parsed = None
+        self._starts[mode] = names
+        self._origins[mode] = startAddresses
+        self._destinations[mode] = potentialHosts
+        self._departures[mode] = departureTime
+
+    # The fetch pipeline below (_friendsMatrix, _updateMatrix,
+    # _getDistMatrix, _cachedDistMatrix, _fetchDistMatrix) plans and merges
+    # in shared helpers, AsyncWhereShallWeMeet only replaces the I/O between.
+
+    def _missingBlocks(
+        self,
+        mode: str,
+        startAddresses: list[str],
+        potentialHosts: list[str],
+        departureTime: dt,
+        force=False,
+    ) -> tuple[dict, list[tuple[list[str], list[str]]]]:
+        """
+        Elements of the current matrix of mode that are still valid, and
+        the blocks of addresses to fetch for the rest.
+        """
+        have = self._reusableElements(mode, departureTime, force)
+        if not have:
+            return have, [(startAddresses, potentialHosts)]
+
+        # roster changed: only fetch rows/columns of new addresses
+        return have, missingBlocks(startAddresses, potentialHosts, have)
+
+    @staticmethod
+    def _blockElements(
+        blocks: list[tuple[list[str], list[str]]], responses: list[dict]
+    ) -> dict:
+        elements = {}
+        for (blockOrigins, blockDestinations), response in zip(
+            blocks, responses
+        ):
+            elements.update(
+                elementLookup(response, blockOrigins, blockDestinations)
+            )
+        return elements
+
+    def _mergeBlocks(
+        self,
+        origins: list[str],
+        destinations: list[str],
+        have: dict,
+        blocks: list[tuple[list[str], list[str]]],
+        responses: list[dict],
+    ) -> dict:
+        if not have and (len(blocks) == 1):
+            return responses[0]
+
+        have.update(self._blockElements(blocks, responses))
+        return buildResponse(origins, destinations, have)
+
+    def _updateMatrix(
+        self,
+        mode: str,
+        startAddresses: list[str],
+        potentialHosts: list[str],
+        departureTime: dt,
+        force=False,
+    ) -> dict:
+
+        have, blocks = self._missingBlocks(
+            mode, startAddresses, potentialHosts, departureTime, force
+        )
+        responses = [
+            self._getDistMatrix(
+                startAddresses=blockOrigins,
+                destinationAddresses=blockDestinations,
+                transitMode=mode,
+                departureTime=departureTime,
+                force=force,
+            )
+            for blockOrigins, blockDestinations in blocks
+        ]
+
+        return self._mergeBlocks(
+            startAddresses, potentialHosts, have, blocks, responses
+        )
+
+    def _staleMatrices(
+        self, transitMode: str, departureTime: dt, force=False
+    ) -> tuple[dict, list[str], list[str]]:
+        """
+        The matrix requests and potential hosts of transitMode (see
+        _matrixRequests), and the modes whose matrix needs updating.
+        """
+        if force:
+            # whatever sweeps fetched before is as outdated
+            with self._lock:
+                self._slices.clear()
+
+        requests, potentialHosts = self._matrixRequests(transitMode)
+        stale = [
+            mode
+            for mode, (names, startAddresses) in requests.items()
+            if self._isStale(
+                mode,
+                names,
+                startAddresses,
+                potentialHosts,
+                departureTime,
+                force,
+            )
+        ]
+        return requests, potentialHosts, stale
+
+    def _storeMatrices(
+        self,
+        requests: dict,
+        potentialHosts: list[str],
+        departureTime: dt,
+        stale: list[str],
+        dms: list[dict],
+    ) -> tuple[str]:
+
+        for mode, dm in zip(stale, dms):
+            names, startAddresses = requests[mode]
+            self._storeMatrix(
+                mode, names, dm, startAddresses, potentialHosts, departureTime
+            )
+
+        return tuple(requests)
+
+    def _friendsMatrix(
+        self, transitMode: str, departureTime: dt, force=False
+    ) -> tuple[str]:
+
+        requests, potentialHosts, stale = self._staleMatrices(
+            transitMode, departureTime, force
+        )
+        dms = [
+            self._updateMatrix(
+                mode, requests[mode][1], potentialHosts, departureTime, force
+            )
+            for mode in stale
+        ]
+
+        return self._storeMatrices(
+            requests, potentialHosts, departureTime, stale, dms
+        )
 
     def getMatrix(
         self,
         transitMode: str = "transit",
-        departureTime=onDay(dt.now()),
+        departureTime: Union[str, dt] = None,
         objective="duration",
         force=False,
     ):
 
-        if (len(self._DM.keys()) == 0) or force:
-            self._friendsMatrix(
-                transitMode=transitMode, departureTime=departureTime
+        departureTime = defaultDeparture(departureTime)
+
+        with self._lock:
+            # only refetches modes whose matrix is missing or outdated
+            modes = self._friendsMatrix(
+                transitMode=transitMode,
+                departureTime=departureTime,
+                force=force,
+            )
+
+            with self.metrics.phase("assemble"):
+                return self._assembleMatrix(modes, objective=objective)
+
+    def saveSnapshot(
+        self,
+        path: str,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        force=False,
+    ):
+        """
+        Writes the matrices of getMatrix, all objectives, to a snapshot that
+        other processes can memory-map with snapshot.load.
+        """
+        with self._lock:
+            self.getMatrix(
+                transitMode=transitMode,
+                departureTime=departureTime,
+                force=force,
             )
+            tensor = self._parsed[1]
+        snapshot.save(tensor, path)
 
-        modes = tuple(self._DM.keys())
-        M0 = self._json2Matrix(self._DM[modes[0]])
-        nFriends = len(self.friendNames)
-        nDestinations = len(M0[0])
-        depth = (
-            3 if (transitMode == "custom") or (transitMode == "best") else 1
+    def bestHosts(
+        self,
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        force=False,
+    ) -> list[HostScore]:
+        """
+        Top k hosts for the group under the rankBy objective (see
+        solver.OBJECTIVES), with a breakdown of each host's travel times.
+        """
+        Mbest, _ = self.getMatrix(
+            transitMode=transitMode,
+            departureTime=departureTime,
+            objective=objective,
+            force=force,
         )
 
-        Mfull = [
-            [[-1 for _ in range(depth)] for _ in range(nDestinations)]
-            for _ in range(nFriends)
-        ]
+        return self._bestHosts(Mbest, k, rankBy, weights)
 
-        for k, mode in enumerate(self._DM.keys()):
-            M = self._json2Matrix(self._DM[mode], objective=objective)
+    def _bestHosts(
+        self, Mbest: list[list[float]], k: int, rankBy: str, weights: dict
+    ) -> list[HostScore]:
+        return HostRanker(Mbest, self.friendNames, self.hostNames).rank(
+            rankBy, k=k, weights=weights
+        )
 
-            for i, name in enumerate(self.friendNames):
-                for j in range(nDestinations):
-                    if name in self._starts[mode]:
-                        Mfull[i][j][k] = M[i][j]
-                    else:
-                        Mfull[i][j][k] = inf
+    def robustHosts(
+        self,
+        attendance: dict = None,
+        availability: dict = None,
+        k: int = 3,
+        by: Union[str, float] = "expected",
+        nScenarios: int = 1000,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        percentiles: tuple[float] = (50, 90),
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        seed: int = None,
+        processes: int = None,
+    ) -> list[VenueOutlook]:
+        """
+        Top k hosts when friends only come with probability attendance[name]
+        and hosts are only available with probability availability[host],
+        judged over nScenarios sampled attendance sets by their "expected"
+        score, a percentile of it (by=90 must be in percentiles) or their
+        "winRate". Only the matrix of getMatrix is used, so apart from that
+        no API calls are made.
+        """
+        self._checkBy(by, percentiles)
+        Mbest, _ = self.getMatrix(
+            transitMode=transitMode,
+            departureTime=departureTime,
+            objective=objective,
+        )
 
-        bestmode = [
-            ["NONE" for _ in range(nDestinations)] for _ in range(nFriends)
-        ]
-        Mbest = [[-1 for _ in range(nDestinations)] for _ in range(nFriends)]
-        for i in range(nFriends):
-            for j in range(nDestinations):
-                bestmode[i][j] = modes[argmin(Mfull[i][j])]
-                Mbest[i][j] = min(Mfull[i][j])
+        return self._robustHosts(
+            Mbest,
+            attendance=attendance,
+            availability=availability,
+            k=k,
+            by=by,
+            nScenarios=nScenarios,
+            rankBy=rankBy,
+            weights=weights,
+            percentiles=percentiles,
+            seed=seed,
+            processes=processes,
+        )
 
-        return Mbest, bestmode
+    @staticmethod
+    def _checkBy(by: Union[str, float], percentiles: tuple[float]):
+        # before fetching and simulating anything
+        if by not in ("expected", "winRate", *percentiles):
+            raise ValueError(
+                f"Can't rank by {by}, pick expected, winRate or one of "
+                f"{tuple(percentiles)}."
+            )
 
-    def _loadFriends(self):
-        path = pathlib.Path(self.friendsFile)
+    def _robustHosts(
+        self,
+        Mbest: list[list[float]],
+        attendance: dict,
+        availability: dict,
+        k: int,
+        by: Union[str, float],
+        nScenarios: int,
+        rankBy: str,
+        weights: dict,
+        percentiles: tuple[float],
+        seed: int,
+        processes: int,
+    ) -> list[VenueOutlook]:
 
-        if path.suffix == ".csv":
-            import csv
+        outlook = simulate(
+            Mbest,
+            self.friendNames,
+            self.hostNames,
+            attendance=attendance,
+            availability=availability,
+            nScenarios=nScenarios,
+            rankBy=rankBy,
+            weights=weights,
+            percentiles=percentiles,
+            seed=seed,
+            processes=processes,
+        )
 
-            friends = []
-            with open(self.friendsFile, "r") as f:
-                csvfile = list(csv.reader(f))
+        def key(venue):
+            if by == "expected":
+                return venue.expected
+            elif by == "winRate":
+                return -venue.winRate
+            return venue.percentiles[by]
 
-            # first row is header
-            header = csvfile[0]
+        return sorted(outlook, key=key)[:k]
 
-            def findCol(word):
-                shoeFits = list(
-                    filter(
-                        lambda i: [word in col.lower() for col in header][i],
-                        range(len(header)),
-                    )
+    def approximateHosts(
+        self,
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        sample: float = 0.1,
+        maxElements: int = None,
+        confidence: float = 0.95,
+        rank: int = 1,
+        batchSize: int = None,
+        seed: int = None,
+    ) -> tuple[list[HostScore], Completion]:
+        """
+        Like bestHosts for large groups, but only queries a `sample` share
+        of the matrix and completes the rest from a model calibrated on it
+        (see completion), querying more where the top k is uncertain and
+        the columns of the top k in full. Needs every home geocoded.
+
+        Returns the top k and the Completion with the completed matrix,
+        its per-cell errors and the elements spent.
+        """
+        requests, potentialHosts = self._matrixRequests(transitMode)
+        homes = self._getLocation([friend.address for friend in self.friends])
+
+        return self._approximateHosts(
+            homes,
+            requests,
+            potentialHosts,
+            self._getDistMatrix,
+            k=k,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            sample=sample,
+            maxElements=maxElements,
+            confidence=confidence,
+            rank=rank,
+            batchSize=batchSize,
+            seed=seed,
+        )
+
+    def _approximateHosts(
+        self,
+        homes: list[tuple[float, float]],
+        requests: dict,
+        potentialHosts: list[str],
+        getDistMatrix,
+        k: int,
+        rankBy: str,
+        weights: dict,
+        departureTime: Union[str, dt],
+        objective: str,
+        sample: float,
+        maxElements: int,
+        confidence: float,
+        rank: int,
+        batchSize: int,
+        seed: int,
+    ) -> tuple[list[HostScore], Completion]:
+        """
+        approximateHosts on geocoded homes, fetching with getDistMatrix
+        (called like _getDistMatrix).
+        """
+        departureTime = defaultDeparture(departureTime)
+
+        names = self.friendNames
+        nameIndex = {name: i for i, name in enumerate(names)}
+        addresses = [friend.address for friend in self.friends]
+        hostHomes = [homes[i] for i in self.roster.hostIndex]
+
+        def fetch(mode, friends, hosts):
+            return self._json2Matrix(
+                getDistMatrix(
+                    startAddresses=[addresses[i] for i in friends],
+                    destinationAddresses=[potentialHosts[j] for j in hosts],
+                    transitMode=mode,
+                    departureTime=departureTime,
+                ),
+                objective,
+            )
+
+        completion = complete(
+            {
+                mode: [nameIndex[name] for name in modeNames]
+                for mode, (modeNames, _) in requests.items()
+            },
+            homes,
+            hostHomes,
+            fetch,
+            k=k,
+            rankBy=rankBy,
+            weights=(
+                [weights.get(name, 1) for name in names]
+                if (rankBy == "weighted") and (weights is not None)
+                else None
+            ),
+            sample=sample,
+            maxElements=maxElements,
+            confidence=confidence,
+            rank=rank,
+            batchSize=batchSize,
+            seed=seed,
+        )
+
+        ranking = HostRanker(completion.M, names, self.hostNames).rank(
+            rankBy, k=k, weights=weights
+        )
+        return ranking, completion
+
+    def _routeRequests(
+        self, hosts: list, transitMode: str, names: list[str] = None
+    ) -> list[tuple]:
+        """
+        (host, name, startAddress, hostAddress, mode) of every route needed
+        to bring `names` (everybody by default) to each of the hosts.
+        """
+        friends = {friend.name: friend for friend in self.friends}
+        names = self.friendNames if names is None else names
+        tensor = self._tensor
+
+        requests = []
+        for host in hosts:
+            # host names, addresses (e.g. venues) or HostScores
+            host = getattr(host, "host", host)
+            hostAddress = friends[host].address if host in friends else host
+            for name in names:
+                if transitMode == "custom":
+                    mode = friends[name].preferredTransitMode
+                elif transitMode == "best":
+                    # mode that won in the last getMatrix, if it had host
+                    mode = "transit"
+                    if (tensor is not None) and (host in tensor.hostIndex):
+                        i = tensor.nameIndex[name]
+                        j = tensor.hostIndex[host]
+                        mode = min(
+                            tensor.modes,
+                            key=lambda m: tensor[i, j, tensor.modeIndex[m]],
+                        )
+                else:
+                    mode = transitMode
+                requests.append(
+                    (host, name, friends[name].address, hostAddress, mode)
                 )
 
-                if len(shoeFits) > 1:
-                    raise ValueError(
-                        f"More than one column header contains {word}."
-                    )
-                elif len(shoeFits) == 0:
-                    raise ValueError(
-                        f"No column header contains keyword {word}"
+        return requests
+
+    def routes(
+        self,
+        hosts: list,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        names: list[str] = None,
+    ) -> dict:
+        """
+        Compact routes of every friend (or just `names`) to each host of a
+        shortlist, e.g. routes(bestHosts(3)). Returns {host: {name: Route}}
+        with None where there is no route.
+
+        All directions requests are sent concurrently.
+        """
+        departureTime = defaultDeparture(departureTime)
+        requests = self._routeRequests(hosts, transitMode, names=names)
+
+        def fetch(request):
+            _, _, startAddress, hostAddress, mode = request
+            return self._getDirections(
+                startAddress,
+                hostAddress,
+                transitMode=mode,
+                departureTime=departureTime,
+            )[0]
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.maxWorkers, len(requests)))
+        ) as pool:
+            fetched = list(pool.map(fetch, requests))
+
+        return self._routesByHost(requests, fetched)
+
+    @staticmethod
+    def _routesByHost(requests: list[tuple], fetched: list[Route]) -> dict:
+        out = {}
+        for (host, name, *_), route in zip(requests, fetched):
+            out.setdefault(host, {})[name] = route
+
+        return out
+
+    def sweep(
+        self,
+        departureTimes: list[Union[str, dt]],
+        transitModes: tuple[str] = ("transit",),
+        rankBy: str = "minisum",
+        weights: dict = None,
+        objective="duration",
+        force=False,
+    ) -> SweepResult:
+        """
+        Scores every host for every combination of departure time and
+        transitMode and finds the best (time, transitMode, host).
+
+        Times falling into the same cache bucket are only looked at once,
+        matrices shared between transitModes (e.g. "transit" and "best")
+        are requested once, and all of them are fetched concurrently. The
+        last MAX_SLICES matrices are kept for later sweeps, unless forced.
+        """
+        return self._sweep(
+            departureTimes,
+            transitModes,
+            self._getDistMatrix,
+            rankBy=rankBy,
+            weights=weights,
+            objective=objective,
+            force=force,
+        )
+
+    def _sweep(
+        self,
+        departureTimes: list[Union[str, dt]],
+        transitModes: tuple[str],
+        getDistMatrix,
+        rankBy: str,
+        weights: dict,
+        objective: str,
+        force=False,
+    ) -> SweepResult:
+        """
+        sweep, fetching with getDistMatrix (called like _getDistMatrix).
+        """
+        # one representative per departure time (bucket)
+        times = {}
+        for departureTime in departureTimes:
+            key = (
+                departureTime
+                if self.cache is None
+                else self.cache.bucket(departureTime)
+            )
+            times.setdefault(key, departureTime)
+        times = list(times.values())
+
+        plans = {}
+        for transitMode in transitModes:
+            plans[transitMode], potentialHosts = self._matrixRequests(
+                transitMode
+            )
+        hosts = tuple(potentialHosts)
+
+        def sliceKey(mode, startAddresses, departureTime):
+            return (mode, tuple(startAddresses), hosts, departureTime)
+
+        needed = dict.fromkeys(
+            sliceKey(mode, startAddresses, departureTime)
+            for departureTime in times
+            for requests in plans.values()
+            for mode, (_, startAddresses) in requests.items()
+        )
+        with self._lock:
+            if force:
+                self._slices.clear()
+            slices = {
+                key: self._slices.pop(key)
+                for key in needed
+                if key in self._slices
+            }
+            # used again: now the most recently used
+            self._slices.update(slices)
+        missing = [key for key in needed if key not in slices]
+
+        def fetch(key):
+            mode, startAddresses, _, departureTime = key
+            return getDistMatrix(
+                startAddresses=list(startAddresses),
+                destinationAddresses=list(hosts),
+                transitMode=mode,
+                departureTime=departureTime,
+                force=force,
+            )
+
+        if missing:
+            with ThreadPoolExecutor(
+                max_workers=min(self.maxWorkers, len(missing))
+            ) as pool:
+                fetched = dict(zip(missing, pool.map(fetch, missing)))
+            slices.update(fetched)
+
+            with self._lock:
+                self._slices.update(fetched)
+                for key in list(self._slices)[:-MAX_SLICES]:
+                    del self._slices[key]
+
+        scores = {}
+        best = None
+        for departureTime in times:
+            for transitMode, requests in plans.items():
+                tensor = TravelTimeTensor(
+                    self.friendNames, self.hostNames, tuple(requests)
+                )
+                for mode, (names, startAddresses) in requests.items():
+                    tensor.fill(
+                        mode,
+                        names,
+                        slices[sliceKey(mode, startAddresses, departureTime)],
+                        objective=objective,
                     )
+                Mbest, _ = tensor.best()
+
+                ranker = HostRanker(Mbest, self.friendNames, self.hostNames)
+                scores[(departureTime, transitMode)] = ranker.scores(
+                    rankBy, weights
+                )
+                top = ranker.rank(rankBy, k=1, weights=weights)
+                if top and ((best is None) or (top[0].score < best[2].score)):
+                    best = (departureTime, transitMode, top[0])
+
+        return SweepResult(
+            times, tuple(transitModes), self.hostNames, scores, best
+        )
+
+    def searchVenues(
+        self,
+        venues: list[tuple[float, float]] = None,
+        nSamples: int = 50,
+        k: int = 1,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        batchSize: int = 10,
+    ) -> list[HostScore]:
+        """
+        Best k meeting spots among (lat, lng) venues, or among nSamples
+        points sampled inside the friends' convex hull if no venues are
+        given. Venues whose straight-line lower bound can't beat the best
+        found so far are never sent to the matrix API.
+        """
+        requests, _ = self._matrixRequests(transitMode)
+        homes = self._getLocation([friend.address for friend in self.friends])
+
+        return self._searchVenues(
+            homes,
+            requests,
+            self._getDistMatrix,
+            venues=venues,
+            nSamples=nSamples,
+            k=k,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            batchSize=batchSize,
+        )
 
-                return shoeFits[0]
+    def _searchVenues(
+        self,
+        homes: list[tuple[float, float]],
+        requests: dict,
+        getDistMatrix,
+        venues: list[tuple[float, float]],
+        nSamples: int,
+        k: int,
+        rankBy: str,
+        weights: dict,
+        departureTime: Union[str, dt],
+        objective: str,
+        batchSize: int,
+    ) -> list[HostScore]:
+        """
+        searchVenues on geocoded homes, fetching with getDistMatrix (called
+        like _getDistMatrix).
+        """
+        departureTime = defaultDeparture(departureTime)
+        modes = tuple(requests)
+
+        if venues is None:
+            venues = sampleCandidates(homes, n=nSamples)
 
-            nameCol = findCol("name")
-            addressCol = findCol("address")
-            transitCol = findCol("preferred")
-            hostCol = findCol("host")
-            joinsCol = findCol("joins")
+        bounds = lowerBounds(
+            homes,
+            venues,
+            modes,
+            rankBy=rankBy,
+            weights=(
+                [weights.get(name, 1) for name in self.friendNames]
+                if (rankBy == "weighted") and (weights is not None)
+                else None
+            ),
+            objective=objective,
+        )
 
-            for row in csvfile[1:]:
+        scored = {}
 
-                friends.append(
-                    {
-                        "name": row[nameCol],
-                        "address": row[addressCol],
-                        "preferredTransitMode": row[transitCol],
-                        "availableToHost": row[hostCol],
-                        "joinsParty": row[joinsCol],
-                    }
+        def evaluate(batch):
+            keys = [locationKey(venue) for venue in batch]
+            scored.update(
+                self._scoreVenues(
+                    keys,
+                    requests,
+                    departureTime,
+                    getDistMatrix,
+                    rankBy=rankBy,
+                    weights=weights,
+                    objective=objective,
                 )
-        elif (path.suffix == ".yaml") or (path.suffix == ".yml"):
-            import yaml
+            )
+            return [scored[key].score for key in keys]
+
+        found, _ = branchAndBound(
+            venues, bounds, evaluate, k=k, batchSize=batchSize
+        )
+
+        return [scored[locationKey(venue)] for _, venue in found]
+
+    def _scoreVenues(
+        self,
+        keys: list[str],
+        requests: dict,
+        departureTime: dt,
+        getDistMatrix,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        objective="duration",
+    ) -> dict:
+        """
+        {key: HostScore} of venues given as matrix API location keys,
+        fetched with getDistMatrix (called like _getDistMatrix).
+        """
+        modes = tuple(requests)
+        tensor = TravelTimeTensor(self.friendNames, keys, modes)
+        for mode, (names, startAddresses) in requests.items():
+            tensor.fill(
+                mode,
+                names,
+                getDistMatrix(
+                    startAddresses=startAddresses,
+                    destinationAddresses=keys,
+                    transitMode=mode,
+                    departureTime=departureTime,
+                ),
+                objective=objective,
+            )
+        Mbest, _ = tensor.best()
+
+        ranker = HostRanker(Mbest, self.friendNames, keys)
+        return {
+            score.host: score
+            for score in ranker.rank(rankBy, k=len(keys), weights=weights)
+        }
+
+    def heatmap(
+        self,
+        resolution: int = 200,
+        maxElements: int = 5000,
+        initial: int = 6,
+        maxDepth: int = 4,
+        tolerance: float = 0.1,
+        keep: float = 0.5,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+        objective="duration",
+        batchSize: int = 25,
+    ) -> Surface:
+        """
+        Group score (under rankBy) of meeting anywhere inside the friends'
+        convex hull, refined adaptively where it changes fastest among the
+        best `keep` share of places and requesting at most maxElements
+        matrix elements (cached ones included). Plot it with
+        utils.plotHeatmap.
+        """
+        requests, _ = self._matrixRequests(transitMode)
+        homes = self._getLocation([friend.address for friend in self.friends])
+
+        return self._heatmap(
+            homes,
+            requests,
+            self._getDistMatrix,
+            resolution=resolution,
+            maxElements=maxElements,
+            initial=initial,
+            maxDepth=maxDepth,
+            tolerance=tolerance,
+            keep=keep,
+            rankBy=rankBy,
+            weights=weights,
+            departureTime=departureTime,
+            objective=objective,
+            batchSize=batchSize,
+        )
+
+    def _heatmap(
+        self,
+        homes: list[tuple[float, float]],
+        requests: dict,
+        getDistMatrix,
+        resolution: int,
+        maxElements: int,
+        initial: int,
+        maxDepth: int,
+        tolerance: float,
+        keep: float,
+        rankBy: str,
+        weights: dict,
+        departureTime: Union[str, dt],
+        objective: str,
+        batchSize: int,
+    ) -> Surface:
+        """
+        heatmap on geocoded homes, fetching with getDistMatrix (called like
+        _getDistMatrix).
+        """
+        departureTime = defaultDeparture(departureTime)
+
+        hull = convexArea(
+            [home[1] for home in homes], [home[0] for home in homes]
+        )
+
+        def evaluate(points):
+            keys = [locationKey((lat, lon)) for lon, lat in points]
+            scored = self._scoreVenues(
+                keys,
+                requests,
+                departureTime,
+                getDistMatrix,
+                rankBy=rankBy,
+                weights=weights,
+                objective=objective,
+            )
+            return [scored[key].score for key in keys]
+
+        return surface(
+            hull,
+            evaluate,
+            costPerPoint=sum(
+                len(startAddresses) for _, startAddresses in requests.values()
+            ),
+            resolution=resolution,
+            initial=initial,
+            maxDepth=maxDepth,
+            maxElements=maxElements,
+            tolerance=tolerance,
+            keep=keep,
+            batchSize=batchSize,
+        )
 
-            with open(self.friendsFile, "r") as f:
-                ff = yaml.load(f, Loader=yaml.FullLoader)
+    def _assembleMatrix(self, modes: tuple[str], objective="duration"):
 
-            friends = ff["friends"]
+        # every response is parsed once for all objectives; until a matrix
+        # is stored again, another objective is only another view
+        key = (modes, tuple(self.friendNames), tuple(self.hostNames))
+        if (self._parsed is None) or (self._parsed[0] != key):
+            tensor = TravelTimeTensor(self.friendNames, self.hostNames, modes)
+            with self.metrics.phase("parse"):
+                for mode in modes:
+                    tensor.parse(mode, self._starts[mode], self._DM[mode])
+            self._parsed = (key, tensor)
 
-        # remove people that don't join
-        friends = list(filter(lambda x: x["joinsParty"], friends))
+        self._tensor = self._parsed[1].view(objective)
 
-        # sort by name
-        friends = sorted(friends, key=lambda elem: elem["name"])
+        with self.metrics.phase("reduce"):
+            return self._tensor.best()
 
-        self._friends = friends
+    def _loadFriends(self):
+        self._roster = loadRoster(self.friendsFile)
 
     def _establishConnection(
         self,
-    ) -> googlemaps.client.Client:
+    ) -> "googlemaps.client.Client":
+
         if (self.configPath is None) and (os.environ.get("TOKEN") is None):
             raise ValueError("configPath or TOKEN env variable must exist.")
         elif self.configPath is not None:
@@ -238,74 +1162,438 @@ class WhereShallWeMeet:
             # user passes apitoken via env variable
             apitoken = os.environ.get("TOKEN")
 
-        # establish connection
-        gmaps = googlemaps.Client(key=apitoken)
-
-        self._gmaps = gmaps
+        # establish connection, shared by all instances using the key
+        self._gmaps = sharedClient(apitoken, poolSize=self.maxWorkers)
 
     def _getDirections(
         self,
         startAddress: str,
         destinationAddress: str,
         transitMode: str = "transit",
-        departureTime: Union[str, dt] = onDay(dt.now()),
-    ) -> tuple[dict, int]:
+        departureTime: Union[str, dt] = None,
+    ) -> tuple[Route, float]:
 
-        # Geocoding an address
-        # geocode_start = gmaps.geocode(startAddress)
+        departureTime = defaultDeparture(departureTime)
 
-        # use directions api
-        dir_results = self.gmaps.directions(
+        return self._route(
+            self._directions(
+                startAddress, destinationAddress, transitMode, departureTime
+            )
+        )
+
+    def _directions(
+        self,
+        startAddress: str,
+        destinationAddress: str,
+        transitMode: str,
+        departureTime: Union[str, dt],
+    ) -> list[dict]:
+        return self._timedCall(
+            "directions",
+            self.backend.directions,
             startAddress,
             destinationAddress,
             mode=transitMode,
-            departure_time=departureTime,
-        )[0]
+            departureTime=departureTime,
+            key=(startAddress, destinationAddress, transitMode, departureTime),
+        )
+
+    @staticmethod
+    def _route(dir_results: list[dict]) -> tuple[Route, float]:
+
+        if not dir_results:
+            return None, inf
+
+        # only the compact route is kept, the raw json is dropped here
+        route = Route.fromDirections(dir_results[0])
 
         # travel duration in seconds
-        duration = dir_results["legs"][0]["duration"]["value"]
+        return route, route.seconds
+
+    def _places(self, addresses: list[str]) -> dict:
+        """
+        {address: Place}, geocoding only addresses not in the geocodeCache.
+        "lat,lng" addresses are places already and never geocoded, addresses
+        that can't be found are missing.
+        """
+        places = {}
+        named = []
+        for addy in dict.fromkeys(addresses):
+            location = parseLatLng(addy)
+            if location is None:
+                named.append(addy)
+            else:
+                places[addy] = Place("", *location, addy)
+
+        cached = self.geocodeCache.get(named)
+        self.metrics.cache(
+            "geocode", hits=len(cached), misses=len(named) - len(cached)
+        )
+        places.update(cached)
+        missing = [addy for addy in named if addy not in cached]
+
+        def place(addy):
+            try:
+                return self._timedCall(
+                    "geocode", self.backend.place, addy, key=addy
+                )
+            except ValueError:
+                # not found: left out, and not cached either
+                return None
+
+        if missing:
+            with ThreadPoolExecutor(
+                max_workers=min(self.maxWorkers, len(missing))
+            ) as pool:
+                fetched = {
+                    addy: found
+                    for addy, found in zip(missing, pool.map(place, missing))
+                    if found is not None
+                }
+            self.geocodeCache.put(fetched)
+            places.update(fetched)
+
+        return places
+
+    def _canonical(self, addresses: list[str]) -> dict:
+        """
+        Maps every address to the location we send to the matrix API.
+        """
+        if self.geocodeCache is None:
+            # same address up to case/whitespace: send the first spelling
+            spelling = {}
+            return {
+                addy: spelling.setdefault(normalizeAddress(addy), addy)
+                for addy in addresses
+            }
+
+        # coordinates (e.g. venue and grid keys) are sent as they are, and
+        # addresses that weren't found too, to come back NOT_FOUND like
+        # without a geocodeCache
+        places = self._places(addresses)
+        return {
+            addy: (
+                places[addy].key
+                if parseLatLng(addy) is None and addy in places
+                else addy
+            )
+            for addy in addresses
+        }
+
+    def _dedupe(self, origins: list[str], destinations: list[str]):
+        """
+        Unique canonical origins and destinations, and a function that
+        expands a response for those back to the original ones.
+        """
+        canonical = self._canonical(origins + destinations)
+        uniqueOrigins = list(dict.fromkeys(canonical[o] for o in origins))
+        uniqueDestinations = list(
+            dict.fromkeys(canonical[d] for d in destinations)
+        )
 
-        # this is a json-like dict containing the
-        # output from the directions api
-        return dir_results, duration
+        def expand(response: dict) -> dict:
+            if (uniqueOrigins == origins) and (
+                uniqueDestinations == destinations
+            ):
+                return response
+
+            lookup = elementLookup(response, uniqueOrigins, uniqueDestinations)
+            return buildResponse(
+                origins,
+                destinations,
+                {
+                    (o, d): lookup[(canonical[o], canonical[d])]
+                    for o in origins
+                    for d in destinations
+                },
+            )
+
+        return uniqueOrigins, uniqueDestinations, expand
 
     def _getDistMatrix(
         self,
         startAddresses: Union[str, list[str]],
         destinationAddresses: Union[str, list[str]],
         transitMode: str = "transit",
-        departureTime: Union[str, dt] = onDay(dt.now()),
-    ) -> tuple[dict, int]:
+        departureTime: Union[str, dt] = None,
+        force=False,
+    ) -> dict:
+        """
+        Matrix of any addresses, from the element cache where possible
+        (unless force) and the backend otherwise.
+        """
 
-        dist_results = self.gmaps.distance_matrix(
-            startAddresses,
-            destinationAddresses,
-            mode=transitMode,
-            departure_time=departureTime,
+        departureTime = defaultDeparture(departureTime)
+
+        origins, destinations, expand = self._dedupe(
+            asList(startAddresses), asList(destinationAddresses)
+        )
+
+        return expand(
+            self._cachedDistMatrix(
+                origins,
+                destinations,
+                transitMode=transitMode,
+                departureTime=departureTime,
+                force=force,
+            )
+        )
+
+    def _cachedDistMatrix(
+        self,
+        startAddresses: list[str],
+        destinationAddresses: list[str],
+        transitMode: str,
+        departureTime: Union[str, dt],
+        force=False,
+    ) -> dict:
+
+        if self.cache is None:
+            return self._fetchDistMatrix(
+                startAddresses,
+                destinationAddresses,
+                transitMode=transitMode,
+                departureTime=departureTime,
+            )
+
+        origins = asList(startAddresses)
+        destinations = asList(destinationAddresses)
+
+        cacheMode = self.backend.cacheKey(transitMode)
+        # forced: fetch everything again, and cache what comes back
+        lookup = (
+            {}
+            if force
+            else self.cache.get(
+                origins, destinations, cacheMode, departureTime
+            )
+        )
+        blocks = self._cacheMisses(origins, destinations, lookup)
+        fetched = self._blockElements(
+            blocks,
+            [
+                self._fetchDistMatrix(
+                    blockOrigins,
+                    blockDestinations,
+                    transitMode=transitMode,
+                    departureTime=departureTime,
+                )
+                for blockOrigins, blockDestinations in blocks
+            ],
+        )
+        if fetched:
+            self.cache.put(fetched, cacheMode, departureTime)
+        lookup.update(fetched)
+
+        return buildResponse(origins, destinations, lookup)
+
+    def _cacheMisses(
+        self, origins: list[str], destinations: list[str], lookup: dict
+    ) -> list[tuple[list[str], list[str]]]:
+        self.metrics.cache(
+            "matrix",
+            hits=len(lookup),
+            misses=len(set(origins)) * len(set(destinations)) - len(lookup),
+        )
+
+        # only ask the API for the pairs we haven't seen in this time bucket
+        return missingBlocks(origins, destinations, lookup)
+
+    def _fetchDistMatrix(
+        self,
+        startAddresses: Union[str, list[str]],
+        destinationAddresses: Union[str, list[str]],
+        transitMode: str = "transit",
+        departureTime: Union[str, dt] = None,
+    ) -> dict:
+
+        departureTime = defaultDeparture(departureTime)
+
+        origins = asList(startAddresses)
+        destinations = asList(destinationAddresses)
+
+        def fetch(tile):
+            oSlice, dSlice = tile
+            return self._fetchTile(
+                origins[oSlice],
+                destinations[dSlice],
+                transitMode,
+                departureTime,
+            )
+
+        tileSlices = self._tiles(origins, destinations)
+        if len(tileSlices) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.maxWorkers, len(tileSlices))
+            ) as pool:
+                responses = list(pool.map(fetch, tileSlices))
+        else:
+            responses = [fetch(tile) for tile in tileSlices]
+
+        return self._stitchTiles(origins, destinations, tileSlices, responses)
+
+    def _tiles(self, origins: list[str], destinations: list[str]) -> list:
+        # respect the backend's per-request origin/destination/element limits
+        return tiles(len(origins), len(destinations), self.backend.limits)
+
+    @staticmethod
+    def _stitchTiles(
+        origins: list[str],
+        destinations: list[str],
+        tileSlices: list,
+        responses: list[dict],
+    ) -> dict:
+        if not tileSlices:
+            # nothing to ask, e.g. nobody available to host
+            return buildResponse(origins, destinations, {})
+        if len(tileSlices) == 1:
+            return responses[0]
+
+        return stitch(len(origins), len(destinations), tileSlices, responses)
+
+    def _fetchTile(
+        self,
+        origins: list[str],
+        destinations: list[str],
+        transitMode: str,
+        departureTime: Union[str, dt],
+    ) -> dict:
+
+        def fetch(blockOrigins, blockDestinations):
+            return self._timedCall(
+                "distance_matrix",
+                self.backend.distanceMatrix,
+                blockOrigins,
+                blockDestinations,
+                mode=transitMode,
+                departureTime=departureTime,
+                units=len(blockOrigins) * len(blockDestinations),
+                key=(
+                    tuple(blockOrigins),
+                    tuple(blockDestinations),
+                    transitMode,
+                    departureTime,
+                ),
+            )
+
+        def failed():
+            answered = {
+                pair
+                for pair, elem in lookup.items()
+                if elem.get("status") not in TRANSIENT
+            }
+            return missingBlocks(origins, destinations, answered)
+
+        response = fetch(origins, destinations)
+        lookup = elementLookup(response, origins, destinations)
+
+        blocks = failed()
+        if not blocks:
+            return response
+
+        # re-queue only the elements that failed transiently
+        for attempt in range(self.scheduler.maxRetries):
+            self.metrics.retry("distance_matrix")
+            time.sleep(self.scheduler.backoff(attempt))
+            for blockOrigins, blockDestinations in blocks:
+                lookup.update(
+                    elementLookup(
+                        fetch(blockOrigins, blockDestinations),
+                        blockOrigins,
+                        blockDestinations,
+                    )
+                )
+            blocks = failed()
+            if not blocks:
+                break
+
+        # elements that never got an answer stay failed
+        for origin in origins:
+            for dest in destinations:
+                lookup.setdefault((origin, dest), {"status": "UNKNOWN_ERROR"})
+
+        return buildResponse(origins, destinations, lookup)
+
+    def _timedCall(
+        self, api: str, fn, *args, units: int = 1, key=None, **kwargs
+    ):
+        """
+        Calls fn through the scheduler and records the latency of every
+        attempt under api, and billed units and cost of the successful
+        ones (failed requests aren't billed). With a key (identifying the
+        request), calls joining an identical one in flight to the same
+        backend source, from any instance, aren't sent again.
+        """
+
+        def attempt():
+            with self._inFlight:
+                return timed()
+
+        def timed():
+            start = time.perf_counter()
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                billed = units if ok else 0
+                self.metrics.apiCall(
+                    api,
+                    time.perf_counter() - start,
+                    units=billed,
+                    cost=billed * self.backend.prices.get(api, 0.0),
+                    ok=ok,
+                )
+
+        return self.scheduler.run(
+            attempt,
+            units=units,
+            priority=self.priority,
+            onRetry=lambda: self.metrics.retry(api),
+            key=(
+                None
+                if key is None
+                else (self.backend.source, fn.__name__, key)
+            ),
+            onJoin=lambda: self.metrics.joined(api),
+        )
+
+    def _geocode(self, address: str) -> tuple[float, float]:
+        return self._timedCall(
+            "geocode", self.backend.geocode, address, key=address
         )
 
-        return dist_results
+    def _getLocation(self, addresses) -> list[tuple[float, float]]:
+        if self.geocodeCache is not None:
+            places = self._places(addresses)
+            for addy in addresses:
+                if addy not in places:
+                    raise ValueError(f"No location found for {addy!r}.")
+            return [(places[addy].lat, places[addy].lng) for addy in addresses]
 
-    def _getLocation(self, addresses):
-        locations = [self.gmaps.geolocate(addy) for addy in addresses]
+        unique = {addy: None for addy in addresses}
+        for addy in unique:
+            unique[addy] = self._geocode(addy)
+        locations = [unique[addy] for addy in addresses]
 
         return locations
 
     @classmethod
     def _json2Matrix(
         cls, jsonMatrix: dict, objective: str = "duration"
-    ) -> list[list[int]]:
+    ) -> list[list[float]]:
 
         matrix = []
 
-        # returns a #Start x #Destination matrix
+        # returns a #Start x #Destination matrix, unreachable pairs are inf
         for row in jsonMatrix["rows"]:
             rowList = []
             for elem in row["elements"]:
                 if elem["status"] == "OK":
                     rowList.append(elem[objective]["value"])
                 else:
-                    rowList.append(0)
+                    rowList.append(inf)
             matrix.append(rowList)
 
         return matrix
@@ -0,0 +1,138 @@
+"""
+Candidate meeting spots that are not anybody's home.
+
+Candidates are either given (e.g. a list of public venues) or sampled
+inside the convex hull of the friends' homes. Before any paid matrix
+element is requested, every candidate gets a cheap lower bound on its group
+score from straight-line distances and the fastest plausible speed of the
+mode. Candidates are then evaluated best bound first, and the search stops
+as soon as no remaining bound can beat the best scores found so far.
+"""
+
+from math import asin, cos, inf, radians, sin, sqrt
+from typing import Callable
+
+# generous upper bounds on average door-to-door speed in m/s, so that
+# distance / speed never overestimates the actual travel time
+MAX_SPEED = {
+    "driving": 130 / 3.6,
+    "transit": 160 / 3.6,
+    "bicycling": 40 / 3.6,
+    "walking": 7 / 3.6,
+}
+
+# objectives for which a per-friend lower bound gives a group lower bound
+BOUNDED_OBJECTIVES = ("minisum", "minimax", "weighted")
+
+EARTH_RADIUS = 6_371_000
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle distance in meters.
+    """
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * asin(sqrt(a))
+
+
+def locationKey(location: tuple[float, float]) -> str:
+    # the matrix API accepts "lat,lng" strings as origins and destinations
+    return f"{location[0]:.6f},{location[1]:.6f}"
+
+
+def sampleCandidates(
+    locations: list[tuple[float, float]], n: int = 50
+) -> list[tuple[float, float]]:
+    """
+    Samples n (lat, lng) points inside the convex hull of locations.
+    """
+    from .utils import convexArea, sampleWithinPoly
+
+    lat = [loc[0] for loc in locations]
+    lon = [loc[1] for loc in locations]
+
+    samples = sampleWithinPoly(convexArea(lon, lat), n=n)
+
+    return [(float(s[1]), float(s[0])) for s in samples]
+
+
+def lowerBounds(
+    origins: list[tuple[float, float]],
+    candidates: list[tuple[float, float]],
+    modes: tuple[str],
+    rankBy: str = "minisum",
+    weights: list[float] = None,
+    objective: str = "duration",
+) -> list[float]:
+    """
+    Lower bound of the group score of every candidate under rankBy, in
+    seconds for objective "duration" and in meters for "distance".
+    weights (per origin) only apply to rankBy "weighted".
+    """
+    if rankBy not in BOUNDED_OBJECTIVES:
+        raise ValueError(
+            f"Objective {rankBy} can't be bounded, pick one of "
+            f"{BOUNDED_OBJECTIVES}."
+        )
+
+    if objective == "distance":
+        speed = 1
+    else:
+        speed = max(
+            MAX_SPEED.get(mode, MAX_SPEED["transit"]) for mode in modes
+        )
+    if (weights is None) or (rankBy != "weighted"):
+        weights = [1] * len(origins)
+
+    bounds = []
+    for cand in candidates:
+        times = [haversine(*origin, *cand) / speed for origin in origins]
+        if rankBy == "minimax":
+            bounds.append(max(times, default=0))
+        else:
+            bounds.append(sum(w * t for w, t in zip(weights, times)))
+
+    return bounds
+
+
+def branchAndBound(
+    candidates: list,
+    bounds: list[float],
+    evaluate: Callable[[list], list[float]],
+    k: int = 1,
+    batchSize: int = 10,
+) -> tuple[list[tuple[float, object]], int]:
+    """
+    Evaluates candidates in order of increasing bound, `batchSize` at a
+    time, until the next bound can't beat the k-th best score found.
+
+    evaluate maps a list of candidates to their actual scores. Returns the
+    k best (score, candidate) pairs and the number of evaluated candidates.
+    """
+    order = sorted(range(len(candidates)), key=lambda i: bounds[i])
+
+    found = []
+    evaluated = 0
+    while evaluated < len(order):
+        kth = found[k - 1][0] if len(found) >= k else inf
+
+        # bounds are sorted, so the first one that can't win ends the search
+        batch = []
+        for i in order[evaluated : evaluated + batchSize]:
+            if bounds[i] >= kth:
+                break
+            batch.append(i)
+        if not batch:
+            break
+
+        scores = evaluate([candidates[i] for i in batch])
+        found.extend((s, candidates[i]) for s, i in zip(scores, batch))
+        found.sort(key=lambda pair: pair[0])
+        evaluated += len(batch)
+
+    return found[:k], evaluated
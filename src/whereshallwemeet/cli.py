@@ -0,0 +1,529 @@
+"""
+Command line interface and resident planning server.
+
+    wswm plan friends.csv --config config.py --mode best -k 3
+    wswm serve --config config.py --cache matrix.db --port 8765
+    wswm plan friends.csv --server http://127.0.0.1:8765
+
+The server (also on a Unix socket: serve --socket /tmp/wswm.sock, plan
+--server unix:/tmp/wswm.sock) keeps one WhereShallWeMeet per friends file
+(of the --max-planners last used ones) with its parsed roster and matrices,
+and one backend, i.e. one googlemaps
+client and connection pool, for all of them. An edited friends file is
+picked up with reloadFriends, which only refetches what changed.
+
+Endpoints: POST /plan with {"friends": path, ...plan options}, GET /metrics
+(Prometheus text) and GET /health. The server only plans friends files in
+its --rosters directory (the working directory by default), relative paths
+are taken from there.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import isinf
+from typing import Union
+from urllib.parse import urlsplit
+
+from .backends import Backend
+from .cache import MatrixCache
+from .caller import WhereShallWeMeet
+from .geocode import GeocodeCache
+from .metrics import Metrics
+from .scheduler import Scheduler
+from .solver import OBJECTIVES, HostScore
+
+_logger = logging.getLogger(__name__)
+
+# options of plan(), shared by the command line and POST /plan
+PLAN_OPTIONS = (
+    "transitMode",
+    "k",
+    "rankBy",
+    "weights",
+    "departureTime",
+    "objective",
+)
+
+OBJECTIVE_UNITS = ("duration", "distance")
+
+# planners kept warm, the least recently used one is dropped beyond
+MAX_PLANNERS = 32
+
+
+def checkOptions(
+    transitMode=None,
+    k=None,
+    rankBy=None,
+    weights=None,
+    departureTime=None,
+    objective=None,
+):
+    """
+    Raises a ValueError for plan options of the wrong type or value, e.g.
+    from a json request body.
+    """
+    if (transitMode is not None) and not isinstance(transitMode, str):
+        raise ValueError(f"transitMode {transitMode!r} is not a string.")
+    if (k is not None) and (
+        isinstance(k, bool) or not isinstance(k, int) or (k < 1)
+    ):
+        raise ValueError(f"k {k!r} is not a positive integer.")
+    if (rankBy is not None) and (rankBy not in OBJECTIVES):
+        raise ValueError(f"rankBy {rankBy!r} is not one of {OBJECTIVES}.")
+    if weights is not None:
+        if not isinstance(weights, dict) or not all(
+            isinstance(name, str)
+            and isinstance(w, (int, float))
+            and not isinstance(w, bool)
+            for name, w in weights.items()
+        ):
+            raise ValueError(
+                f"weights {weights!r} is not a mapping of names to numbers."
+            )
+    if (departureTime is not None) and not isinstance(
+        departureTime, (str, dt)
+    ):
+        raise ValueError(
+            f"departureTime {departureTime!r} is not an ISO date and time."
+        )
+    if (objective is not None) and (objective not in OBJECTIVE_UNITS):
+        raise ValueError(
+            f"objective {objective!r} is not one of {OBJECTIVE_UNITS}."
+        )
+
+
+class PlanningService:
+    """
+    Everything worth keeping warm between two questions: planners with
+    their rosters and matrices, the element and geocode caches, the
+    backend, metrics and the request scheduler.
+
+    At most maxPlanners planners are kept, the least recently used one is
+    dropped (with its matrices, the element cache still has them).
+
+    With a rosterDir, only friends files in there are planned.
+    """
+
+    def __init__(
+        self,
+        configPath: str = None,
+        cache: Union[str, MatrixCache] = None,
+        geocodeCache: Union[str, GeocodeCache] = None,
+        maxWorkers: int = 8,
+        backend: Backend = None,
+        maxPlanners: int = MAX_PLANNERS,
+        rosterDir: str = None,
+    ):
+
+        self.configPath = configPath
+        self.rosterDir = (
+            None if rosterDir is None else pathlib.Path(rosterDir).resolve()
+        )
+        if cache is None:
+            cache = MatrixCache()
+        elif isinstance(cache, (str, pathlib.Path)):
+            cache = MatrixCache(cache)
+        self.cache = cache
+        if isinstance(geocodeCache, (str, pathlib.Path)):
+            geocodeCache = GeocodeCache(geocodeCache)
+        self.geocodeCache = geocodeCache
+        self.maxWorkers = maxWorkers
+
+        self.metrics = Metrics()
+        self.scheduler = Scheduler()
+        self._backend = backend
+
+        self._lock = threading.Lock()
+        # friends file -> [mtime, planner, lock], least recently used first
+        self._planners = OrderedDict()
+        self.maxPlanners = maxPlanners
+
+    @property
+    def backend(self) -> Backend:
+
+        with self._lock:
+            if self._backend is None:
+                self._backend = WhereShallWeMeet(
+                    configPath=self.configPath
+                ).backend
+
+        return self._backend
+
+    def planner(self, friendsFile: str) -> tuple[WhereShallWeMeet, object]:
+        """
+        The planner of friendsFile and the lock to hold while using it.
+        """
+        path = pathlib.Path(friendsFile)
+        if self.rosterDir is not None:
+            path = self.rosterDir / path
+            if not path.resolve().is_relative_to(self.rosterDir):
+                raise ValueError(
+                    f"{friendsFile} is not in the roster directory."
+                )
+        path = str(path.resolve())
+        mtime = os.stat(path).st_mtime
+
+        with self._lock:
+            entry = self._planners.get(path)
+            if entry is None:
+                planner = WhereShallWeMeet(
+                    path,
+                    configPath=self.configPath,
+                    cache=self.cache,
+                    maxWorkers=self.maxWorkers,
+                    geocodeCache=self.geocodeCache,
+                    metrics=self.metrics,
+                    scheduler=self.scheduler,
+                )
+                entry = [None, planner, threading.Lock()]
+                self._planners[path] = entry
+                while len(self._planners) > self.maxPlanners:
+                    # requests still using it keep their reference
+                    dropped, _ = self._planners.popitem(last=False)
+                    _logger.info("Dropped the planner of %s", dropped)
+            else:
+                self._planners.move_to_end(path)
+        _, planner, lock = entry
+
+        planner._backend = self.backend
+        with lock:
+            if entry[0] != mtime:
+                if entry[0] is not None:
+                    _logger.info(
+                        "%s changed: %s", path, planner.reloadFriends()
+                    )
+                entry[0] = mtime
+
+        return planner, lock
+
+    def plan(
+        self,
+        friendsFile: str,
+        transitMode: str = "transit",
+        k: int = 3,
+        rankBy: str = "minisum",
+        weights: dict = None,
+        departureTime: Union[str, dt] = None,
+        objective: str = "duration",
+    ) -> list[HostScore]:
+
+        checkOptions(transitMode, k, rankBy, weights, departureTime, objective)
+        if isinstance(departureTime, str) and (departureTime != "now"):
+            departureTime = dt.fromisoformat(departureTime)
+
+        planner, lock = self.planner(friendsFile)
+        with lock:
+            return planner.bestHosts(
+                k=k,
+                rankBy=rankBy,
+                weights=weights,
+                transitMode=transitMode,
+                departureTime=departureTime,
+                objective=objective,
+            )
+
+
+def _jsonable(ranking: list[HostScore]) -> list[dict]:
+    # json has no inf, unreachable hosts get null
+    return [
+        {
+            key: None if isinstance(value, float) and isinf(value) else value
+            for key, value in score._asdict().items()
+        }
+        for score in ranking
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, status: int, body, contentType="application/json"):
+        data = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send(200, self.service.metrics.toPrometheus(), "text/plain")
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self):
+        if self.path != "/plan":
+            self._send(404, {"error": f"Unknown path {self.path}."})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body is not a json object.")
+            if not isinstance(body["friends"], str):
+                raise ValueError("friends is not a path.")
+            options = {key: body[key] for key in PLAN_OPTIONS if key in body}
+            ranking = self.service.plan(body["friends"], **options)
+        except (
+            KeyError,
+            ValueError,
+            FileNotFoundError,
+            IsADirectoryError,
+            PermissionError,
+        ) as e:
+            self._send(400, {"error": f"{type(e).__name__}: {e}"})
+        except OSError as e:
+            # e.g. the backend can't be reached, not the client's fault
+            _logger.exception("Planning failed")
+            self._send(502, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            _logger.exception("Planning failed")
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send(200, {"hosts": _jsonable(ranking)})
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        _logger.info("%s %s", self.address_string(), format % args)
+
+
+class _UnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def serve(
+    service: PlanningService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socketPath: str = None,
+):
+    """
+    Answers requests until interrupted.
+    """
+    handler = type("Handler", (_Handler,), {"service": service})
+    if socketPath is not None:
+        if os.path.exists(socketPath):
+            os.unlink(socketPath)
+        server = _UnixHTTPServer(socketPath, handler)
+        _logger.info("Listening on %s", socketPath)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        _logger.info("Listening on http://%s:%d", host, port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socketPath is not None:
+            os.unlink(socketPath)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 300):
+        super().__init__("localhost", timeout=timeout)
+        self.socketPath = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socketPath)
+
+
+def request(server: str, path: str, body: dict = None):
+    """
+    Sends a request to a running server, e.g. "http://127.0.0.1:8765" or
+    "unix:/tmp/wswm.sock", and returns the decoded answer.
+    """
+    if server.startswith("unix:"):
+        connection = _UnixConnection(server[len("unix:") :])
+    else:
+        url = urlsplit(server)
+        connection = http.client.HTTPConnection(
+            url.hostname, url.port or 80, timeout=300
+        )
+
+    try:
+        if body is None:
+            connection.request("GET", path)
+        else:
+            connection.request(
+                "POST",
+                path,
+                body=json.dumps(body),
+                headers={"Content-Type": "application/json"},
+            )
+        response = connection.getresponse()
+        data = response.read().decode()
+    finally:
+        connection.close()
+
+    if not response.headers.get("Content-Type", "").startswith(
+        "application/json"
+    ):
+        return data
+    answer = json.loads(data)
+    if response.status != 200:
+        raise RuntimeError(answer.get("error", response.reason))
+    return answer
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="wswm", description="Where shall we meet?"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="best hosts for a friends file")
+    plan.add_argument("friends", help="friends csv or yaml file")
+    plan.add_argument(
+        "--mode",
+        dest="transitMode",
+        default="transit",
+        help="transit, driving, ..., best or custom",
+    )
+    plan.add_argument("-k", type=int, default=3)
+    plan.add_argument(
+        "--rank-by", dest="rankBy", default="minisum", choices=OBJECTIVES
+    )
+    plan.add_argument(
+        "--weights", type=json.loads, help='json, e.g. {"Ann": 2}'
+    )
+    plan.add_argument(
+        "--departure",
+        dest="departureTime",
+        help="ISO date and time or now (default: next Wednesday 18:00)",
+    )
+    plan.add_argument(
+        "--objective", default="duration", choices=OBJECTIVE_UNITS
+    )
+    plan.add_argument("--json", action="store_true", help="print json")
+    plan.add_argument(
+        "--server", help="ask a running server instead of planning here"
+    )
+
+    serve = commands.add_parser("serve", help="run the planning server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--socket", dest="socketPath", help="Unix socket")
+    serve.add_argument(
+        "--max-planners",
+        dest="maxPlanners",
+        type=int,
+        default=MAX_PLANNERS,
+        help="friends files kept warm",
+    )
+    serve.add_argument(
+        "--rosters",
+        dest="rosterDir",
+        default=".",
+        help="directory of the friends files to plan (default: .)",
+    )
+
+    for command in (plan, serve):
+        command.add_argument("--config", dest="configPath")
+        command.add_argument("--cache", help="matrix element cache file")
+        command.add_argument(
+            "--weekly",
+            action="store_true",
+            help="reuse cached elements of the same weekday and time",
+        )
+        command.add_argument(
+            "--geocode-cache", dest="geocodeCache", help="geocode cache file"
+        )
+        command.add_argument(
+            "--workers", dest="maxWorkers", type=int, default=8
+        )
+
+    return parser
+
+
+def _cache(opts) -> Union[str, MatrixCache, None]:
+    if opts.weekly and (opts.cache is not None):
+        return MatrixCache(opts.cache, recurring=True)
+    return opts.cache
+
+
+def main(args=None) -> int:
+    opts = _parser().parse_args(args)
+    logging.basicConfig(
+        level=logging.INFO if opts.verbose else logging.WARNING,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    )
+
+    if opts.command == "serve":
+        service = PlanningService(
+            configPath=opts.configPath,
+            cache=_cache(opts),
+            geocodeCache=opts.geocodeCache,
+            maxWorkers=opts.maxWorkers,
+            maxPlanners=opts.maxPlanners,
+            rosterDir=opts.rosterDir,
+        )
+        serve(service, opts.host, opts.port, socketPath=opts.socketPath)
+        return 0
+
+    options = {
+        key: getattr(opts, key)
+        for key in PLAN_OPTIONS
+        if getattr(opts, key) is not None
+    }
+    if opts.server is not None:
+        body = {"friends": str(pathlib.Path(opts.friends).resolve())}
+        hosts = request(opts.server, "/plan", {**body, **options})["hosts"]
+    else:
+        service = PlanningService(
+            configPath=opts.configPath,
+            cache=_cache(opts),
+            geocodeCache=opts.geocodeCache,
+            maxWorkers=opts.maxWorkers,
+        )
+        hosts = _jsonable(service.plan(opts.friends, **options))
+
+    if opts.json:
+        print(json.dumps(hosts, indent=2))
+        return 0
+
+    unit, scale = ("min", 60) if opts.objective == "duration" else ("km", 1000)
+    for rank, score in enumerate(hosts, start=1):
+        if score["worst"] is None:
+            print(f"{rank}. {score['host']}: unreachable for somebody")
+        else:
+            print(
+                f"{rank}. {score['host']}: score {score['score']:.4g}, "
+                f"worst {score['worst'] / scale:.0f} {unit}"
+            )
+
+    return 0
+
+
+def run():
+    """
+    Entry point of the wswm console script.
+    """
+    sys.exit(main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,581 @@
+"""
+Approximate friends x hosts matrices for large groups.
+
+Travel times from nearby homes to nearby hosts are strongly correlated, so a
+sparse sample of a matrix goes a long way. Per mode, the sampled elements
+calibrate the model
+
+    T[i][j] ~ mu + a[i] + b[j] + c * d[i][j] + u[i] . v[j]
+
+of friend and host effects, a slope on the straight-line distance d (km)
+and a low-rank interaction, fitted by alternating ridge regression. Before
+the final fit a share of the sample is held out to measure how far off the
+model really is, which scales the per-cell error estimates.
+
+Samples are rectangular blocks (a group of friends x some hosts), so every
+element the API bills for is used. Ranking then iterates: matrices are
+drawn from the estimates and their errors, and hosts whose place in the top
+k is still uncertain get more of their column queried, friends with the
+largest errors first. Once the top k is settled their columns are queried
+in full, so the winners' scores are exact.
+"""
+
+import heapq
+import random
+from math import ceil, erf, exp, inf, isinf, pi, sqrt
+from operator import itemgetter, mul
+from typing import Callable, NamedTuple
+
+from .candidates import haversine
+from .matrix import pairBlocks
+from .scenarios import _score
+from .solver import OBJECTIVES
+
+# share of the sampled elements held out to calibrate the error estimates
+HOLDOUT = 0.1
+
+# relative improvement of the squared residuals at which fitting stops
+TOLERANCE = 1e-4
+
+# pseudo-count pulling per-friend and per-host errors towards the overall
+PRIOR = 3
+
+
+class Completion(NamedTuple):
+    # completed friends x hosts matrix, over the fastest mode of each cell
+    M: list[list[float]]
+    # standard error of every cell, 0 where the element was queried
+    error: list[list[float]]
+    # per host, the part of its cells' errors they share
+    hostError: list[float]
+    # per host, share of drawn matrices in which it made the top k
+    topShare: list[float]
+    # matrix elements requested (cached ones included)
+    elements: int
+    # elements of the full matrices
+    total: int
+
+
+def _groups(index: list[int], size: int) -> list[tuple[int, Callable]]:
+    """
+    (n, getter) for every n in index, the getter picking the entries of a
+    per-cell list that belong to n.
+    """
+    members = [[] for _ in range(size)]
+    for cell, n in enumerate(index):
+        members[n].append(cell)
+
+    return [
+        (n, itemgetter(*cells) if len(cells) > 1 else _single(cells[0]))
+        for n, cells in enumerate(members)
+        if cells
+    ]
+
+
+def _single(cell: int) -> Callable:
+    return lambda values: (values[cell],)
+
+
+class GeoLowRank:
+    """
+    The model above, for one mode.
+    """
+
+    def __init__(
+        self,
+        distances: list[list[float]],
+        rank: int = 1,
+        ridge: float = 1.0,
+        iterations: int = 50,
+        seed: int = None,
+    ):
+
+        self.distances = distances
+        self.rank = rank
+        self.ridge = ridge
+        self.iterations = iterations
+        self._random = random.Random(seed)
+
+        nFriends = len(distances)
+        nHosts = len(distances[0]) if distances else 0
+        self.mu = 0.0
+        self.a = [0.0] * nFriends
+        self.b = [0.0] * nHosts
+        self.c = 0.0
+        self.u = [[0.0] * nFriends for _ in range(rank)]
+        self.v = [
+            [self._random.gauss(0, 1) for _ in range(nHosts)]
+            for _ in range(rank)
+        ]
+
+    def _interaction(self, i: int, j: int) -> float:
+        return sum(u[i] * v[j] for u, v in zip(self.u, self.v))
+
+    def predict(self, i: int, j: int) -> float:
+        return max(
+            0.0,
+            self.mu
+            + self.a[i]
+            + self.b[j]
+            + self.c * self.distances[i][j]
+            + self._interaction(i, j),
+        )
+
+    def fit(self, cells: list[tuple[int, int, float]]) -> "GeoLowRank":
+        """
+        Fits (friend, host, value) cells, unreachable (inf) ones excluded.
+        """
+        cells = [(i, j, y) for i, j, y in cells if not isinf(y)]
+        if not cells:
+            return self
+        rows = [i for i, _, _ in cells]
+        cols = [j for _, j, _ in cells]
+        dist = [self.distances[i][j] for i, j, _ in cells]
+        dist2 = sum(map(mul, dist, dist))
+        # residuals are kept up to date after every parameter update
+        res = [y - self.predict(i, j) for i, j, y in cells]
+        lam = self.ridge
+        byRow = _groups(rows, len(self.a))
+        byCol = _groups(cols, len(self.b))
+
+        def solve(values, groups, weight=None):
+            # ridge solution of every entry in values given the others
+            delta = [0.0] * len(values)
+            for n, get in groups:
+                r = get(res)
+                if weight is None:
+                    num, den = sum(r), len(r)
+                else:
+                    w = get(weight)
+                    num, den = sum(map(mul, w, r)), sum(map(mul, w, w))
+                new = (num + den * values[n]) / (den + lam)
+                delta[n] = new - values[n]
+                values[n] = new
+            return delta
+
+        loss = inf
+        for _ in range(self.iterations):
+            delta = sum(res) / len(res)
+            self.mu += delta
+            res = [r - delta for r in res]
+
+            c = (sum(map(mul, dist, res)) + dist2 * self.c) / (dist2 + lam)
+            delta, self.c = c - self.c, c
+            res = [r - delta * d for r, d in zip(res, dist)]
+
+            delta = solve(self.a, byRow)
+            res = [r - delta[i] for r, i in zip(res, rows)]
+            delta = solve(self.b, byCol)
+            res = [r - delta[j] for r, j in zip(res, cols)]
+
+            # effects only matter up to a constant, keep theirs in mu so
+            # they don't drift off together
+            for effect, groups in ((self.a, byRow), (self.b, byCol)):
+                shift = sum(effect[n] for n, _ in groups) / len(groups)
+                self.mu += shift
+                for n, _ in groups:
+                    effect[n] -= shift
+
+            for u, v in zip(self.u, self.v):
+                delta = solve(u, byRow, [v[j] for j in cols])
+                res = [r - delta[i] * v[j] for r, i, j in zip(res, rows, cols)]
+                delta = solve(v, byCol, [u[i] for i in rows])
+                res = [r - u[i] * delta[j] for r, i, j in zip(res, rows, cols)]
+
+            previous, loss = loss, sum(map(mul, res, res))
+            if previous - loss <= TOLERANCE * loss:
+                break
+
+        return self
+
+
+def _errors(
+    model: GeoLowRank, cells: list[tuple[int, int, float]], scale: float
+) -> tuple[Callable[[int, int], float], list[float]]:
+    """
+    Standard error of a cell from the residuals of its friend and host,
+    shrunk towards the overall residual and rescaled to the held out error,
+    and the error every estimate of a host shares (that of its effect b).
+    A host with few or no cells has its effect only known up to the spread
+    of the host effects that were seen.
+    """
+    nFriends, nHosts = len(model.a), len(model.b)
+    rowSum, rowCount = [0.0] * nFriends, [0] * nFriends
+    colSum, colCount = [0.0] * nHosts, [0] * nHosts
+    total = 0.0
+    finite = 0
+    for i, j, y in cells:
+        if isinf(y):
+            continue
+        e2 = (y - model.predict(i, j)) ** 2
+        rowSum[i] += e2
+        rowCount[i] += 1
+        colSum[j] += e2
+        colCount[j] += 1
+        total += e2
+        finite += 1
+
+    seen = [b for b, n in zip(model.b, colCount) if n]
+    spread = sum(b * b for b in seen) / (len(seen) or 1)
+
+    overall = total / (finite or 1)
+    if overall == 0:
+        return (lambda i, j: scale), [
+            0.0 if n else sqrt(spread) for n in colCount
+        ]
+    factor = scale / sqrt(overall)
+    rows = [
+        (rowSum[i] + PRIOR * overall) / (rowCount[i] + PRIOR)
+        for i in range(nFriends)
+    ]
+    cols = [
+        (colSum[j] + PRIOR * overall) / (colCount[j] + PRIOR)
+        for j in range(nHosts)
+    ]
+
+    # posterior error of b with the spread of effects as prior
+    shared = [
+        (
+            sqrt(1 / (colCount[j] / (factor * factor * cols[j]) + 1 / spread))
+            if spread
+            else factor * sqrt(cols[j] / (colCount[j] + 1))
+        )
+        for j in range(nHosts)
+    ]
+
+    return (lambda i, j: factor * sqrt((rows[i] + cols[j]) / 2)), shared
+
+
+def _estimate(
+    distances: list[list[float]],
+    observed: dict,
+    ranks: list[int],
+    rng: random.Random,
+) -> tuple[GeoLowRank, Callable[[int, int], float], list[float]]:
+    """
+    Model fitted on all observed cells and its error estimates (see
+    _errors). A held out share of the cells picks the interaction rank
+    among ranks and calibrates the errors.
+    """
+    cells = [(i, j, y) for (i, j), y in observed.items()]
+    finite = [cell for cell in cells if not isinf(cell[2])]
+    seed = rng.getrandbits(32)
+
+    nHeld = int(HOLDOUT * len(finite))
+    if nHeld:
+        held = set(rng.sample(range(len(finite)), nHeld))
+        train = [cell for n, cell in enumerate(finite) if n not in held]
+        probe = [cell for n, cell in enumerate(finite) if n in held]
+        # sparse rows overfit interactions, keep the rank that predicts
+        scale, rank = min(
+            (
+                sqrt(
+                    sum((y - model.predict(i, j)) ** 2 for i, j, y in probe)
+                    / nHeld
+                ),
+                r,
+            )
+            for r, model in (
+                (r, GeoLowRank(distances, r, seed=seed).fit(train))
+                for r in ranks
+            )
+        )
+    else:
+        scale, rank = None, min(ranks)
+
+    model = GeoLowRank(distances, rank, seed=seed).fit(cells)
+    if scale is None:
+        # too few samples to hold any out: residuals of the fit, inflated
+        scale = sqrt(
+            sum((y - model.predict(i, j)) ** 2 for i, j, y in finite)
+            / max(1, len(finite) - 2)
+        )
+
+    return (model, *_errors(model, cells, scale))
+
+
+def _fastest(t1: float, e1: float, t2: float, e2: float):
+    """
+    Mean and standard error of the faster of two independent normal travel
+    times (Clark's formulas); the min of two estimates would be biased up.
+    """
+    theta = sqrt(e1 * e1 + e2 * e2)
+    if (theta == 0) or isinf(t1) or isinf(t2):
+        return (t1, e1) if t1 <= t2 else (t2, e2)
+
+    beta = (t2 - t1) / theta
+    p = (1 + erf(beta / sqrt(2))) / 2
+    density = exp(-beta * beta / 2) / sqrt(2 * pi)
+    mean = t1 * p + t2 * (1 - p) - theta * density
+    square = (
+        (t1 * t1 + e1 * e1) * p
+        + (t2 * t2 + e2 * e2) * (1 - p)
+        - (t1 + t2) * theta * density
+    )
+    return mean, sqrt(max(0.0, square - mean * mean))
+
+
+def topShares(
+    M: list[list[float]],
+    error: list[list[float]],
+    hostError: list[float],
+    k: int,
+    rankBy: str = "minisum",
+    weights: list[float] = None,
+    draws: int = 32,
+    rng: random.Random = None,
+) -> list[float]:
+    """
+    Share of matrices drawn from M and its errors in which each host ranks
+    among the top k. The estimates of a host err together by its hostError
+    (normal), the rest of a cell's error is independent of the others.
+    """
+    rng = rng or random.Random()
+    nFriends = len(M)
+    everyone = range(nFriends)
+    if (rankBy != "weighted") or (weights is None):
+        # only the weighted objective weighs friends
+        weights = [1] * nFriends
+    columns = list(zip(*M))
+    independent = [
+        [sqrt(max(0.0, e * e - s * s)) for e in col]
+        for col, s in zip(zip(*error), hostError)
+    ]
+    estimated = [[bool(e) for e in col] for col in zip(*error)]
+    nHosts = len(columns)
+
+    if rankBy in ("minisum", "weighted"):
+        # sums of normal errors are normal, one draw per host does
+        means = [_score(col, everyone, rankBy, weights) for col in columns]
+        spreads = [
+            sqrt(
+                sum((w * e) ** 2 for w, e in zip(weights, ind))
+                + (s * sum(w for w, est in zip(weights, mask) if est)) ** 2
+            )
+            for ind, mask, s in zip(independent, estimated, hostError)
+        ]
+        low = [m - 4 * s for m, s in zip(means, spreads)]
+        high = [m + 4 * s for m, s in zip(means, spreads)]
+
+        def draw(j):
+            return rng.gauss(means[j], spreads[j])
+
+    else:
+
+        def draw(j):
+            shift = hostError[j] * rng.gauss(0, 1)
+            drawn = [
+                max(0.0, t + shift + e * rng.gauss(0, 1)) if est else t
+                for t, e, est in zip(columns[j], independent[j], estimated[j])
+            ]
+            return _score(drawn, everyone, rankBy, weights)
+
+        if rankBy == "minimax":
+            # the worst travel time of a host at 4 sigma either way
+            bounds = [
+                [
+                    max(
+                        (
+                            t + sign * 4 * (e + s) if est else t
+                            for t, e, est in zip(col, ind, mask)
+                        ),
+                        default=0,
+                    )
+                    for col, ind, mask, s in zip(
+                        columns, independent, estimated, hostError
+                    )
+                ]
+                for sign in (-1, 1)
+            ]
+            low, high = bounds
+        else:
+            low = [-inf] * nHosts
+            high = [inf] * nHosts
+
+    # hosts that can't make the top k even at 4 sigma are out
+    cutoff = heapq.nsmallest(k, high)[-1] if high else inf
+    contenders = [j for j in range(nHosts) if low[j] <= cutoff]
+
+    shares = [0.0] * nHosts
+    if len(contenders) <= k:
+        for j in contenders:
+            shares[j] = 1.0
+        return shares
+
+    if not any(any(mask) for mask in estimated):
+        draws = 1
+    for _ in range(draws):
+        scores = [(draw(j), j) for j in contenders]
+        for _, j in heapq.nsmallest(k, scores):
+            shares[j] += 1 / draws
+
+    return shares
+
+
+def complete(
+    rows: dict,
+    homes: list[tuple[float, float]],
+    hostHomes: list[tuple[float, float]],
+    fetch: Callable[[str, list[int], list[int]], list[list[float]]],
+    k: int = 3,
+    rankBy: str = "minisum",
+    weights: list[float] = None,
+    sample: float = 0.1,
+    groupSize: int = 10,
+    maxElements: int = None,
+    confidence: float = 0.95,
+    rank: int = 1,
+    draws: int = 32,
+    batchSize: int = None,
+    seed: int = None,
+) -> Completion:
+    """
+    rows maps every mode to the friends (indices into homes) travelling
+    with it. fetch(mode, friends, hosts) returns the friends x hosts
+    travel times of mode, inf where there is no route. Every friend gets
+    a `sample` share of the hosts queried up front, then at most batchSize
+    elements (by default 2% of the full matrices) per round are spent where
+    the top k is uncertain, within maxElements overall.
+    """
+    if rankBy not in OBJECTIVES:
+        raise ValueError(
+            f"Unknown objective {rankBy}, pick one of {OBJECTIVES}."
+        )
+    if (rankBy == "weighted") and (weights is None):
+        raise ValueError("Objective weighted requires weights.")
+
+    rng = random.Random(seed)
+    nFriends, nHosts = len(homes), len(hostHomes)
+    total = sum(len(friends) for friends in rows.values()) * nHosts
+    if maxElements is None:
+        maxElements = total
+    if batchSize is None:
+        batchSize = max(500, total // 50)
+    k = min(k, nHosts)
+
+    distances = [
+        [haversine(*home, *host) / 1000 for host in hostHomes]
+        for home in homes
+    ]
+    observed = {mode: {} for mode in rows}
+    ranksTried = list(range(rank + 1))
+    ranks = {}
+    spent = 0
+
+    def query(mode: str, friends: list[int], hosts: list[int]) -> int:
+        """
+        Fetches the cells of friends x hosts not known yet, as far as the
+        budget goes. Returns the number of elements requested.
+        """
+        nonlocal spent
+        known = observed[mode]
+        needed = {
+            i: [j for j in hosts if (i, j) not in known] for i in friends
+        }
+        requested = 0
+        for blockFriends, blockHosts in pairBlocks(needed):
+            affordable = (maxElements - spent) // len(blockHosts)
+            blockFriends = blockFriends[:affordable]
+            if not blockFriends:
+                continue
+            values = fetch(mode, blockFriends, blockHosts)
+            for i, row in zip(blockFriends, values):
+                for j, value in zip(blockHosts, row):
+                    known[(i, j)] = value
+            spent += len(blockFriends) * len(blockHosts)
+            requested += len(blockFriends) * len(blockHosts)
+        return requested
+
+    # balanced initial sample: groups of friends x hosts, cycling through
+    # a shuffled host order so every host is covered about equally
+    perFriend = min(nHosts, max(2, ceil(sample * nHosts)))
+    hostOrder = list(range(nHosts))
+    rng.shuffle(hostOrder)
+    position = 0
+    for mode, friends in rows.items():
+        friends = list(friends)
+        rng.shuffle(friends)
+        for start in range(0, len(friends), groupSize):
+            hosts = [
+                hostOrder[(position + n) % nHosts] for n in range(perFriend)
+            ]
+            position += perFriend
+            query(mode, friends[start : start + groupSize], hosts)
+
+    while True:
+        # per mode estimates, then the fastest mode per cell
+        M = [[inf] * nHosts for _ in range(nFriends)]
+        error = [[0.0] * nHosts for _ in range(nFriends)]
+        hostError = [0.0] * nHosts
+        errors = {}
+        for mode, friends in rows.items():
+            model, cellError, shared = _estimate(
+                distances, observed[mode], ranks.get(mode, ranksTried), rng
+            )
+            # later samples are chosen, not random: keep the rank
+            ranks[mode] = [model.rank]
+            hostError = list(map(max, hostError, shared))
+            known = observed[mode]
+            modeErrors = {}
+            for i in friends:
+                for j in range(nHosts):
+                    if (i, j) in known:
+                        t, e = known[(i, j)], 0.0
+                    else:
+                        t = model.predict(i, j)
+                        e = sqrt(cellError(i, j) ** 2 + shared[j] ** 2)
+                        modeErrors[(i, j)] = e
+                    M[i][j], error[i][j] = _fastest(M[i][j], error[i][j], t, e)
+            errors[mode] = modeErrors
+
+        shares = topShares(M, error, hostError, k, rankBy, weights, draws, rng)
+        if spent >= maxElements:
+            break
+
+        uncertain = sorted(
+            (
+                j
+                for j in range(nHosts)
+                if 1 - confidence < shares[j] < confidence
+            ),
+            key=lambda j: abs(shares[j] - 0.5),
+        )
+        if uncertain:
+            hosts = uncertain[: max(1, batchSize // groupSize)]
+            nRows = max(1, batchSize // len(hosts))
+            # friends whose travel times to those hosts are least certain
+            candidates = heapq.nlargest(
+                nRows,
+                (
+                    (
+                        sum(errors[mode].get((i, j), 0.0) ** 2 for j in hosts),
+                        mode,
+                        i,
+                    )
+                    for mode, friends in rows.items()
+                    for i in friends
+                ),
+            )
+            requested = 0
+            for mode in rows:
+                friends = [i for e, m, i in candidates if e and (m == mode)]
+                if friends:
+                    requested += query(mode, friends, hosts)
+            if requested:
+                continue
+
+        # settled (or nothing left to learn): make the top k exact
+        scores = [
+            _score(col, range(nFriends), rankBy, weights or [1] * nFriends)
+            for col in zip(*M)
+        ]
+        top = heapq.nsmallest(
+            k, range(nHosts), key=lambda j: (-shares[j], scores[j])
+        )
+        requested = 0
+        for mode, friends in rows.items():
+            requested += query(mode, list(friends), top)
+        if not requested:
+            break
+
+    return Completion(M, error, hostError, shares, spent, total)
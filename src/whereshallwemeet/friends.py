@@ -0,0 +1,289 @@
+"""
+Streaming friends file loader.
+
+Rosters come as csv (one header row, columns found by keyword: name,
+address, preferred, host, joins), yaml (a `friends` list) or JSON Lines
+(.jsonl/.ndjson, one friend per line), the latter two with the keys name,
+address, preferredTransitMode, availableToHost and joinsParty.
+
+Rows are parsed one at a time into Friend records, friends that don't join
+are dropped right away, so csv and JSON Lines exports of any length are
+read in memory proportional to the people joining. yaml documents are
+composed by PyYAML as a whole, their entries are converted one at a time.
+
+Flags accept yes/no, true/false, y/n, 1/0 and x or blank (in any case).
+load reads the whole file and raises one ValueError naming the file and
+the line of every bad row:
+
+    roster = load("friends.csv")
+    roster.friends[roster.index["Ann"]].address
+"""
+
+import json
+import pathlib
+from typing import Iterator, NamedTuple
+
+# googlemaps travel modes
+TRANSIT_MODES = ("transit", "driving", "walking", "bicycling")
+DEFAULT_MODE = "transit"
+
+TRUE = frozenset(("yes", "y", "true", "t", "1", "x"))
+FALSE = frozenset(("no", "n", "false", "f", "0", ""))
+
+# csv header keyword of each field
+COLUMNS = {
+    "name": "name",
+    "address": "address",
+    "preferredTransitMode": "preferred",
+    "availableToHost": "host",
+    "joinsParty": "joins",
+}
+
+
+class Friend(NamedTuple):
+    name: str
+    address: str
+    preferredTransitMode: str
+    availableToHost: bool
+    joinsParty: bool
+
+    def __getitem__(self, key):
+        # friends used to be dicts, friend["name"] keeps working
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+
+class Roster(NamedTuple):
+    # friends joining the party, sorted by name
+    friends: list[Friend]
+    names: list[str]
+    # name -> position in friends
+    index: dict
+    # positions and names of the friends available to host
+    hostIndex: list[int]
+    hosts: list[str]
+
+
+def parseFlag(value, field: str = "flag") -> bool:
+
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+
+    word = str(value).strip().lower()
+    if word in TRUE:
+        return True
+    if word in FALSE:
+        return False
+    raise ValueError(f"{field} {value!r} is not a yes/no value")
+
+
+def parseMode(value) -> str:
+
+    mode = str(value or "").strip().lower() or DEFAULT_MODE
+    # canonical strings, shared by all records
+    for known in TRANSIT_MODES:
+        if mode == known:
+            return known
+    raise ValueError(
+        f"Unknown transit mode {value!r}, pick one of {TRANSIT_MODES}"
+    )
+
+
+def findColumns(header: list[str]) -> dict:
+    """
+    {field: column} of the csv header, every keyword must be contained in
+    exactly one column header.
+    """
+    lowered = [col.strip().lower() for col in header]
+    columns = {}
+    for field, word in COLUMNS.items():
+        shoeFits = [i for i, col in enumerate(lowered) if word in col]
+        if len(shoeFits) > 1:
+            raise ValueError(f"More than one column header contains {word}.")
+        elif len(shoeFits) == 0:
+            raise ValueError(f"No column header contains keyword {word}")
+        columns[field] = shoeFits[0]
+
+    return columns
+
+
+def _csvEntries(path: pathlib.Path) -> Iterator[tuple[int, dict]]:
+    import csv
+
+    # utf-8-sig: spreadsheet exports often start with a byte order mark
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{path}: friends file is empty.")
+        try:
+            columns = findColumns(header)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+        width = max(columns.values()) + 1
+
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) < width:
+                yield reader.line_num, ValueError(
+                    f"expected at least {width} columns, got {len(row)}"
+                )
+                continue
+            yield reader.line_num, {
+                field: row[col] for field, col in columns.items()
+            }
+
+
+def _jsonlEntries(path: pathlib.Path) -> Iterator[tuple[int, dict]]:
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line, text in enumerate(f, start=1):
+            if not text.strip():
+                continue
+            try:
+                entry = json.loads(text)
+            except ValueError as e:
+                entry = ValueError(str(e))
+            yield line, entry
+
+
+def _yamlEntries(path: pathlib.Path) -> Iterator[tuple[int, dict]]:
+    import yaml
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        loader = yaml.FullLoader(f)
+        try:
+            root = loader.get_single_node()
+            if not isinstance(root, yaml.MappingNode):
+                raise ValueError(f"{path}: needs a friends list.")
+            items = [
+                node
+                for key, node in root.value
+                if loader.construct_object(key) == "friends"
+            ]
+            if not items or not isinstance(items[0], yaml.SequenceNode):
+                raise ValueError(f"{path}: needs a friends list.")
+
+            for node in items[0].value:
+                entry = loader.construct_object(node, deep=True)
+                # don't keep every constructed entry alive
+                loader.constructed_objects.clear()
+                yield node.start_mark.line + 1, entry
+        finally:
+            loader.dispose()
+
+
+def _parse(entry) -> Friend:
+    """
+    Friend of a csv row or yaml/json entry. Entries without joinsParty
+    join, entries without availableToHost don't host.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError(f"expected a mapping, got {type(entry).__name__}")
+
+    joins = parseFlag(entry.get("joinsParty", True), "joinsParty")
+    if not joins:
+        # whatever else is in there doesn't matter
+        return Friend(
+            str(entry.get("name", "")), "", DEFAULT_MODE, False, False
+        )
+
+    name = str(entry.get("name") or "").strip()
+    address = str(entry.get("address") or "").strip()
+    if not name:
+        raise ValueError("name is missing")
+    if not address:
+        raise ValueError(f"address of {name} is missing")
+
+    return Friend(
+        name,
+        address,
+        parseMode(entry.get("preferredTransitMode")),
+        parseFlag(entry.get("availableToHost", False), "availableToHost"),
+        True,
+    )
+
+
+def stream(path, errors: list = None) -> Iterator[tuple[int, Friend]]:
+    """
+    (line, Friend) of everybody joining the party, in file order. A bad
+    row raises a ValueError, or, given an errors list, is skipped and its
+    (line, message) appended.
+    """
+    path = pathlib.Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        entries = _csvEntries(path)
+    elif suffix in (".yaml", ".yml"):
+        entries = _yamlEntries(path)
+    elif suffix in (".jsonl", ".ndjson"):
+        entries = _jsonlEntries(path)
+    else:
+        raise ValueError(
+            f"Unknown friends file type {path.suffix}, use csv, yaml or jsonl."
+        )
+
+    for line, entry in entries:
+        try:
+            if isinstance(entry, ValueError):
+                # the row couldn't even be read
+                raise entry
+            friend = _parse(entry)
+        except ValueError as e:
+            if errors is None:
+                raise ValueError(f"{path}, line {line}: {e}") from None
+            errors.append((line, str(e)))
+            continue
+        if friend.joinsParty:
+            yield line, friend
+
+
+def load(path) -> Roster:
+    """
+    Everybody joining the party, sorted by name, with name and host
+    indices. Names must be unique. Raises a ValueError listing all bad
+    rows.
+    """
+    lines = {}
+    friends = []
+    errors = []
+    for line, friend in stream(path, errors):
+        if friend.name in lines:
+            errors.append(
+                (
+                    line,
+                    f"{friend.name} already appears on line "
+                    f"{lines[friend.name]}",
+                )
+            )
+            continue
+        lines[friend.name] = line
+        friends.append(friend)
+    del lines
+
+    if errors:
+        raise ValueError(
+            f"{path}: {len(errors)} bad row{'s' if len(errors) > 1 else ''}"
+            + "".join(
+                f"\n  line {line}: {message}" for line, message in errors
+            )
+        )
+
+    friends.sort(key=lambda friend: friend.name)
+
+    names = []
+    index = {}
+    hostIndex = []
+    hosts = []
+    for i, friend in enumerate(friends):
+        names.append(friend.name)
+        index[friend.name] = i
+        if friend.availableToHost:
+            hostIndex.append(i)
+            hosts.append(friend.name)
+
+    return Roster(friends, names, index, hostIndex, hosts)
@@ -0,0 +1,106 @@
+"""
+Geocode-once address handling.
+
+Every address is normalised and geocoded at most once; the resulting place
+is kept in a persistent GeocodeCache. Addresses resolving to the same place
+(two friends in one flat, one office spelled two ways) then share a single
+row/column in matrix requests.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+
+class Place(NamedTuple):
+    placeId: str
+    lat: float
+    lng: float
+    formattedAddress: str
+
+    @property
+    def key(self) -> str:
+        """
+        What to send to the matrix API for this place.
+        """
+        if self.placeId:
+            return f"place_id:{self.placeId}"
+        return f"{self.lat:.6f},{self.lng:.6f}"
+
+
+def normalizeAddress(address):
+    """
+    Case- and whitespace-insensitive form of an address string. Anything
+    that isn't a string (e.g. a (lat, lng) tuple) is passed through.
+    """
+    if not isinstance(address, str):
+        return address
+
+    address = re.sub(r"\s*,\s*", ", ", address.strip())
+    return re.sub(r"\s+", " ", address).casefold()
+
+
+class GeocodeCache:
+    """
+    Persistent normalised address -> Place store. Places hardly move, so
+    entries live for `ttl` seconds (90 days by default).
+    """
+
+    def __init__(self, path: str = ":memory:", ttl: float = 90 * 24 * 3600):
+
+        self.path = str(path)
+        self.ttl = ttl
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                "address TEXT PRIMARY KEY, place_id TEXT, lat REAL, "
+                "lng REAL, formatted TEXT, created REAL)"
+            )
+
+    def get(self, addresses: list[str]) -> dict:
+        """
+        Returns {address: Place} for all fresh hits.
+        """
+        hits = {}
+        with self._lock:
+            for address in dict.fromkeys(addresses):
+                row = self._db.execute(
+                    "SELECT place_id, lat, lng, formatted FROM places "
+                    "WHERE address = ? AND created >= ?",
+                    (normalizeAddress(address), time.time() - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    hits[address] = Place(*row)
+
+        return hits
+
+    def put(self, places: dict) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (normalizeAddress(address), *place, now)
+                    for address, place in places.items()
+                ],
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM places")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM places"
+            ).fetchone()
+
+        return count
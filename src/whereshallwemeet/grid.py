@@ -0,0 +1,82 @@
+"""
+Uniform grid for nearest-neighbour lookups among 2d points, used for towns
+and for snapping locations to graph nodes.
+"""
+
+from math import ceil, floor, hypot, inf, sqrt
+
+
+class GridIndex:
+    """
+    Buckets points into square cells; a query searches rings of cells
+    around its own cell until nothing closer can be left.
+    """
+
+    def __init__(self, points, perCell: int = 2):
+
+        points = [(float(x), float(y)) for x, y in points]
+        n = len(points)
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+
+        self._x0 = min(xs, default=0)
+        self._y0 = min(ys, default=0)
+        width = max(xs, default=0) - self._x0
+        height = max(ys, default=0) - self._y0
+
+        # square cells sized for perCell points on average
+        area = max(width * height, 1e-12)
+        self._cell = sqrt(area * perCell / max(n, 1)) or 1.0
+        self._nx = max(1, ceil(width / self._cell) + 1)
+        self._ny = max(1, ceil(height / self._cell) + 1)
+
+        self._grid = {}
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            self._grid.setdefault(self._cellOf(x, y), []).append((x, y, i))
+
+    def _cellOf(self, x: float, y: float) -> tuple[int, int]:
+        # points outside the grid start at the closest cell on its border
+        return (
+            min(max(floor((x - self._x0) / self._cell), 0), self._nx - 1),
+            min(max(floor((y - self._y0) / self._cell), 0), self._ny - 1),
+        )
+
+    def _ring(self, cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield cx, cy
+            return
+        for i in range(cx - ring, cx + ring + 1):
+            yield i, cy - ring
+            yield i, cy + ring
+        for j in range(cy - ring + 1, cy + ring):
+            yield cx - ring, j
+            yield cx + ring, j
+
+    def _nearest(self, x: float, y: float) -> int:
+        cx, cy = self._cellOf(x, y)
+        best, bestDist = -1, inf
+
+        # distance of points outside the grid to its bounding box
+        outside = hypot(
+            max(self._x0 - x, 0, x - self._x0 - self._nx * self._cell),
+            max(self._y0 - y, 0, y - self._y0 - self._ny * self._cell),
+        )
+
+        # widen the square of searched cells until no unsearched cell can
+        # hold anything closer than the best point found so far
+        for ring in range(max(self._nx, self._ny) + 1):
+            for cell in self._ring(cx, cy, ring):
+                for tx, ty, t in self._grid.get(cell, ()):
+                    d = hypot(tx - x, ty - y)
+                    if d < bestDist:
+                        best, bestDist = t, d
+            if bestDist <= hypot(outside, ring * self._cell):
+                break
+
+        return best
+
+    def nearest(self, points) -> list[int]:
+        """
+        Index of the closest indexed point for every (x, y) in points.
+        """
+        return [self._nearest(float(p[0]), float(p[1])) for p in points]
@@ -0,0 +1,289 @@
+"""
+Group travel-time surface over the friends' convex hull.
+
+Scores (e.g. the minisum travel time of everybody to a point) are first
+evaluated on the vertices of a coarse grid over the hull. Cells whose
+corners differ by more than `tolerance` of the overall score spread are
+then split in four, most promising cells (lowest corner score) first and
+only cells among the best `keep` share of scores. Neighbouring cells share
+their vertices, and refinement stops once the element budget is spent, so a
+city-wide map costs a bounded number of matrix elements.
+
+The refined cells are finally interpolated onto a regular raster (a
+Surface) that utils.plotHeatmap draws, decimated, as a WebGL trace.
+"""
+
+import heapq
+from array import array
+from math import ceil, cos, inf, isinf, isnan, nan, radians
+from typing import Callable
+
+
+def insideConvex(polygon: list[tuple[float, float]], x: float, y: float):
+    """
+    Whether (x, y) lies inside (or on) a convex polygon given in either
+    orientation.
+    """
+    sign = 0
+    for (x0, y0), (x1, y1) in zip(polygon, polygon[1:] + polygon[:1]):
+        cross = (x1 - x0) * (y - y0) - (y1 - y0) * (x - x0)
+        if cross == 0:
+            continue
+        if sign == 0:
+            sign = 1 if cross > 0 else -1
+        elif (cross > 0) != (sign > 0):
+            return False
+
+    return True
+
+
+def _key(x: float, y: float) -> tuple[float, float]:
+    # vertices shared by neighbouring cells must compare equal
+    return round(x, 9), round(y, 9)
+
+
+class Surface:
+    """
+    ny x nx raster of scores, row-major from the south-west corner. Pixels
+    outside the hull are nan, pixels nobody can reach inf.
+    """
+
+    def __init__(
+        self,
+        lons: array,
+        lats: array,
+        values: array,
+        hull: list[tuple[float, float]],
+        samples: dict,
+        elements: int,
+    ):
+        self.lons = lons
+        self.lats = lats
+        self.values = values
+        self.hull = hull
+        # {(lon, lat): score} of every evaluated vertex
+        self.samples = samples
+        # matrix elements requested to evaluate them (at most)
+        self.elements = elements
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.lats), len(self.lons)
+
+    def points(self) -> list[tuple[float, float, float]]:
+        """
+        (lon, lat, score) of every pixel inside the hull.
+        """
+        nx = len(self.lons)
+        return [
+            (self.lons[k % nx], self.lats[k // nx], value)
+            for k, value in enumerate(self.values)
+            if not isnan(value)
+        ]
+
+    def below(self, level: float) -> list[tuple[float, float]]:
+        """
+        Pixels scoring at most level: the isochrone region of level.
+        """
+        return [
+            (lon, lat) for lon, lat, value in self.points() if value <= level
+        ]
+
+    def decimate(self, maxPixels: int) -> "Surface":
+        """
+        Averages f x f blocks of pixels so that at most maxPixels remain.
+        """
+        ny, nx = self.shape
+        f = 1
+        while ceil(nx / f) * ceil(ny / f) > maxPixels:
+            f += 1
+        if f == 1:
+            return self
+
+        lons = array(
+            "d",
+            [
+                sum(self.lons[i : i + f]) / len(self.lons[i : i + f])
+                for i in range(0, nx, f)
+            ],
+        )
+        lats = array(
+            "d",
+            [
+                sum(self.lats[j : j + f]) / len(self.lats[j : j + f])
+                for j in range(0, ny, f)
+            ],
+        )
+        values = array("d")
+        for j in range(0, ny, f):
+            for i in range(0, nx, f):
+                block = [
+                    self.values[jj * nx + ii]
+                    for jj in range(j, min(j + f, ny))
+                    for ii in range(i, min(i + f, nx))
+                ]
+                block = [value for value in block if not isnan(value)]
+                values.append(sum(block) / len(block) if block else nan)
+
+        return Surface(
+            lons, lats, values, self.hull, self.samples, self.elements
+        )
+
+
+def _bilinear(cell, corners, x, y) -> float:
+    x0, y0, x1, y1 = cell
+    known = [c for c in corners if (c is not None) and not isinf(c[2])]
+    if len(known) == 4:
+        (_, _, a), (_, _, b), (_, _, c), (_, _, d) = corners
+        tx = (x - x0) / (x1 - x0)
+        ty = (y - y0) / (y1 - y0)
+        return (a * (1 - tx) + b * tx) * (1 - ty) + (
+            d * (1 - tx) + c * tx
+        ) * ty
+
+    # on the hull boundary or next to unreachable points: nearest corner
+    present = [c for c in corners if c is not None]
+    if not present:
+        return nan
+    return min(present, key=lambda c: (c[0] - x) ** 2 + (c[1] - y) ** 2)[2]
+
+
+def surface(
+    hull: list[tuple[float, float]],
+    evaluate: Callable[[list], list[float]],
+    costPerPoint: int,
+    resolution: int = 200,
+    initial: int = 6,
+    maxDepth: int = 4,
+    maxElements: int = 5000,
+    tolerance: float = 0.1,
+    keep: float = 0.5,
+    batchSize: int = 25,
+) -> Surface:
+    """
+    Adaptive score surface over a convex (lon, lat) hull. evaluate maps a
+    list of (lon, lat) points to their scores, each point costing
+    costPerPoint matrix elements.
+    """
+    hull = [tuple(p) for p in hull]
+    X0 = min(p[0] for p in hull)
+    X1 = max(p[0] for p in hull)
+    Y0 = min(p[1] for p in hull)
+    Y1 = max(p[1] for p in hull)
+
+    samples = {}
+    spent = 0
+
+    def run(points) -> bool:
+        """
+        Evaluates the new points inside the hull within the budget.
+        Returns whether all of them could be afforded.
+        """
+        nonlocal spent
+        todo = list(
+            dict.fromkeys(
+                _key(x, y)
+                for x, y in points
+                if (_key(x, y) not in samples) and insideConvex(hull, x, y)
+            )
+        )
+        affordable = max(0, (maxElements - spent) // max(costPerPoint, 1))
+        for start in range(0, min(len(todo), affordable), batchSize):
+            batch = todo[start : min(start + batchSize, affordable)]
+            samples.update(zip(batch, evaluate(batch)))
+            spent += costPerPoint * len(batch)
+
+        return len(todo) <= affordable
+
+    def corners(cell):
+        x0, y0, x1, y1 = cell
+        return [
+            (x, y, samples[_key(x, y)]) if _key(x, y) in samples else None
+            for x, y in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))
+        ]
+
+    # coarse grid, all of its vertices in one go
+    dx = (X1 - X0) / initial
+    dy = (Y1 - Y0) / initial
+    leaves = [
+        (X0 + i * dx, Y0 + j * dy, X0 + (i + 1) * dx, Y0 + (j + 1) * dy)
+        for j in range(initial)
+        for i in range(initial)
+    ]
+    run(
+        [
+            (X0 + i * dx, Y0 + j * dy)
+            for j in range(initial + 1)
+            for i in range(initial + 1)
+        ]
+    )
+
+    for _ in range(maxDepth):
+        finite = sorted(s for s in samples.values() if not isinf(s))
+        if not finite:
+            break
+        spread = (finite[-1] - finite[0]) or 1
+        cutoff = finite[min(len(finite) - 1, int(keep * len(finite)))]
+
+        # promising cells where the score changes fastest, best first
+        queue = []
+        for n, cell in enumerate(leaves):
+            values = [c[2] for c in corners(cell) if c is not None]
+            if not values:
+                continue
+            low, high = min(values), max(values)
+            if (high - low > tolerance * spread) and (low <= cutoff):
+                heapq.heappush(queue, (low, n))
+
+        split = set()
+        while queue:
+            _, n = heapq.heappop(queue)
+            x0, y0, x1, y1 = leaves[n]
+            xm, ym = (x0 + x1) / 2, (y0 + y1) / 2
+            if not run([(xm, ym), (xm, y0), (x1, ym), (xm, y1), (x0, ym)]):
+                break
+            split.add(n)
+        if not split:
+            break
+
+        refined = []
+        for n, (x0, y0, x1, y1) in enumerate(leaves):
+            if n not in split:
+                refined.append((x0, y0, x1, y1))
+                continue
+            xm, ym = (x0 + x1) / 2, (y0 + y1) / 2
+            refined.extend(
+                [
+                    (x0, y0, xm, ym),
+                    (xm, y0, x1, ym),
+                    (x0, ym, xm, y1),
+                    (xm, ym, x1, y1),
+                ]
+            )
+        leaves = refined
+
+    # raster of about resolution pixels across, square on the ground
+    nx = resolution
+    aspect = (Y1 - Y0) / (((X1 - X0) * cos(radians((Y0 + Y1) / 2))) or 1)
+    ny = max(1, round(resolution * aspect))
+    px = (X1 - X0) / nx
+    py = (Y1 - Y0) / ny
+    lons = array("d", [X0 + (i + 0.5) * px for i in range(nx)])
+    lats = array("d", [Y0 + (j + 0.5) * py for j in range(ny)])
+
+    values = array("d", [nan]) * (nx * ny)
+    for cell in leaves:
+        x0, y0, x1, y1 = cell
+        cellCorners = corners(cell)
+        iStart = max(0, ceil((x0 - X0) / px - 0.5))
+        iStop = min(nx, ceil((x1 - X0) / px - 0.5))
+        jStart = max(0, ceil((y0 - Y0) / py - 0.5))
+        jStop = min(ny, ceil((y1 - Y0) / py - 0.5))
+        for j in range(jStart, jStop):
+            y = lats[j]
+            for i in range(iStart, iStop):
+                x = lons[i]
+                if insideConvex(hull, x, y):
+                    values[j * nx + i] = _bilinear(cell, cellCorners, x, y)
+
+    return Surface(lons, lats, values, hull, samples, spent)
@@ -0,0 +1,345 @@
+"""
+Helpers to take distance matrix responses apart and put them back together.
+
+A distance matrix response is the dict returned by
+``googlemaps.Client.distance_matrix``. Internally we mostly work with a
+flat lookup ``{(origin, destination): element}`` keyed by the addresses we
+sent, which lets us merge cached, freshly fetched and tiled results.
+"""
+
+import copy
+from array import array
+from math import inf
+from typing import NamedTuple, Union
+
+
+def asList(addresses: Union[str, list[str]]) -> list[str]:
+    if isinstance(addresses, str):
+        return [addresses]
+    return list(addresses)
+
+
+def elementLookup(
+    response: dict, origins: list[str], destinations: list[str]
+) -> dict:
+    """
+    Returns {(origin, destination): element} for a response that was
+    requested with the given origins and destinations (the API keeps the
+    request order, so rows and elements line up with our inputs).
+    """
+    lookup = {}
+    for origin, row in zip(origins, response["rows"]):
+        for destination, elem in zip(destinations, row["elements"]):
+            lookup[(origin, destination)] = elem
+
+    return lookup
+
+
+def buildResponse(
+    origins: list[str], destinations: list[str], lookup: dict
+) -> dict:
+    """
+    Inverse of elementLookup: assembles a response in the API's layout.
+    """
+    return {
+        "destination_addresses": list(destinations),
+        "origin_addresses": list(origins),
+        "rows": [
+            {"elements": [lookup[(origin, dest)] for dest in destinations]}
+            for origin in origins
+        ],
+        "status": "OK",
+    }
+
+
+def missingBlocks(
+    origins: list[str], destinations: list[str], have
+) -> list[tuple[list[str], list[str]]]:
+    """
+    Groups the (origin, destination) pairs not contained in `have` into
+    rectangular blocks that can each be fetched with one matrix request.
+
+    Origins missing the same set of destinations share a block, so a new
+    friend costs one row and a new host one column, not a full refetch.
+    """
+    groups = {}
+    for origin in dict.fromkeys(origins):
+        missing = tuple(
+            dest
+            for dest in dict.fromkeys(destinations)
+            if (origin, dest) not in have
+        )
+        if missing:
+            groups.setdefault(missing, []).append(origin)
+
+    return [
+        (blockOrigins, list(dests)) for dests, blockOrigins in groups.items()
+    ]
+
+
+# per-request limits of the distance matrix API
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+
+class Limits(NamedTuple):
+    origins: int
+    destinations: int
+    elements: int
+
+
+GOOGLE_LIMITS = Limits(MAX_ORIGINS, MAX_DESTINATIONS, MAX_ELEMENTS)
+
+
+def tiles(
+    nOrigins: int, nDestinations: int, limits: Limits = GOOGLE_LIMITS
+) -> list[tuple[slice, slice]]:
+    """
+    Splits an nOrigins x nDestinations matrix into (origin, destination)
+    slices that each fit into a single distance matrix request. Without
+    limits that is the whole matrix.
+    """
+    if limits is None:
+        limits = Limits(max(nOrigins, 1), max(nDestinations, 1), inf)
+
+    dStep = max(1, min(nDestinations, limits.destinations, limits.elements))
+    oStep = max(1, min(limits.origins, limits.elements // dStep))
+
+    return [
+        (slice(i, i + oStep), slice(j, j + dStep))
+        for i in range(0, nOrigins, oStep)
+        for j in range(0, nDestinations, dStep)
+    ]
+
+
+def stitch(
+    nOrigins: int,
+    nDestinations: int,
+    tileSlices: list[tuple[slice, slice]],
+    responses: list[dict],
+) -> dict:
+    """
+    Puts the responses to the requests described by tileSlices back into
+    one response as if the whole matrix had been requested at once.
+    """
+    originAddresses = [None] * nOrigins
+    destinationAddresses = [None] * nDestinations
+    rows = [[None] * nDestinations for _ in range(nOrigins)]
+
+    for (oSlice, dSlice), response in zip(tileSlices, responses):
+        originAddresses[oSlice] = response["origin_addresses"]
+        destinationAddresses[dSlice] = response["destination_addresses"]
+        for row, tileRow in zip(rows[oSlice], response["rows"]):
+            row[dSlice] = tileRow["elements"]
+
+    return {
+        "destination_addresses": destinationAddresses,
+        "origin_addresses": originAddresses,
+        "rows": [{"elements": row} for row in rows],
+        "status": "OK",
+    }
+
+
+# objectives parse() keeps of every element
+FIELDS = ("duration", "distance", "duration_in_traffic")
+
+# element states as stored by parse(), 0 means never requested
+STATUSES = (
+    None,
+    "OK",
+    "ZERO_RESULTS",
+    "NOT_FOUND",
+    "MAX_ROUTE_LENGTH_EXCEEDED",
+    "OVER_QUERY_LIMIT",
+    "UNKNOWN_ERROR",
+)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+class TravelTimeTensor:
+    """
+    friends x hosts x modes travel times in a single flat array of doubles.
+
+    The data is stored as one contiguous friends x hosts plane per mode, so
+    per-mode rows can be sliced out without copying element by element.
+    Pairs that were never requested (e.g. a friend that doesn't use a mode)
+    or that have no route stay at inf. Name, host and mode index maps are
+    built once.
+
+    fill() parses a single objective into data. parse() keeps all FIELDS
+    and the element status in one pass, after which view(objective)
+    switches between them without touching the responses again.
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        hosts: list[str],
+        modes: tuple[str],
+        data=None,
+    ):
+
+        self.names = list(names)
+        self.hosts = list(hosts)
+        self.modes = tuple(modes)
+
+        self.nameIndex = {name: i for i, name in enumerate(self.names)}
+        self.hostIndex = {host: j for j, host in enumerate(self.hosts)}
+        self.modeIndex = {mode: k for k, mode in enumerate(self.modes)}
+
+        size = len(self.names) * len(self.hosts) * len(self.modes)
+        if data is None:
+            data = array("d", [inf]) * size
+        elif len(data) != size:
+            raise ValueError(
+                f"Expected {size} values for shape {self.shape}, "
+                f"got {len(data)}."
+            )
+        self.data = data
+
+        # field -> array like data, and the element states, see parse()
+        self.fields = {}
+        self.status = None
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return len(self.names), len(self.hosts), len(self.modes)
+
+    def _offset(self, i: int, j: int, k: int) -> int:
+        nFriends, nHosts, _ = self.shape
+        return (k * nFriends + i) * nHosts + j
+
+    def __getitem__(self, index: tuple[int, int, int]) -> float:
+        return self.data[self._offset(*index)]
+
+    def __setitem__(self, index: tuple[int, int, int], value: float):
+        self.data[self._offset(*index)] = value
+
+    def row(self, i: int, k: int):
+        """
+        Travel times of friend i to all hosts using mode k.
+        """
+        start = self._offset(i, 0, k)
+        return self.data[start : start + len(self.hosts)]
+
+    def fill(
+        self,
+        mode: str,
+        names: list[str],
+        jsonMatrix: dict,
+        objective: str = "duration",
+    ):
+        """
+        Parses a distance matrix response whose rows belong to `names` and
+        whose columns are all hosts into the plane of `mode`.
+        """
+        k = self.modeIndex[mode]
+        nHosts = len(self.hosts)
+        for name, row in zip(names, jsonMatrix["rows"]):
+            start = self._offset(self.nameIndex[name], 0, k)
+            self.data[start : start + nHosts] = array(
+                "d",
+                [
+                    elem[objective]["value"] if elem["status"] == "OK" else inf
+                    for elem in row["elements"]
+                ],
+            )
+
+    def parse(self, mode: str, names: list[str], jsonMatrix: dict):
+        """
+        Like fill, but stores duration, distance, duration_in_traffic
+        (falling back to duration where the API has no traffic data) and
+        the status of every element in a single pass.
+        """
+        if not self.fields:
+            size = len(self.data)
+            self.fields = {"duration": self.data}
+            for field in FIELDS[1:]:
+                self.fields[field] = array("d", [inf]) * size
+            self.status = array("B", bytes(size))
+
+        k = self.modeIndex[mode]
+        nHosts = len(self.hosts)
+        duration, distance, traffic = (self.fields[f] for f in FIELDS)
+        unknown = STATUS_CODES["UNKNOWN_ERROR"]
+        for name, row in zip(names, jsonMatrix["rows"]):
+            seconds, meters, inTraffic, codes = [], [], [], []
+            for elem in row["elements"]:
+                status = elem["status"]
+                codes.append(STATUS_CODES.get(status, unknown))
+                if status == "OK":
+                    seconds.append(elem["duration"]["value"])
+                    meters.append(elem["distance"]["value"])
+                    inTraffic.append(
+                        elem.get("duration_in_traffic", elem["duration"])[
+                            "value"
+                        ]
+                    )
+                else:
+                    seconds.append(inf)
+                    meters.append(inf)
+                    inTraffic.append(inf)
+
+            start = self._offset(self.nameIndex[name], 0, k)
+            stop = start + nHosts
+            duration[start:stop] = array("d", seconds)
+            distance[start:stop] = array("d", meters)
+            traffic[start:stop] = array("d", inTraffic)
+            self.status[start:stop] = array("B", codes)
+
+    def view(self, objective: str = "duration") -> "TravelTimeTensor":
+        """
+        The same tensor with data showing another parsed objective. Shares
+        all arrays and index maps, nothing is copied.
+        """
+        if objective not in self.fields:
+            raise ValueError(
+                f"Objective {objective} wasn't parsed, pick one of "
+                f"{tuple(self.fields)}."
+            )
+
+        view = copy.copy(self)
+        view.data = self.fields[objective]
+        return view
+
+    def elementStatus(self, i: int, j: int, k: int) -> str:
+        if self.status is None:
+            return None
+        return STATUSES[self.status[self._offset(i, j, k)]]
+
+    def best(self) -> tuple[list[list], list[list[str]]]:
+        """
+        Returns the fastest time per (friend, host) over all modes and the
+        mode achieving it.
+        """
+        Mbest = []
+        bestmode = []
+        for i in range(len(self.names)):
+            rows = [self.row(i, k) for k in range(len(self.modes))]
+            times = list(map(min, *rows)) if len(rows) > 1 else list(rows[0])
+            if len(rows) > 1:
+                modes = [
+                    self.modes[col.index(t)]
+                    for col, t in zip(zip(*rows), times)
+                ]
+            else:
+                modes = [self.modes[0]] * len(times)
+            Mbest.append([int(t) if t < inf else t for t in times])
+            bestmode.append(modes)
+
+        return Mbest, bestmode
+
+
+def pairBlocks(needed: dict) -> list[tuple[list[str], list[str]]]:
+    """
+    Groups {origin: destinations} into rectangular blocks: origins that
+    need the same set of destinations share one block.
+    """
+    groups = {}
+    for origin, destinations in needed.items():
+        key = tuple(sorted(set(destinations)))
+        if key:
+            groups.setdefault(key, []).append(origin)
+
+    return [(origins, list(dests)) for dests, origins in groups.items()]
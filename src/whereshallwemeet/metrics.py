@@ -0,0 +1,189 @@
+"""
+Where time and money go in a planning run.
+
+Every WhereShallWeMeet owns a Metrics object (pass one in to share it
+between instances). It counts API calls with their latency, billed units
+(matrix elements, directions and geocoding requests), errors, retries,
+requests joining an identical one in flight and estimated cost, cache hits
+and misses, and the time of CPU phases such as parsing and assembling
+matrices.
+
+Read it with summary(), dump it with log() or in the Prometheus text format
+with toPrometheus(), or register hooks to be called on every event.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+_logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    def __init__(self, prefix: str = "whereshallwemeet"):
+
+        self.prefix = prefix
+
+        self._lock = threading.Lock()
+        # (name, labels) -> value
+        self._counters = {}
+        # (name, labels) -> [count, sum, max] of durations in seconds
+        self._timings = {}
+        self._hooks = []
+
+    def addHook(self, hook: Callable[[str, dict], None]) -> None:
+        """
+        hook(event, fields) is called for every "api", "cache" and "phase"
+        event, e.g. to forward them to a tracing system.
+        """
+        self._hooks.append(hook)
+
+    def _emit(self, event: str, fields: dict) -> None:
+        for hook in self._hooks:
+            hook(event, fields)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self._timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def apiCall(
+        self,
+        api: str,
+        seconds: float,
+        units: int = 1,
+        cost: float = 0.0,
+        ok: bool = True,
+    ) -> None:
+        """
+        One request to api that took `seconds` and billed `units`
+        (elements for the distance matrix, requests otherwise).
+        """
+        self.count("api_calls_total", api=api)
+        self.count("api_units_total", units, api=api)
+        self.count("api_cost_usd_total", cost, api=api)
+        if not ok:
+            self.count("api_errors_total", api=api)
+        self.observe("api_latency_seconds", seconds, api=api)
+
+        self._emit(
+            "api",
+            {
+                "api": api,
+                "seconds": seconds,
+                "units": units,
+                "cost": cost,
+                "ok": ok,
+            },
+        )
+
+    def retry(self, api: str) -> None:
+        self.count("api_retries_total", api=api)
+        self._emit("retry", {"api": api})
+
+    def joined(self, api: str) -> None:
+        # answered by an identical request already in flight
+        self.count("api_joined_total", api=api)
+        self._emit("joined", {"api": api})
+
+    def cache(self, cache: str, hits: int, misses: int) -> None:
+        self.count("cache_hits_total", hits, cache=cache)
+        self.count("cache_misses_total", misses, cache=cache)
+
+        self._emit("cache", {"cache": cache, "hits": hits, "misses": misses})
+
+    @contextmanager
+    def phase(self, phase: str):
+        """
+        Times a CPU phase: `with metrics.phase("parse"): ...`
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("phase_seconds", seconds, phase=phase)
+            self._emit("phase", {"phase": phase, "seconds": seconds})
+
+    def summary(self) -> dict:
+        """
+        Plain dict of all counters and timings, keyed by metric name and
+        label values, e.g. summary()["api_calls_total"][("distance_matrix",)].
+        """
+        out = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                out.setdefault(name, {})[tuple(v for _, v in labels)] = value
+            for (name, labels), (n, total, worst) in self._timings.items():
+                out.setdefault(name, {})[tuple(v for _, v in labels)] = {
+                    "count": n,
+                    "sum": total,
+                    "max": worst,
+                }
+
+        return out
+
+    def hitRate(self, cache: str = "matrix") -> float:
+        summary = self.summary()
+        hits = summary.get("cache_hits_total", {}).get((cache,), 0)
+        misses = summary.get("cache_misses_total", {}).get((cache,), 0)
+
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def toPrometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+
+        def series(name, labels, value):
+            labelText = ",".join(f'{k}="{v}"' for k, v in labels)
+            labelText = f"{{{labelText}}}" if labelText else ""
+            return f"{self.prefix}_{name}{labelText} {value}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                typed.add(name)
+            lines.append(series(name, labels, value))
+
+        for (name, labels), (n, total, _) in timings:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}_{name} summary")
+                typed.add(name)
+            lines.append(series(f"{name}_count", labels, n))
+            lines.append(series(f"{name}_sum", labels, total))
+
+        for (name, labels), (_, _, worst) in timings:
+            if f"{name}_max" not in typed:
+                lines.append(f"# TYPE {self.prefix}_{name}_max gauge")
+                typed.add(f"{name}_max")
+            lines.append(series(f"{name}_max", labels, worst))
+
+        return "\n".join(lines) + "\n"
+
+    def log(self, logger: logging.Logger = None, level=logging.INFO) -> None:
+        logger = logger or _logger
+        for name, values in sorted(self.summary().items()):
+            for labels, value in values.items():
+                logger.log(level, "%s%s: %s", name, list(labels), value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
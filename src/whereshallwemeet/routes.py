@@ -0,0 +1,167 @@
+"""
+Compact routes.
+
+A raw directions response weighs ~15 kB of json per route (see
+examples/home2home.json). Route keeps what the planner shows and nothing
+else: the overview path decoded into a flat array of coordinates, one short
+record per step, the number of transfers and the departure and arrival
+times. Stop and line names are interned, so attendees riding the same
+lines share the strings.
+"""
+
+import sys
+from array import array
+from typing import Union
+
+
+def decodePolyline(points: str) -> array:
+    """
+    Decodes an encoded polyline into a flat array [lat0, lng0, lat1, ...].
+    """
+    coords = array("d")
+    index = lat = lng = 0
+    while index < len(points):
+        for axis in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(points[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if axis == 0:
+                lat += delta
+            else:
+                lng += delta
+        coords.append(lat / 1e5)
+        coords.append(lng / 1e5)
+
+    return coords
+
+
+def _name(text: Union[str, None]) -> Union[str, None]:
+    return None if text is None else sys.intern(text)
+
+
+class Step:
+    __slots__ = ("mode", "seconds", "meters", "line", "fromStop", "toStop")
+
+    def __init__(
+        self,
+        mode: str,
+        seconds: int,
+        meters: int,
+        line: str = None,
+        fromStop: str = None,
+        toStop: str = None,
+    ):
+        self.mode = mode
+        self.seconds = seconds
+        self.meters = meters
+        self.line = line
+        self.fromStop = fromStop
+        self.toStop = toStop
+
+    @classmethod
+    def fromDirections(cls, step: dict) -> "Step":
+        details = step.get("transit_details")
+        line = fromStop = toStop = None
+        if details is not None:
+            line = details["line"].get("short_name") or details["line"].get(
+                "name"
+            )
+            fromStop = details["departure_stop"]["name"]
+            toStop = details["arrival_stop"]["name"]
+
+        return cls(
+            _name(step["travel_mode"].lower()),
+            step["duration"]["value"],
+            step["distance"]["value"],
+            _name(line),
+            _name(fromStop),
+            _name(toStop),
+        )
+
+    def __repr__(self) -> str:
+        if self.line is None:
+            return f"Step({self.mode}, {self.seconds} s, {self.meters} m)"
+        return (
+            f"Step({self.mode} {self.line}: {self.fromStop} -> "
+            f"{self.toStop}, {self.seconds} s)"
+        )
+
+
+class Route:
+    __slots__ = (
+        "origin",
+        "destination",
+        "seconds",
+        "meters",
+        "departure",
+        "arrival",
+        "transfers",
+        "steps",
+        "path",
+    )
+
+    def __init__(
+        self,
+        origin: str,
+        destination: str,
+        seconds: int,
+        meters: int,
+        departure: int = None,
+        arrival: int = None,
+        steps: tuple[Step] = (),
+        path: array = None,
+    ):
+        self.origin = origin
+        self.destination = destination
+        self.seconds = seconds
+        self.meters = meters
+        # unix timestamps, only known for transit
+        self.departure = departure
+        self.arrival = arrival
+        self.steps = tuple(steps)
+        self.transfers = max(
+            0, sum(step.mode == "transit" for step in self.steps) - 1
+        )
+        self.path = array("d") if path is None else path
+
+    @classmethod
+    def fromDirections(cls, route: dict) -> "Route":
+        """
+        Reduces one route of a directions response.
+        """
+        legs = route["legs"]
+        departure = legs[0].get("departure_time", {}).get("value")
+        arrival = legs[-1].get("arrival_time", {}).get("value")
+
+        return cls(
+            origin=legs[0].get("start_address"),
+            destination=legs[-1].get("end_address"),
+            seconds=sum(leg["duration"]["value"] for leg in legs),
+            meters=sum(leg["distance"]["value"] for leg in legs),
+            departure=departure,
+            arrival=arrival,
+            steps=[
+                Step.fromDirections(step)
+                for leg in legs
+                for step in leg.get("steps", ())
+            ],
+            path=decodePolyline(
+                route.get("overview_polyline", {}).get("points", "")
+            ),
+        )
+
+    def coords(self) -> list[tuple[float, float]]:
+        return list(zip(self.path[0::2], self.path[1::2]))
+
+    def __repr__(self) -> str:
+        return (
+            f"Route({self.origin} -> {self.destination}, "
+            f"{self.seconds} s, {self.meters} m, "
+            f"{self.transfers} transfers, {len(self.steps)} steps)"
+        )
@@ -0,0 +1,170 @@
+"""
+Monte Carlo attendance scenarios.
+
+Who actually comes and who can still host is uncertain. Given a friends x
+hosts matrix (e.g. Mbest from getMatrix) and per-friend attendance and
+per-host availability probabilities, scenarios are sampled and every host
+is scored on the friends attending in each. No API calls are involved.
+
+Chunks of scenarios run in a process pool; every chunk draws from its own
+seeded generator, so results only depend on the seed, not on the number of
+processes.
+"""
+
+import os
+import random
+from array import array
+from math import inf, isinf
+from typing import NamedTuple
+
+from .solver import OBJECTIVES, gini
+
+# scenarios per task sent to the process pool
+CHUNK = 500
+
+
+class VenueOutlook(NamedTuple):
+    host: str
+    # mean score over the scenarios in which the host was available
+    expected: float
+    # {percentile: score}
+    percentiles: dict
+    # share of scenarios in which the host was the best available one
+    winRate: float
+    # share of scenarios in which the host was available
+    availability: float
+
+
+def _score(column, attending, rankBy, weights) -> float:
+    times = [column[i] for i in attending]
+    if not times:
+        return 0.0
+
+    if rankBy == "minisum":
+        return sum(times)
+    elif rankBy == "minimax":
+        return max(times)
+    elif rankBy == "weighted":
+        return sum(weights[i] * column[i] for i in attending if weights[i])
+    elif rankBy == "gini":
+        return gini(times)
+
+    # variance
+    mean = sum(times) / len(times)
+    if isinf(mean):
+        return inf
+    return sum((t - mean) ** 2 for t in times) / len(times)
+
+
+def _runChunk(task) -> tuple[list[array], list[int], list[int]]:
+    """
+    Samples n scenarios. Returns the scores of every host (one entry per
+    scenario it was available in), its number of wins and availabilities.
+    """
+    columns, attendance, availability, hosting, rankBy, weights, n, seed = task
+    rng = random.Random(seed)
+
+    scores = [array("d") for _ in columns]
+    wins = [0] * len(columns)
+    available = [0] * len(columns)
+    for _ in range(n):
+        attending = [i for i, p in enumerate(attendance) if rng.random() < p]
+        coming = set(attending)
+
+        best, bestScore = None, inf
+        for j, (column, q) in enumerate(zip(columns, availability)):
+            # friends can only host parties they come to
+            if (rng.random() >= q) or (
+                (hosting[j] is not None) and (hosting[j] not in coming)
+            ):
+                continue
+            score = _score(column, attending, rankBy, weights)
+            scores[j].append(score)
+            available[j] += 1
+            if (best is None) or (score < bestScore):
+                best, bestScore = j, score
+        if best is not None:
+            wins[best] += 1
+
+    return scores, wins, available
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return inf
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    if values[lower] == values[upper]:
+        return values[lower]
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def simulate(
+    M: list[list[float]],
+    names: list[str],
+    hosts: list[str],
+    attendance: dict = None,
+    availability: dict = None,
+    nScenarios: int = 1000,
+    rankBy: str = "minisum",
+    weights: dict = None,
+    percentiles: tuple[float] = (50, 90),
+    seed: int = None,
+    processes: int = None,
+) -> list[VenueOutlook]:
+    """
+    attendance maps names and availability hosts to probabilities, anybody
+    missing is certain. Returns a VenueOutlook per host, in host order.
+    """
+    if rankBy not in OBJECTIVES:
+        raise ValueError(
+            f"Unknown objective {rankBy}, pick one of {OBJECTIVES}."
+        )
+    if (rankBy == "weighted") and (weights is None):
+        raise ValueError("Objective weighted requires weights.")
+
+    attendance = attendance or {}
+    availability = availability or {}
+    nameIndex = {name: i for i, name in enumerate(names)}
+
+    task = (
+        [list(col) for col in zip(*M)] if M else [[] for _ in hosts],
+        [attendance.get(name, 1.0) for name in names],
+        [availability.get(host, 1.0) for host in hosts],
+        [nameIndex.get(host) for host in hosts],
+        rankBy,
+        [(weights or {}).get(name, 1) for name in names],
+    )
+
+    rng = random.Random(seed)
+    sizes = [min(CHUNK, nScenarios - s) for s in range(0, nScenarios, CHUNK)]
+    tasks = [task + (size, rng.getrandbits(64)) for size in sizes]
+
+    processes = processes or os.cpu_count() or 1
+    if (processes == 1) or (len(tasks) == 1):
+        results = list(map(_runChunk, tasks))
+    else:
+        # multiprocessing is slow to import, only pay for it when used
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(tasks))
+        ) as pool:
+            results = list(pool.map(_runChunk, tasks))
+
+    outlook = []
+    for j, host in enumerate(hosts):
+        scores = sorted(s for chunk, _, _ in results for s in chunk[j])
+        available = sum(chunk[j] for _, _, chunk in results)
+        outlook.append(
+            VenueOutlook(
+                host=host,
+                expected=sum(scores) / len(scores) if scores else inf,
+                percentiles={p: _percentile(scores, p) for p in percentiles},
+                winRate=sum(w[j] for _, w, _ in results) / (nScenarios or 1),
+                availability=available / (nScenarios or 1),
+            )
+        )
+
+    return outlook
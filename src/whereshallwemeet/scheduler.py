@@ -0,0 +1,268 @@
+"""
+Central pacing of API requests.
+
+A Scheduler keeps requests inside the quota with token buckets for queries
+per second and billed units (matrix elements) per second, and retries
+transient failures with jittered exponential backoff. Callers waiting for
+tokens are served by priority lane, so interactive queries overtake bulk
+batch jobs queued on the same quota. Identical requests made while one is
+in flight (same key, through any Scheduler of the process) wait for it and
+share its answer instead of being sent again; a more urgent one moves the
+request it waits for up to its own lane.
+
+Share one Scheduler between all instances that use the same API key.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+# key -> Future of the request in flight, shared by all Schedulers so that
+# planners with schedulers of their own still collapse identical requests
+_flights = {}
+_flightsLock = threading.Lock()
+
+# priority lanes, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+# request and element states worth asking for again
+TRANSIENT = ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR", "RESOURCE_EXHAUSTED")
+
+
+def isTransient(exc: Exception) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if getattr(exc, "status", None) in TRANSIENT:
+        return True
+
+    # googlemaps.exceptions, matched by name to keep googlemaps optional
+    return any(
+        cls.__name__ in ("TransientError", "Timeout", "_RetriableRequest")
+        for cls in type(exc).__mro__
+    )
+
+
+class _Flight(Future):
+    """
+    Answer of a request in flight, and the lane it queues in on scheduler.
+    """
+
+    def __init__(self, scheduler: "Scheduler", priority: int):
+        super().__init__()
+        self.scheduler = scheduler
+        self.priority = priority
+        # while waiting for tokens: its place in scheduler._waiting
+        self.ticket = None
+
+    def promote(self, priority: int):
+        """
+        Moves the request up to a more urgent lane, e.g. because an
+        interactive caller waits for it.
+        """
+        with self.scheduler._cond:
+            if priority >= self.priority:
+                return
+
+            self.priority = priority
+            if self.ticket is not None:
+                waiting = self.scheduler._waiting
+                waiting.remove(self.ticket)
+                self.ticket = (priority, self.ticket[1])
+                waiting.append(self.ticket)
+                heapq.heapify(waiting)
+                self.scheduler._cond.notify_all()
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, at most `burst` saved up. A request larger
+    than burst is let through once the bucket is full and leaves it in
+    debt, so it is slowed down instead of blocked forever.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+
+        self.rate = rate
+        self.burst = max(1.0, rate if burst is None else burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def delay(self, tokens: float, now: float) -> float:
+        """
+        Seconds until `tokens` can be taken.
+        """
+        self._refill(now)
+        return max(0.0, min(tokens, self.burst) - self.tokens) / self.rate
+
+    def take(self, tokens: float, now: float):
+        self._refill(now)
+        self.tokens -= tokens
+
+
+class Scheduler:
+    def __init__(
+        self,
+        qps: float = None,
+        unitsPerSecond: float = None,
+        burst: float = 1.0,
+        maxRetries: int = 4,
+        baseDelay: float = 0.5,
+        maxDelay: float = 30.0,
+        seed: int = None,
+    ):
+        """
+        qps and unitsPerSecond of None mean unlimited. burst is the number
+        of seconds worth of tokens that can be saved up.
+        """
+        self.queries = None
+        if qps is not None:
+            self.queries = TokenBucket(qps, qps * burst)
+        self.units = None
+        if unitsPerSecond is not None:
+            self.units = TokenBucket(unitsPerSecond, unitsPerSecond * burst)
+
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+        self._cond = threading.Condition()
+        # (priority, arrival) of everybody waiting for tokens
+        self._waiting = []
+        self._arrivals = itertools.count()
+        self._random = random.Random(seed)
+
+    def _needs(self, units: float) -> list[tuple[TokenBucket, float]]:
+        needs = []
+        if self.queries is not None:
+            needs.append((self.queries, 1))
+        if self.units is not None:
+            needs.append((self.units, units))
+        return needs
+
+    def acquire(
+        self,
+        units: float = 1,
+        priority: int = INTERACTIVE,
+        flight: _Flight = None,
+    ):
+        """
+        Blocks until the quota allows one request billing `units` and all
+        callers of a more urgent lane (or that arrived earlier in the same
+        lane) have been served. The request of a flight follows it to the
+        lanes it is promoted to while waiting.
+        """
+        needs = self._needs(units)
+        if not needs:
+            return
+
+        ticket = (priority, next(self._arrivals))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            if flight is not None:
+                flight.ticket = ticket
+            self._cond.notify_all()
+            try:
+                while True:
+                    if flight is not None:
+                        # promote() may have moved it to another lane
+                        ticket = flight.ticket
+
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+
+                    now = time.monotonic()
+                    delay = max(bucket.delay(n, now) for bucket, n in needs)
+                    if delay <= 0:
+                        for bucket, n in needs:
+                            bucket.take(n, now)
+                        return
+                    self._cond.wait(delay)
+            finally:
+                if flight is not None:
+                    ticket, flight.ticket = flight.ticket, None
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full jitter: uniform in [0, baseDelay * 2**attempt], capped.
+        """
+        return self._random.uniform(
+            0, min(self.maxDelay, self.baseDelay * 2**attempt)
+        )
+
+    def run(
+        self,
+        fn: Callable,
+        *args,
+        units: float = 1,
+        priority: int = INTERACTIVE,
+        onRetry: Callable[[], None] = None,
+        key: Hashable = None,
+        onJoin: Callable[[], None] = None,
+        **kwargs,
+    ):
+        """
+        Calls fn within the quota, retrying transient errors up to
+        maxRetries times. Calls with the same key while one is in flight
+        (on any Scheduler) get its result (or error) instead, and onJoin is
+        called; a call of a more urgent lane promotes the one in flight.
+        Results are shared, don't modify them.
+        """
+        if key is None:
+            return self._run(fn, args, kwargs, units, priority, onRetry)
+
+        with _flightsLock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight(self, priority)
+
+        if not leader:
+            flight.promote(priority)
+            if onJoin is not None:
+                onJoin()
+            return flight.result()
+
+        try:
+            result = self._run(
+                fn, args, kwargs, units, priority, onRetry, flight
+            )
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with _flightsLock:
+                del _flights[key]
+
+    def _run(self, fn, args, kwargs, units, priority, onRetry, flight=None):
+
+        for attempt in range(self.maxRetries + 1):
+            if flight is not None:
+                priority = flight.priority
+            self.acquire(units, priority, flight)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as exc:
+                if (attempt == self.maxRetries) or not isTransient(exc):
+                    raise
+
+            if onRetry is not None:
+                onRetry()
+            time.sleep(self.backoff(attempt))
@@ -0,0 +1,163 @@
+"""
+Binary snapshots of parsed matrices.
+
+A TravelTimeTensor is written once and memory-mapped by every process that
+scores venues from it, without parsing or refetching any response:
+
+    header   b"WSWS", version, friends, hosts, modes, planes, label bytes
+    offsets  uint32 start of every label in the blob (+ end of the last):
+             friend names, hosts, modes, then plane fields
+    labels   utf-8 encoded labels, back to back, padded to 8 bytes
+    planes   friends x hosts x modes float64 per field, laid out like
+             TravelTimeTensor.data, the plane shown in data first
+    status   uint8 element state per element (see matrix.STATUSES)
+
+All numbers are little-endian. On big-endian hosts they are swapped while
+saving and loaded into copies instead of views.
+
+Loaded planes are read-only views of the mapped file, shared through the
+page cache by all processes that load the same snapshot:
+
+    tensor = snapshot.load("matrices.wswm").view("duration")
+    Mbest, _ = tensor.best()
+    HostRanker(Mbest, tensor.names, tensor.hosts).rank("minimax")
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .matrix import TravelTimeTensor
+
+MAGIC = b"WSWS"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIII")
+
+# offsets and planes can be written and mapped as they are
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _pad(size: int) -> int:
+    return -size % 8
+
+
+def _toLittle(values, typecode: str):
+    if LITTLE_ENDIAN:
+        return values
+
+    values = array(typecode, values)
+    values.byteswap()
+    return values
+
+
+def _fromLittle(view: memoryview, typecode: str):
+    if LITTLE_ENDIAN:
+        return view.cast(typecode)
+
+    values = array(typecode, bytes(view))
+    values.byteswap()
+    return values
+
+
+def save(tensor: TravelTimeTensor, path: str):
+    """
+    Writes tensor with all its parsed fields. The file is replaced
+    atomically, processes still mapping an older snapshot keep reading it.
+    """
+    # a tensor that was only fill()ed has one unnamed plane
+    planes = dict(tensor.fields) or {"": tensor.data}
+    shown = [field for field, plane in planes.items() if plane is tensor.data]
+    planes = {field: planes[field] for field in shown + list(planes)}
+
+    labels = [
+        label.encode("utf-8")
+        for label in (*tensor.names, *tensor.hosts, *tensor.modes, *planes)
+    ]
+    offsets = array("I", [0])
+    for label in labels:
+        offsets.append(offsets[-1] + len(label))
+    blob = b"".join(labels)
+
+    size = len(tensor.data)
+    status = tensor.status if tensor.status is not None else bytes(size)
+
+    # a name of its own: concurrent saves to the same path don't collide
+    tmpPath = f"{path}.{os.urandom(8).hex()}.tmp"
+    try:
+        with open(tmpPath, "xb") as f:
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(tensor.names),
+                    len(tensor.hosts),
+                    len(tensor.modes),
+                    len(planes),
+                    len(blob),
+                )
+            )
+            f.write(_toLittle(offsets, "I"))
+            f.write(blob)
+            f.write(bytes(_pad(HEADER.size + 4 * len(offsets) + len(blob))))
+            for plane in planes.values():
+                f.write(_toLittle(plane, "d"))
+            f.write(status)
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.unlink(tmpPath)
+        raise
+
+
+def fromBuffer(buffer) -> TravelTimeTensor:
+    """
+    Tensor whose planes are views of buffer, nothing is copied.
+    """
+    header = HEADER.unpack_from(buffer, 0)
+    magic, version, nNames, nHosts, nModes, nPlanes, labelsSize = header
+    if magic != MAGIC:
+        raise ValueError("Not a matrix snapshot file.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported matrix snapshot version {version}.")
+
+    view = memoryview(buffer)
+    nLabels = nNames + nHosts + nModes + nPlanes
+    start = HEADER.size
+    offsets = _fromLittle(view[start : start + 4 * (nLabels + 1)], "I")
+    start += 4 * (nLabels + 1)
+    labels = [
+        bytes(view[start + offsets[n] : start + offsets[n + 1]]).decode(
+            "utf-8"
+        )
+        for n in range(nLabels)
+    ]
+    start += labelsSize
+    start += _pad(start)
+
+    size = nNames * nHosts * nModes
+    planes = {}
+    for field in labels[nNames + nHosts + nModes :]:
+        planes[field] = _fromLittle(view[start : start + 8 * size], "d")
+        start += 8 * size
+
+    tensor = TravelTimeTensor(
+        labels[:nNames],
+        labels[nNames : nNames + nHosts],
+        labels[nNames + nHosts : nNames + nHosts + nModes],
+        data=next(iter(planes.values())),
+    )
+    if "" not in planes:
+        tensor.fields = planes
+        tensor.status = view[start : start + size].cast("B")
+
+    return tensor
+
+
+def load(path: str) -> TravelTimeTensor:
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return fromBuffer(buffer)
@@ -0,0 +1,215 @@
+"""
+Picks the meeting spot: scores every potential host (a column of Mbest)
+under a group objective and returns the best k.
+"""
+
+import heapq
+from math import inf, isinf
+from typing import NamedTuple
+
+OBJECTIVES = ("minisum", "minimax", "variance", "gini", "weighted")
+
+# matrices of at least this many elements are ranked with numpy if it is
+# installed; below, importing it would take longer than the ranking
+VECTORIZE = 10_000
+
+
+class HostScore(NamedTuple):
+    host: str
+    score: float
+    total: float
+    worst: float
+    mean: float
+    variance: float
+    gini: float
+
+
+class SweepResult(NamedTuple):
+    times: list
+    transitModes: tuple[str]
+    hosts: list[str]
+    # (time, transitMode) -> score of every host
+    scores: dict
+    # (time, transitMode, HostScore) of the overall winner
+    best: tuple
+
+    def table(self, transitMode: str = None) -> list[list[float]]:
+        """
+        time x host scores for one transitMode (the first by default).
+        """
+        transitMode = transitMode or self.transitModes[0]
+        return [self.scores[(t, transitMode)] for t in self.times]
+
+
+def gini(values: list[float]) -> float:
+    """
+    Gini coefficient of non-negative travel times (0: everybody travels
+    equally long, towards 1: one person does all the travelling).
+    """
+    xs = sorted(values)
+    n = len(xs)
+    total = sum(xs)
+    if (n == 0) or (total == 0):
+        return 0.0
+    if isinf(total):
+        return inf
+
+    weighted = sum(i * x for i, x in enumerate(xs, start=1))
+    return 2 * weighted / (n * total) - (n + 1) / n
+
+
+class HostRanker:
+    """
+    Ranks the hosts of a friends x hosts matrix (e.g. Mbest from getMatrix).
+
+    The per-host statistics are computed once when the ranker is built, so
+    switching objectives or k afterwards only sorts precomputed numbers.
+    Large matrices are held as a numpy array when numpy is installed, the
+    weighted objective is then one matrix-vector product per query.
+    """
+
+    def __init__(
+        self, M: list[list[float]], names: list[str], hosts: list[str]
+    ):
+
+        self.names = list(names)
+        self.hosts = list(hosts)
+
+        self._array = None
+        if len(self.names) * len(self.hosts) >= VECTORIZE:
+            try:
+                import numpy
+            except ImportError:
+                pass
+            else:
+                self._fromArray(numpy.asarray(M, dtype=float))
+                return
+
+        self._columns = list(zip(*M)) if M else [() for _ in self.hosts]
+
+        self.total = [sum(col) for col in self._columns]
+        self.worst = [max(col, default=0) for col in self._columns]
+        n = len(self.names) or 1
+        self.mean = [total / n for total in self.total]
+        self.variance = [
+            inf if isinf(mean) else sum((t - mean) ** 2 for t in col) / n
+            for col, mean in zip(self._columns, self.mean)
+        ]
+        self.gini = [gini(col) for col in self._columns]
+
+    def _fromArray(self, A: "numpy.ndarray"):
+        """
+        The statistics of __init__, computed on the friends x hosts array A.
+        """
+        import numpy as np
+
+        self._array = A
+        # (friends, hosts) of unreachable pairs, which are 0 in _array:
+        # a friend weighted 0 would make them 0 * inf = nan
+        unreachable = np.isinf(A)
+        self._unreachable = None
+        if unreachable.any():
+            self._unreachable = unreachable.nonzero()
+            self._array = np.where(unreachable, 0.0, A)
+        n = len(self.names)
+        total = A.sum(axis=0)
+        infinite = np.isinf(total)
+        mean = total / n
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = ((A - mean) ** 2).sum(axis=0) / n
+            # Gini from every column sorted ascending, see gini()
+            ranked = np.arange(1, n + 1) @ np.sort(A, axis=0)
+            ginis = 2 * ranked / (n * total) - (n + 1) / n
+        variance[infinite] = inf
+        ginis[total == 0] = 0.0
+        ginis[infinite] = inf
+
+        # objective -> scores, ranked without leaving numpy
+        self._vectors = {
+            "minisum": total,
+            "minimax": A.max(axis=0),
+            "variance": variance,
+            "gini": ginis,
+        }
+
+        # plain lists, like the pure Python statistics
+        self.total = total.tolist()
+        self.worst = self._vectors["minimax"].tolist()
+        self.mean = mean.tolist()
+        self.variance = variance.tolist()
+        self.gini = ginis.tolist()
+
+    def _weighted(self, weights: dict):
+        w = [weights.get(name, 1) for name in self.names]
+
+        if self._array is None:
+            return [
+                sum(wi * t for wi, t in zip(w, col) if wi)
+                for col in self._columns
+            ]
+
+        import numpy as np
+
+        w = np.asarray(w, dtype=float)
+        scores = w @ self._array
+        if self._unreachable is not None:
+            # friends weighted 0 don't count, even where they can't get to
+            friends, hosts = self._unreachable
+            scores[hosts[w[friends] != 0]] = inf
+        return scores
+
+    def _scores(self, objective: str, weights: dict):
+
+        if (self._array is not None) and (objective in self._vectors):
+            return self._vectors[objective]
+        elif objective == "minisum":
+            return self.total
+        elif objective == "minimax":
+            return self.worst
+        elif objective == "variance":
+            return self.variance
+        elif objective == "gini":
+            return self.gini
+        elif objective == "weighted":
+            if weights is None:
+                raise ValueError("Objective weighted requires weights.")
+            return self._weighted(weights)
+
+        raise ValueError(
+            f"Unknown objective {objective}, pick one of {OBJECTIVES}."
+        )
+
+    def scores(
+        self, objective: str = "minisum", weights: dict = None
+    ) -> list[float]:
+
+        scores = self._scores(objective, weights)
+        return scores if isinstance(scores, list) else scores.tolist()
+
+    def rank(
+        self, objective: str = "minisum", k: int = 3, weights: dict = None
+    ) -> list[HostScore]:
+
+        scores = self._scores(objective, weights)
+        if isinstance(scores, list):
+            best = heapq.nsmallest(
+                k, range(len(self.hosts)), key=lambda j: scores[j]
+            )
+        else:
+            # stable: ties go to the first host, as with nsmallest
+            best = scores.argsort(kind="stable")[:k].tolist()
+            scores = {j: scores[j].item() for j in best}
+
+        return [
+            HostScore(
+                host=self.hosts[j],
+                score=scores[j],
+                total=self.total[j],
+                worst=self.worst[j],
+                mean=self.mean[j],
+                variance=self.variance[j],
+                gini=self.gini[j],
+            )
+            for j in best
+        ]
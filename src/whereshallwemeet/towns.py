@@ -0,0 +1,133 @@
+"""
+Town lookup for closestCity.
+
+The town table (e.g. geoInfo/swisstopo_towns.csv) is converted once into a
+small binary file next to it and memory-mapped from then on:
+
+    header   b"WSWT", version, number of towns, size of the name blob
+    coords   2 x float64 per town (x, y)
+    offsets  uint32 start of every name in the blob (+ end of the last)
+    names    utf-8 encoded town names, back to back
+
+Nearest-town queries go through a GridIndex over the coordinates, so a
+batch of points only looks at the towns in the cells around each point.
+"""
+
+import csv
+import mmap
+import pathlib
+import struct
+from array import array
+from functools import lru_cache
+
+from .grid import GridIndex
+
+MAGIC = b"WSWT"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+
+# average number of towns per grid cell
+TOWNS_PER_CELL = 2
+
+
+class TownTable:
+    def __init__(self, buffer):
+
+        magic, version, count, namesSize = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a town table file.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported town table version {version}.")
+
+        self._buffer = buffer
+        view = memoryview(buffer)
+
+        start = HEADER.size
+        self.coords = view[start : start + 16 * count].cast("d")
+        start += 16 * count
+        self._offsets = view[start : start + 4 * (count + 1)].cast("I")
+        start += 4 * (count + 1)
+        self._names = view[start : start + namesSize]
+
+        self._grid = GridIndex(
+            zip(self.coords[0::2], self.coords[1::2]), TOWNS_PER_CELL
+        )
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def name(self, i: int) -> str:
+        return bytes(
+            self._names[self._offsets[i] : self._offsets[i + 1]]
+        ).decode("utf-8")
+
+    @classmethod
+    def load(cls, path: str) -> "TownTable":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(buffer)
+
+    @classmethod
+    def open(
+        cls,
+        csvPath: str,
+        nameCol: str = "Ortschaftsname",
+        xCol: str = "E",
+        yCol: str = "N",
+    ) -> "TownTable":
+        """
+        Loads the binary version of csvPath, converting it first if it
+        doesn't exist yet or is older than the csv.
+        """
+        csvPath = pathlib.Path(csvPath)
+        binPath = csvPath.with_suffix(".bin")
+        if (not binPath.exists()) or (
+            binPath.stat().st_mtime < csvPath.stat().st_mtime
+        ):
+            convert(csvPath, binPath, nameCol=nameCol, xCol=xCol, yCol=yCol)
+
+        return cls.load(binPath)
+
+    def nearest(self, points) -> list[int]:
+        """
+        Index of the closest town for every (x, y) in points.
+        """
+        return self._grid.nearest(points)
+
+
+def convert(
+    csvPath: str,
+    binPath: str,
+    nameCol: str = "Ortschaftsname",
+    xCol: str = "E",
+    yCol: str = "N",
+):
+    """
+    Writes the binary town table for a csv with name, x and y columns.
+    """
+    coords = array("d")
+    names = []
+    with open(csvPath, "r", newline="", encoding="utf-8-sig") as f:
+        dialect = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t")
+        f.seek(0)
+        for row in csv.DictReader(f, dialect=dialect):
+            coords.append(float(row[xCol]))
+            coords.append(float(row[yCol]))
+            names.append(row[nameCol].encode("utf-8"))
+
+    offsets = array("I", [0])
+    for name in names:
+        offsets.append(offsets[-1] + len(name))
+    blob = b"".join(names)
+
+    with open(binPath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names), len(blob)))
+        f.write(coords.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+
+
+@lru_cache(maxsize=None)
+def townTable(csvPath: str) -> TownTable:
+    return TownTable.open(csvPath)
@@ -1,10 +1,8 @@
 import datetime
-import plotly.express as px
-import plotly.graph_objects as go
-from scipy.spatial import ConvexHull
-import numpy as np
-from shapely.geometry import Polygon
-import pointpats 
+
+# the plotting and geometry stack (plotly, scipy, numpy, shapely, pointpats)
+# is heavy and only needed by the helpers below, so each of them imports
+# what it needs on first call. Install with `pip install whereShallWeMeet[geo]`
 
 def onDay(date, day=2, hour=18):
     """
@@ -21,10 +19,23 @@ def onDay(date, day=2, hour=18):
     return newdate.replace(hour=hour, minute=0, second=0, microsecond=0)
 
 
+def defaultDeparture(departureTime=None):
+    """
+    Returns departureTime, or the next Wednesday 18:00 if it is None.
+    Use this instead of a default argument, which is evaluated only once.
+    """
+    if departureTime is None:
+        return onDay(datetime.datetime.now())
+
+    return departureTime
+
+
 def argmin(a):
     return min(range(len(a)), key=lambda x: a[x])
 
 def plotAddresses(lon, lat, show=True):
+    import plotly.express as px
+
     fig = px.scatter_mapbox(lat=lat, lon=lon,
                         mapbox_style="carto-positron")
     if show:
@@ -33,6 +44,10 @@ def plotAddresses(lon, lat, show=True):
         return fig
 
 def plotConvexHull(polygon, bbox=False, samples = None):
+    import numpy as np
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     fig = go.Figure(go.Scattermapbox(
         fill = "toself",
         lon = [p[0] for p in polygon], lat = [p[1] for p in polygon],
@@ -55,11 +70,56 @@ def plotConvexHull(polygon, bbox=False, samples = None):
         showlegend = False)
     fig.show()
 
+def plotHeatmap(surface, homes=None, maxPixels=20000, show=True):
+    """
+    Draws a heatmap.Surface in minutes as a WebGL (Scattergl) trace of at
+    most maxPixels cells (blocks of pixels are averaged beyond that), with
+    the hull and optionally the (lat, lng) homes on top.
+    """
+    import math
+    import plotly.graph_objects as go
+
+    surface = surface.decimate(maxPixels)
+    points = [p for p in surface.points() if not math.isinf(p[2])]
+    hull = surface.hull + surface.hull[:1]
+
+    fig = go.Figure(go.Scattergl(
+        x=[p[0] for p in points], y=[p[1] for p in points],
+        mode="markers",
+        marker={"color": [p[2] / 60 for p in points], "symbol": "square",
+                "colorscale": "Viridis", "reversescale": True,
+                "colorbar": {"title": "minutes"}},
+        hoverinfo="skip"))
+    fig.add_trace(go.Scattergl(
+        x=[p[0] for p in hull], y=[p[1] for p in hull],
+        mode="lines", line={"color": "orange"}))
+    if homes is not None:
+        fig.add_trace(go.Scattergl(
+            x=[h[1] for h in homes], y=[h[0] for h in homes],
+            mode="markers", marker={"size": 10, "color": "black"}))
+
+    # degrees of longitude shrink towards the poles
+    lat = sum(surface.lats) / len(surface.lats)
+    fig.update_layout(
+        xaxis={"title": "longitude"},
+        yaxis={"title": "latitude", "scaleanchor": "x",
+               "scaleratio": 1 / math.cos(math.radians(lat))},
+        showlegend=False)
+    if show:
+        fig.show()
+    else:
+        return fig
+
 def sampleWithinPoly(polygon, n=50):
+    import pointpats
+    from shapely.geometry import Polygon
+
     pgon = Polygon(polygon)
     return pointpats.random.poisson(pgon, size=n)
 
 def convexArea(lon, lat):
+    from scipy.spatial import ConvexHull
+
     h = ConvexHull(list(zip(lon, lat)))
 
     polygon = [(lon[s], lat[s]) for s in h.vertices]
@@ -73,9 +133,9 @@ def getBbox(lon, lat):
     (min(lon), max(lat)),
     (min(lon), min(lat))]
 
-def closestCity(samples):
+def closestCity(samples, towns="geoInfo/swisstopo_towns.csv"):
+    from .towns import townTable
+
     # df_cities = pd.read_csv("geoInfo/ch.csv")
-    df_cities = pd.read_csv("geoInfo/swisstopo_towns.csv").rename(columns={"Ortschaftsname":"city","N":"lat", "E":"lng"})
-    cities = list(zip(df_cities.lng, df_cities.lat))
-    closest = [np.argmin(np.linalg.norm(s-cities, axis=1)) for s in samples]
-    return set([df_cities.iloc[c]["city"] for c in closest])
\ No newline at end of file
+    table = townTable(towns)
+    return set(table.name(c) for c in table.nearest(samples))
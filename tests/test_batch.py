@@ -0,0 +1,80 @@
+"""
+BatchPlanner, offline with the SpeedModelBackend.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from whereshallwemeet.backends import SpeedModelBackend
+from whereshallwemeet.batch import BatchPlanner
+from whereshallwemeet.caller import WhereShallWeMeet
+from whereshallwemeet.matrix import Limits
+
+DEPARTURE = datetime(2030, 1, 9, 18)
+
+MODES = ("transit", "driving", "bicycling", "walking")
+
+# three teams, overlapping in pairs
+TEAMS = {"red": range(0, 14), "green": range(7, 21), "blue": range(14, 28)}
+
+
+def friends(tmp_path) -> dict:
+    groups = {}
+    for team, members in TEAMS.items():
+        path = tmp_path / f"{team}.csv"
+        path.write_text(
+            "name,address,preferred,host,joins\n"
+            + "".join(
+                f'p{i},"{52.40 + i / 200:.4f},{13.30 + i % 5 / 50:.4f}",'
+                f"{MODES[i % 4]},{'yes' if i % 3 else 'no'},yes\n"
+                for i in members
+            )
+        )
+        groups[team] = str(path)
+    return groups
+
+
+def test_shared_pairs_are_billed_once(tmp_path):
+    batch = BatchPlanner(friends(tmp_path), backend=SpeedModelBackend())
+
+    pairs = batch.prefetch(transitMode="custom", departureTime=DEPARTURE)
+    plans = batch.plan(transitMode="custom", departureTime=DEPARTURE)
+
+    units = batch.metrics.summary()["api_units_total"][("distance_matrix",)]
+    assert units == pairs
+    for team, path in friends(tmp_path).items():
+        alone = WhereShallWeMeet(path, backend=SpeedModelBackend())
+        assert plans[team].Mbest == (
+            alone.getMatrix(transitMode="custom", departureTime=DEPARTURE)[0]
+        )
+
+
+def test_prefetch_stays_within_maxWorkers(tmp_path):
+    class SlowBackend(SpeedModelBackend):
+        limits = Limits(2, 2, 4)
+
+        def __init__(self):
+            super().__init__()
+            self.lock = threading.Lock()
+            self.running = self.peak = 0
+
+        def distanceMatrix(self, *args, **kwargs):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(0.002)
+            with self.lock:
+                self.running -= 1
+            return super().distanceMatrix(*args, **kwargs)
+
+    backend = SlowBackend()
+    # groups of their own, each with maxWorkers=8
+    groups = {
+        team: WhereShallWeMeet(path)
+        for team, path in friends(tmp_path).items()
+    }
+    batch = BatchPlanner(groups, backend=backend, maxWorkers=3)
+    batch.prefetch(transitMode="custom", departureTime=DEPARTURE)
+
+    assert 0 < backend.peak <= 3
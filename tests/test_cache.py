@@ -0,0 +1,159 @@
+"""
+MatrixCache buckets, expiry and eviction, and how planners use it.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from whereshallwemeet import cache as cacheModule
+from whereshallwemeet.backends import SpeedModelBackend
+from whereshallwemeet.cache import MatrixCache
+from whereshallwemeet.caller import WhereShallWeMeet
+
+DEPARTURE = datetime(2030, 1, 9, 18)
+
+ELEMENT = {
+    "distance": {"text": "1 km", "value": 1000},
+    "duration": {"text": "5 mins", "value": 300},
+    "status": "OK",
+}
+
+FRIENDS = """name,address,preferred,host,joins
+Ann,"52.5200,13.4050",transit,yes,yes
+Ben,"52.4900,13.3500",driving,yes,yes
+Cid,"52.5400,13.4500",bicycling,no,yes
+"""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_900_000_000.0]
+    monkeypatch.setattr(cacheModule.time, "time", lambda: now[0])
+    return now
+
+
+def test_elements_round_trip():
+    cache = MatrixCache()
+    odd = {"status": "OK", "fare": {"currency": "EUR", "value": 3}}
+    cache.put({("a", "b"): ELEMENT, ("a", "c"): odd}, "transit", DEPARTURE)
+
+    assert cache.get(["a"], ["b", "c"], "transit", DEPARTURE) == {
+        ("a", "b"): ELEMENT,
+        ("a", "c"): odd,
+    }
+    assert cache.get(["a"], ["b"], "driving", DEPARTURE) == {}
+
+
+def test_transient_elements_are_not_cached():
+    cache = MatrixCache()
+    cache.put({("a", "b"): {"status": "OVER_QUERY_LIMIT"}}, "transit", "x")
+
+    assert len(cache) == 0
+
+
+def test_buckets():
+    cache = MatrixCache(bucketSeconds=900)
+    weekly = MatrixCache(bucketSeconds=900, recurring=True)
+    later = DEPARTURE + timedelta(minutes=10)
+    nextWeek = DEPARTURE + timedelta(days=7)
+
+    assert cache.bucket(later) == cache.bucket(DEPARTURE)
+    assert cache.bucket(nextWeek) != cache.bucket(DEPARTURE)
+    assert weekly.bucket(nextWeek) == weekly.bucket(later)
+    assert weekly.bucket(DEPARTURE + timedelta(days=1)) != weekly.bucket(
+        DEPARTURE
+    )
+
+
+def test_now_is_bucketed_by_the_clock(clock):
+    cache = MatrixCache(bucketSeconds=900, recurring=True)
+    cache.put({("a", "b"): ELEMENT}, "driving", "now")
+    clock[0] += 60
+    assert cache.get(["a"], ["b"], "driving", "now")
+
+    clock[0] += 900
+    assert not cache.get(["a"], ["b"], "driving", "now")
+
+
+def test_old_elements_expire(clock):
+    cache = MatrixCache(ttl=3600)
+    cache.put({("a", "b"): ELEMENT}, "transit", DEPARTURE)
+    clock[0] += 3000
+    assert cache.get(["a"], ["b"], "transit", DEPARTURE)
+
+    clock[0] += 1000
+    assert not cache.get(["a"], ["b"], "transit", DEPARTURE)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted(clock):
+    cache = MatrixCache(maxEntries=2)
+    cache.put({("a", "b"): ELEMENT}, "transit", DEPARTURE)
+    clock[0] += 100
+    cache.put({("a", "c"): ELEMENT}, "transit", DEPARTURE)
+    clock[0] += 100
+    # used again, so a -> c is the least recently used
+    assert cache.get(["a"], ["b"], "transit", DEPARTURE)
+    clock[0] += 100
+    cache.put({("a", "d"): ELEMENT}, "transit", DEPARTURE)
+
+    assert set(cache.get(["a"], ["b", "c", "d"], "transit", DEPARTURE)) == {
+        ("a", "b"),
+        ("a", "d"),
+    }
+
+
+def test_caches_of_another_schema_are_dropped(tmp_path):
+    path = str(tmp_path / "elements.db")
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("CREATE TABLE elements (origin TEXT, element TEXT)")
+        db.execute("INSERT INTO elements VALUES ('a', '{}')")
+        db.execute(f"PRAGMA user_version = {cacheModule.SCHEMA - 1}")
+    db.close()
+
+    cache = MatrixCache(path)
+    assert len(cache) == 0
+    cache.put({("a", "b"): ELEMENT}, "transit", DEPARTURE)
+    cache.close()
+
+    # same schema: kept
+    assert len(MatrixCache(path)) == 1
+
+
+def planner(friendsFile, cache) -> WhereShallWeMeet:
+    return WhereShallWeMeet(
+        friendsFile, backend=SpeedModelBackend(), cache=cache
+    )
+
+
+def calls(planner) -> int:
+    return planner.metrics.summary()["api_units_total"][("distance_matrix",)]
+
+
+def test_weekly_runs_hit_the_recurring_cache(tmp_path):
+    friendsFile = tmp_path / "friends.csv"
+    friendsFile.write_text(FRIENDS)
+    cache = MatrixCache(recurring=True)
+
+    planner(friendsFile, cache).getMatrix(departureTime=DEPARTURE)
+    nextWeek = planner(friendsFile, cache)
+    nextWeek.getMatrix(departureTime=DEPARTURE + timedelta(days=7))
+
+    assert "api_units_total" not in nextWeek.metrics.summary()
+    assert nextWeek.metrics.hitRate() == 1
+
+
+def test_force_bypasses_the_cache(tmp_path):
+    friendsFile = tmp_path / "friends.csv"
+    friendsFile.write_text(FRIENDS)
+    cached = planner(friendsFile, MatrixCache())
+
+    cached.getMatrix(departureTime=DEPARTURE)
+    assert calls(cached) == 6
+    cached.getMatrix(departureTime=DEPARTURE)
+    assert calls(cached) == 6
+    cached.getMatrix(departureTime=DEPARTURE, force=True)
+    assert calls(cached) == 12
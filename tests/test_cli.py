@@ -0,0 +1,134 @@
+"""
+The planning server, offline with the SpeedModelBackend.
+"""
+
+import http.client
+import json
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from whereshallwemeet.backends import SpeedModelBackend
+from whereshallwemeet.cli import PlanningService, _Handler, request
+
+FRIENDS = """name,address,preferred,host,joins
+Ann,"52.5200,13.4050",transit,yes,yes
+Ben,"52.4900,13.3500",driving,yes,yes
+Cid,"52.5400,13.4500",bicycling,no,yes
+"""
+
+
+@pytest.fixture(scope="module")
+def friendsFiles(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("friends")
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"friends{i}.csv"
+        path.write_text(FRIENDS)
+        paths.append(str(path))
+    return paths
+
+
+@contextmanager
+def serving(service: PlanningService):
+    handler = type("Handler", (_Handler,), {"service": service})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture(scope="module")
+def server(friendsFiles):
+    rosterDir = os.path.dirname(friendsFiles[0])
+    with serving(
+        PlanningService(backend=SpeedModelBackend(), rosterDir=rosterDir)
+    ) as url:
+        yield url
+
+
+def test_plan(server, friendsFiles):
+    answer = request(server, "/plan", {"friends": friendsFiles[0], "k": 1})
+
+    assert [score["host"] for score in answer["hosts"]] == ["Ann"]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"k": "x"},
+        {"k": 0},
+        {"k": True},
+        {"rankBy": "fastest"},
+        {"weights": ["Ann"]},
+        {"weights": {"Ann": "2"}},
+        {"departureTime": 5},
+        {"objective": "price"},
+        {"friends": 5},
+    ],
+)
+def test_bad_options_are_client_errors(server, friendsFiles, options):
+    with pytest.raises(RuntimeError, match="ValueError"):
+        request(server, "/plan", {"friends": friendsFiles[0], **options})
+
+
+def test_least_recently_used_planner_is_dropped(friendsFiles):
+    service = PlanningService(backend=SpeedModelBackend(), maxPlanners=2)
+
+    first, _ = service.planner(friendsFiles[0])
+    service.planner(friendsFiles[1])
+    # friends0 is used again, friends1 is the one to go
+    assert service.planner(friendsFiles[0])[0] is first
+    service.planner(friendsFiles[2])
+
+    assert [path[-12:] for path in service._planners] == [
+        "friends0.csv",
+        "friends2.csv",
+    ]
+
+
+def test_relative_paths_are_in_the_roster_directory(server, friendsFiles):
+    answer = request(server, "/plan", {"friends": "friends0.csv", "k": 1})
+
+    assert [score["host"] for score in answer["hosts"]] == ["Ann"]
+
+
+@pytest.mark.parametrize("friends", ["../secret.csv", "/etc/passwd"])
+def test_files_outside_the_roster_directory_are_refused(
+    server, friendsFiles, friends
+):
+    secret = os.path.join(os.path.dirname(friendsFiles[0]), "..", "secret.csv")
+    with open(secret, "w") as f:
+        f.write("password\nhunter2\n")
+
+    with pytest.raises(RuntimeError, match="not in the roster directory"):
+        request(server, "/plan", {"friends": friends})
+
+
+def test_unreachable_backends_are_server_errors(friendsFiles):
+    class OfflineBackend(SpeedModelBackend):
+        def distanceMatrix(self, *args, **kwargs):
+            raise ConnectionError("no route to maps.googleapis.com")
+
+    service = PlanningService(backend=OfflineBackend())
+    service.scheduler.maxRetries = 0
+    with serving(service) as url:
+        url = urlsplit(url)
+        connection = http.client.HTTPConnection(url.hostname, url.port)
+        connection.request(
+            "POST", "/plan", body=json.dumps({"friends": friendsFiles[0]})
+        )
+        response = connection.getresponse()
+        error = json.loads(response.read())["error"]
+        connection.close()
+
+    assert response.status == 502
+    assert error.startswith("ConnectionError")
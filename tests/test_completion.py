@@ -0,0 +1,85 @@
+"""
+complete() finds the same top k as the full matrix.
+"""
+
+import random
+
+import pytest
+
+from whereshallwemeet.candidates import haversine
+from whereshallwemeet.completion import complete
+from whereshallwemeet.solver import HostRanker
+
+
+def world(nFriends: int, nHosts: int, seed: int):
+    """
+    Homes around Berlin, every host a friend, and travel times of two
+    modes that follow the straight-line distance with per-friend and
+    per-host effects and some noise.
+    """
+    rng = random.Random(seed)
+    homes = [
+        (52.52 + rng.uniform(-0.1, 0.1), 13.40 + rng.uniform(-0.15, 0.15))
+        for _ in range(nFriends)
+    ]
+    hosts = list(range(nHosts))
+    slowness = [rng.uniform(0, 600) for _ in homes]
+    remoteness = [rng.uniform(0, 900) for _ in hosts]
+    speeds = {"transit": 6.0, "driving": 9.0}
+    truth = {
+        mode: [
+            [
+                haversine(*homes[i], *homes[j]) / speed
+                + slowness[i]
+                + remoteness[j]
+                + rng.uniform(0, 120)
+                for j in hosts
+            ]
+            for i in range(nFriends)
+        ]
+        for mode, speed in speeds.items()
+    }
+    rows = {mode: [] for mode in speeds}
+    for i in range(nFriends):
+        rows[rng.choice(sorted(speeds))].append(i)
+
+    return homes, [homes[j] for j in hosts], truth, rows
+
+
+@pytest.mark.parametrize("rankBy", ["minisum", "minimax", "weighted"])
+@pytest.mark.parametrize("seed", [3, 4])
+def test_top_k_matches_the_exact_ranking(rankBy, seed):
+    homes, hostHomes, truth, rows = world(80, 30, seed)
+    names = [f"f{i}" for i in range(len(homes))]
+    hosts = [f"h{j}" for j in range(len(hostHomes))]
+    weights = {name: (i % 3) * 10 for i, name in enumerate(names)}
+
+    exact = [[0.0] * len(hosts) for _ in homes]
+    for mode, friends in rows.items():
+        for i in friends:
+            exact[i] = truth[mode][i]
+
+    def fetch(mode, friends, hostIds):
+        return [[truth[mode][i][j] for j in hostIds] for i in friends]
+
+    w = weights if rankBy == "weighted" else None
+    completion = complete(
+        rows,
+        homes,
+        hostHomes,
+        fetch,
+        k=3,
+        rankBy=rankBy,
+        # ignored unless rankBy is weighted
+        weights=[weights[name] for name in names],
+        sample=0.1,
+        seed=seed,
+    )
+    expected = HostRanker(exact, names, hosts).rank(rankBy, k=3, weights=w)
+    found = HostRanker(completion.M, names, hosts).rank(rankBy, k=3, weights=w)
+
+    assert [s.host for s in found] == [s.host for s in expected]
+    assert [s.score for s in found] == pytest.approx(
+        [s.score for s in expected]
+    )
+    assert completion.elements < completion.total
@@ -0,0 +1,140 @@
+"""
+Loading rosters from csv, JSON Lines and yaml.
+"""
+
+import json
+
+import pytest
+
+from whereshallwemeet.friends import Friend, load, parseFlag, parseMode
+
+
+def roster(tmp_path, text: str, name: str = "friends.csv", **kwargs):
+    path = tmp_path / name
+    path.write_text(text, **kwargs)
+    return load(path)
+
+
+@pytest.mark.parametrize("value", ["yes", "Y", "TRUE", "t", "1", " x ", True])
+def test_true_flags(value):
+    assert parseFlag(value) is True
+
+
+@pytest.mark.parametrize(
+    "value", ["no", "N", "False", "f", "0", "", " ", None]
+)
+def test_false_flags(value):
+    assert parseFlag(value) is False
+
+
+def test_other_flags_are_errors():
+    with pytest.raises(ValueError, match="joinsParty 'maybe'"):
+        parseFlag("maybe", "joinsParty")
+
+
+@pytest.mark.parametrize(
+    "value, mode",
+    [(" Driving ", "driving"), ("WALKING", "walking"), ("", "transit")],
+)
+def test_modes_are_normalized(value, mode):
+    assert parseMode(value) == mode
+    assert parseMode(None) == "transit"
+
+
+def test_unknown_modes_are_errors():
+    with pytest.raises(ValueError, match="Unknown transit mode 'rocket'"):
+        parseMode("rocket")
+
+
+def test_csv(tmp_path):
+    friends = roster(
+        tmp_path,
+        "Name,Home address,Preferred mode,Can host,Joins\n"
+        "Ben,Berlin,Driving,False,yes\n"
+        "Ann,Hamburg,,x,Yes\n"
+        "Dee,Dresden,transit,,\n"
+        "Cid,Munich,walking,no,no\n",
+    )
+
+    assert friends.friends == [
+        Friend("Ann", "Hamburg", "transit", True, True),
+        Friend("Ben", "Berlin", "driving", False, True),
+    ]
+    assert friends.index == {"Ann": 0, "Ben": 1}
+    assert friends.hosts == ["Ann"]
+
+
+def test_byte_order_marks_are_skipped(tmp_path):
+    friends = roster(
+        tmp_path,
+        "name,address,preferred,host,joins\nAnn,Hamburg,transit,yes,yes\n",
+        encoding="utf-8-sig",
+    )
+
+    assert friends.names == ["Ann"]
+
+
+def test_json_lines(tmp_path):
+    entries = [
+        {"name": "Ann", "address": "Hamburg", "availableToHost": "yes"},
+        {
+            "name": "Ben",
+            "address": "Berlin",
+            "preferredTransitMode": "Driving",
+        },
+        {"name": "Cid", "joinsParty": False},
+    ]
+    friends = roster(
+        tmp_path,
+        "\n".join(json.dumps(entry) for entry in entries) + "\n\n",
+        name="friends.jsonl",
+    )
+
+    assert friends.friends == [
+        Friend("Ann", "Hamburg", "transit", True, True),
+        Friend("Ben", "Berlin", "driving", False, True),
+    ]
+
+
+def test_yaml(tmp_path):
+    pytest.importorskip("yaml")
+    friends = roster(
+        tmp_path,
+        "friends:\n"
+        "  - name: Ann\n"
+        "    address: Hamburg\n"
+        "    availableToHost: true\n"
+        "  - name: Ben\n"
+        "    address: Berlin\n"
+        "    preferredTransitMode: bicycling\n"
+        "    joinsParty: no\n",
+        name="friends.yaml",
+    )
+
+    assert friends.friends == [Friend("Ann", "Hamburg", "transit", True, True)]
+
+
+def test_missing_columns_name_the_file(tmp_path):
+    with pytest.raises(ValueError, match="friends.csv: No column .* joins"):
+        roster(tmp_path, "name,address,preferred,host\nAnn,Hamburg,,,\n")
+
+
+def test_every_bad_row_is_reported(tmp_path):
+    with pytest.raises(ValueError) as error:
+        roster(
+            tmp_path,
+            "name,address,preferred,host,joins\n"
+            "Ann,Hamburg,transit,yes,yes\n"
+            "Ben,Berlin,rocket,yes,yes\n"
+            "Ann,Bremen,transit,no,yes\n"
+            "Cid,Munich\n"
+            "Dee,,transit,no,yes\n"
+            "Eve,Essen,transit,maybe,yes\n",
+        )
+
+    lines = str(error.value).splitlines()
+    assert lines[0].endswith("friends.csv: 5 bad rows")
+    assert [line.split(":")[0] for line in lines[1:]] == [
+        f"  line {n}" for n in (3, 4, 5, 6, 7)
+    ]
+    assert "Ann already appears on line 2" in lines[2]
@@ -0,0 +1,125 @@
+"""
+Tiling of large matrices into requests within the API limits, and
+stitching the answers back together.
+"""
+
+import pytest
+
+from whereshallwemeet.backends import GraphBackend, SpeedModelBackend
+from whereshallwemeet.caller import WhereShallWeMeet
+from whereshallwemeet.matrix import (
+    GOOGLE_LIMITS,
+    MAX_DESTINATIONS,
+    MAX_ELEMENTS,
+    MAX_ORIGINS,
+    stitch,
+    tiles,
+)
+
+
+def addresses(n: int, lat: float = 52.5) -> list[str]:
+    return [f"{lat + i / 1000:.4f},{13.4 + i / 700:.4f}" for i in range(n)]
+
+
+class LimitedBackend(SpeedModelBackend):
+    """
+    Refuses requests over the distance matrix API limits, like Google.
+    """
+
+    limits = GOOGLE_LIMITS
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def distanceMatrix(self, origins, destinations, *args, **kwargs):
+        assert len(origins) <= MAX_ORIGINS
+        assert len(destinations) <= MAX_DESTINATIONS
+        assert len(origins) * len(destinations) <= MAX_ELEMENTS
+        self.requests.append((len(origins), len(destinations)))
+        return super().distanceMatrix(origins, destinations, *args, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "nOrigins, nDestinations",
+    [(1, 1), (3, 40), (40, 3), (31, 11), (100, 1), (1, 100), (26, 26)],
+)
+def test_tiles_cover_the_matrix_once_within_limits(nOrigins, nDestinations):
+    covered = {}
+    for oSlice, dSlice in tiles(nOrigins, nDestinations):
+        origins = range(nOrigins)[oSlice]
+        destinations = range(nDestinations)[dSlice]
+        assert 0 < len(origins) <= MAX_ORIGINS
+        assert 0 < len(destinations) <= MAX_DESTINATIONS
+        assert len(origins) * len(destinations) <= MAX_ELEMENTS
+        for i in origins:
+            for j in destinations:
+                covered[(i, j)] = covered.get((i, j), 0) + 1
+
+    assert len(covered) == nOrigins * nDestinations
+    assert set(covered.values()) == {1}
+
+
+@pytest.mark.parametrize("nOrigins, nDestinations", [(0, 5), (5, 0), (0, 0)])
+def test_nothing_to_tile(nOrigins, nDestinations):
+    assert tiles(nOrigins, nDestinations) == []
+    assert stitch(nOrigins, nDestinations, [], [])["rows"] == [
+        {"elements": []} for _ in range(nOrigins)
+    ]
+
+
+@pytest.mark.parametrize(
+    "nOrigins, nDestinations", [(31, 11), (7, 60), (120, 2), (0, 4), (4, 0)]
+)
+def test_tiled_response_equals_the_untiled_one(nOrigins, nDestinations):
+    backend = LimitedBackend()
+    planner = WhereShallWeMeet(backend=backend)
+    origins = addresses(nOrigins)
+    destinations = addresses(nDestinations, lat=52.4)
+
+    response = planner._fetchDistMatrix(
+        origins, destinations, transitMode="driving"
+    )
+
+    expected = SpeedModelBackend().distanceMatrix(
+        origins, destinations, mode="driving"
+    )
+    assert response == expected
+    assert sum(o * d for o, d in backend.requests) == nOrigins * nDestinations
+
+
+def test_backends_without_limits_get_the_whole_matrix():
+    class CountingGraph(GraphBackend):
+        searches = 0
+
+        def _toTarget(self, target, mode):
+            CountingGraph.searches += 1
+            return super()._toTarget(target, mode)
+
+    # a 5 x 4 street grid
+    nodes = {
+        f"{i},{j}": (52.4 + i / 50, 13.4 + j / 30)
+        for i in range(5)
+        for j in range(4)
+    }
+    edges = [
+        {"from": f"{i},{j}", "to": to, "seconds": 120}
+        for i in range(5)
+        for j in range(4)
+        for to in (f"{i + 1},{j}", f"{i},{j + 1}")
+        if to in nodes
+    ]
+    backend = CountingGraph(nodes, edges)
+    planner = WhereShallWeMeet(backend=backend)
+    origins = addresses(31)
+    destinations = addresses(11, lat=52.4)
+
+    response = planner._fetchDistMatrix(
+        origins, destinations, transitMode="driving"
+    )
+
+    # one search per destination, as if asked directly
+    assert CountingGraph.searches == 11
+    assert response == GraphBackend(nodes, edges).distanceMatrix(
+        origins, destinations, mode="driving"
+    )
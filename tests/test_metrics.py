@@ -0,0 +1,33 @@
+"""
+What the planner records in its Metrics.
+"""
+
+import pytest
+
+from whereshallwemeet.backends import SpeedModelBackend
+from whereshallwemeet.caller import WhereShallWeMeet
+
+
+def test_failed_requests_are_not_billed():
+    class FlakyBackend(SpeedModelBackend):
+        prices = {"geocode": 0.005}
+        fail = True
+
+        def geocode(self, address):
+            if self.fail:
+                raise ValueError("INVALID_REQUEST")
+            return super().geocode(address)
+
+    backend = FlakyBackend()
+    planner = WhereShallWeMeet(backend=backend)
+
+    with pytest.raises(ValueError):
+        planner._geocode("52.52,13.40")
+    backend.fail = False
+    planner._geocode("52.52,13.40")
+
+    summary = planner.metrics.summary()
+    assert summary["api_calls_total"][("geocode",)] == 2
+    assert summary["api_errors_total"][("geocode",)] == 1
+    assert summary["api_units_total"][("geocode",)] == 1
+    assert summary["api_cost_usd_total"][("geocode",)] == pytest.approx(0.005)
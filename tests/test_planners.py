@@ -0,0 +1,348 @@
+"""
+Every public method of WhereShallWeMeet, on the threaded and on the asyncio
+planner, offline with the SpeedModelBackend.
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from datetime import datetime
+from math import inf, isnan
+from pathlib import Path
+
+import pytest
+
+from whereshallwemeet import snapshot
+from whereshallwemeet.aio import AsyncWhereShallWeMeet
+from whereshallwemeet.backends import GoogleBackend, SpeedModelBackend
+from whereshallwemeet.caller import WhereShallWeMeet
+from whereshallwemeet.heatmap import Surface
+from whereshallwemeet.matrix import Limits
+from whereshallwemeet.routes import Route
+
+FRIENDS = """name,address,preferred,host,joins
+Ann,"52.5200,13.4050",transit,yes,yes
+Ben,"52.4900,13.3500",driving,yes,yes
+Cid,"52.5400,13.4500",bicycling,no,yes
+Dee,"52.4700,13.4400",transit,yes,yes
+Eve,"52.5100,13.2900",walking,yes,yes
+"""
+
+DEPARTURE = datetime(2030, 1, 9, 18)
+
+
+# public method -> (args, kwargs) to call it with, run in a temporary
+# directory
+CALLS = {
+    "getMatrix": ((), {"transitMode": "best"}),
+    "saveSnapshot": (("matrices.wswm",), {}),
+    "bestHosts": ((), {"k": 2, "transitMode": "custom"}),
+    "robustHosts": (
+        (),
+        {
+            "attendance": {"Ann": 0.5, "Ben": 0.8},
+            "nScenarios": 50,
+            "seed": 1,
+            "processes": 1,
+        },
+    ),
+    "approximateHosts": ((), {"k": 1, "sample": 0.5, "seed": 1}),
+    "routes": ((["Ann", "Dee"],), {"transitMode": "custom"}),
+    "sweep": (
+        ([DEPARTURE, DEPARTURE.replace(hour=8)],),
+        {"transitModes": ("transit", "best")},
+    ),
+    "searchVenues": (
+        (),
+        {
+            "venues": [(52.51, 13.40), (52.50, 13.38), (52.53, 13.36)],
+            "k": 2,
+            "batchSize": 1,
+        },
+    ),
+    "heatmap": ((), {"resolution": 8, "maxElements": 100}),
+    "reloadFriends": ((), {}),
+}
+
+
+def comparable(result):
+    if isinstance(result, Surface):
+        values = [None if isnan(value) else value for value in result.values]
+        return values, result.samples, result.elements
+    if isinstance(result, Route):
+        return result.seconds, result.meters
+    if isinstance(result, dict):
+        return {key: comparable(value) for key, value in result.items()}
+    if isinstance(result, tuple) and not hasattr(result, "_fields"):
+        return tuple(comparable(value) for value in result)
+    if hasattr(result, "M") and hasattr(result, "elements"):
+        # Completion
+        return result.M, result.elements
+    return result
+
+
+@pytest.fixture
+def friendsFile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "friends.csv"
+    path.write_text(FRIENDS)
+    return str(path)
+
+
+def test_every_public_method_has_a_call():
+    public = {
+        name
+        for name, _ in inspect.getmembers(WhereShallWeMeet, inspect.isfunction)
+        if not name.startswith("_")
+    }
+
+    assert public == set(CALLS)
+
+
+@pytest.mark.parametrize("method", sorted(CALLS))
+def test_async_matches_threaded(method, friendsFile):
+    if method == "heatmap":
+        pytest.importorskip("scipy")
+
+    args, kwargs = CALLS[method]
+    planner = WhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+    expected = getattr(planner, method)(*args, **kwargs)
+    if method == "saveSnapshot":
+        expected = snapshot.load(args[0]).view("duration").best()
+
+    async def run():
+        aio = AsyncWhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+        result = getattr(aio, method)(*args, **kwargs)
+        if method == "reloadFriends":
+            # only reads the friends file
+            assert not inspect.isawaitable(result)
+            return result
+        assert inspect.isawaitable(result)
+        return await result
+
+    result = asyncio.run(run())
+    if method == "saveSnapshot":
+        result = snapshot.load(args[0]).view("duration").best()
+
+    assert comparable(result) == comparable(expected)
+
+
+@pytest.mark.parametrize("rankBy", ["minisum", "minimax", "weighted"])
+def test_searchVenues_finds_the_exhaustive_best(rankBy, friendsFile):
+    planner = WhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+    venues = [
+        (52.44 + 0.02 * i, 13.28 + 0.03 * j)
+        for i in range(6)
+        for j in range(7)
+    ]
+    weights = {"Cid": 30, "Eve": 0}
+    kwargs = {"rankBy": rankBy, "weights": weights, "departureTime": DEPARTURE}
+
+    # every venue on its own, nothing to prune
+    exhaustive = sorted(
+        (
+            planner.searchVenues(venues=[venue], k=1, **kwargs)[0]
+            for venue in venues
+        ),
+        key=lambda score: score.score,
+    )
+    found = planner.searchVenues(venues=venues, k=3, batchSize=1, **kwargs)
+
+    assert [s.score for s in found] == [s.score for s in exhaustive[:3]]
+
+
+def test_coordinates_are_not_geocoded(friendsFile, tmp_path):
+    class CountingBackend(SpeedModelBackend):
+        places = 0
+
+        def place(self, address):
+            CountingBackend.places += 1
+            return super().place(address)
+
+    planner = WhereShallWeMeet(
+        friendsFile,
+        backend=CountingBackend(),
+        geocodeCache=str(tmp_path / "places.db"),
+    )
+    expected = WhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+    kwargs = CALLS["searchVenues"][1]
+
+    assert comparable(planner.searchVenues(**kwargs)) == comparable(
+        expected.searchVenues(**kwargs)
+    )
+    assert CountingBackend.places == 0
+
+
+class PlacesClient:
+    """
+    googlemaps.Client stand-in that knows a few named places.
+    """
+
+    places = {"Home": (52.52, 13.405), "Office": (52.49, 13.35)}
+
+    def geocode(self, address):
+        if address not in self.places:
+            return []
+        lat, lng = self.places[address]
+        return [
+            {
+                "place_id": address.lower(),
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+                "formatted_address": address,
+            }
+        ]
+
+    def distance_matrix(self, origins, destinations, mode, departure_time):
+        known = set(self.places) | {
+            f"place_id:{p.lower()}" for p in self.places
+        }
+
+        def element(o, d):
+            if o not in known or d not in known:
+                return {"status": "NOT_FOUND"}
+            return {
+                "distance": {"text": "1 km", "value": 1000},
+                "duration": {"text": "5 mins", "value": 300},
+                "status": "OK",
+            }
+
+        return {
+            "destination_addresses": list(destinations),
+            "origin_addresses": list(origins),
+            "rows": [
+                {"elements": [element(o, d) for d in destinations]}
+                for o in origins
+            ],
+            "status": "OK",
+        }
+
+
+def test_addresses_not_found_are_unreachable(tmp_path):
+    friendsFile = tmp_path / "friends.csv"
+    friendsFile.write_text(
+        "name,address,preferred,host,joins\n"
+        "Ann,Home,transit,yes,yes\n"
+        "Ben,Nowhere,transit,yes,yes\n"
+        "Cid,Office,transit,no,yes\n"
+    )
+    backend = GoogleBackend(PlacesClient())
+
+    with pytest.raises(ValueError, match="Nowhere"):
+        backend.place("Nowhere")
+
+    M, _ = WhereShallWeMeet(
+        friendsFile,
+        backend=backend,
+        geocodeCache=str(tmp_path / "places.db"),
+    ).getMatrix(departureTime=DEPARTURE)
+    assert M == [[300, inf], [inf, inf], [300, inf]]
+    assert M == (
+        WhereShallWeMeet(friendsFile, backend=backend).getMatrix(
+            departureTime=DEPARTURE
+        )[0]
+    )
+
+
+def test_robustHosts_checks_by_before_fetching(friendsFile):
+    planner = WhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+    aio = AsyncWhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+
+    with pytest.raises(ValueError, match="Can't rank by 75"):
+        planner.robustHosts(by=75)
+    with pytest.raises(ValueError, match="Can't rank by 75"):
+        asyncio.run(aio.robustHosts(by=75))
+
+    assert "api_calls_total" not in planner.metrics.summary()
+    assert "api_calls_total" not in aio.metrics.summary()
+
+
+class RecordingBackend(SpeedModelBackend):
+    """
+    Records every (origin, destination, mode) element it is asked for.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+
+    def distanceMatrix(self, origins, destinations, mode="transit", **kwargs):
+        self.elements += [(o, d, mode) for o in origins for d in destinations]
+        return super().distanceMatrix(origins, destinations, mode, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        # a friend joins and may host
+        ("", 'Fay,"52.5000,13.3000",transit,yes,yes\n'),
+        # Ann moves
+        ('Ann,"52.5200,13.4050"', 'Ann,"52.5300,13.4150"'),
+        # Ben takes the bike
+        ('Ben,"52.4900,13.3500",driving', 'Ben,"52.4900,13.3500",bicycling'),
+    ],
+)
+def test_reloadFriends_only_fetches_what_changed(old, new, friendsFile):
+    def getMatrix(planner):
+        del planner.backend.elements[:]
+        M, _ = planner.getMatrix(transitMode="custom", departureTime=DEPARTURE)
+        return M, planner.backend.elements
+
+    planner = WhereShallWeMeet(friendsFile, backend=RecordingBackend())
+    _, before = getMatrix(planner)
+    before = set(before)
+
+    path = Path(friendsFile)
+    friends = path.read_text()
+    path.write_text(friends.replace(old, new) if old else friends + new)
+    planner.reloadFriends()
+    M, elements = getMatrix(planner)
+
+    # exactly the new rows and columns, each element once
+    expected, everything = getMatrix(
+        WhereShallWeMeet(friendsFile, backend=RecordingBackend())
+    )
+    assert elements
+    assert sorted(elements) == sorted(set(everything) - before)
+    assert M == expected
+
+
+def test_nested_pools_stay_within_maxWorkers(friendsFile):
+    class SlowBackend(SpeedModelBackend):
+        # one element per request: every matrix is tiled
+        limits = Limits(1, 1, 1)
+
+        def __init__(self):
+            super().__init__()
+            self.lock = threading.Lock()
+            self.running = self.peak = 0
+
+        def distanceMatrix(self, *args, **kwargs):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(0.002)
+            with self.lock:
+                self.running -= 1
+            return super().distanceMatrix(*args, **kwargs)
+
+    backend = SlowBackend()
+    planner = WhereShallWeMeet(friendsFile, backend=backend, maxWorkers=3)
+    times = [DEPARTURE.replace(hour=h) for h in range(8, 16)]
+    planner.sweep(times, transitModes=("custom",))
+
+    assert 0 < backend.peak <= 3
+
+
+def test_sweeps_reuse_their_matrices_unless_forced(friendsFile):
+    planner = WhereShallWeMeet(friendsFile, backend=RecordingBackend())
+    times = [DEPARTURE, DEPARTURE.replace(hour=8)]
+
+    expected = planner.sweep(times)
+    assert planner.backend.elements
+    del planner.backend.elements[:]
+    assert planner.sweep(times) == expected
+    assert not planner.backend.elements
+
+    assert planner.sweep(times, force=True) == expected
+    assert planner.backend.elements
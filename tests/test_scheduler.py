@@ -0,0 +1,104 @@
+"""
+Single-flight of identical requests, and who retries.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from whereshallwemeet import backends
+from whereshallwemeet.scheduler import BATCH, Scheduler
+
+
+def test_identical_requests_collapse_across_schedulers():
+    started = threading.Event()
+    release = threading.Event()
+    joined = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"rows": []}
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(Scheduler().run(fetch, key="same"))
+    )
+    leader.start()
+    assert started.wait(5)
+
+    follower = threading.Thread(
+        target=lambda: results.append(
+            Scheduler().run(fetch, key="same", onJoin=joined.set)
+        )
+    )
+    follower.start()
+    assert joined.wait(5)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(calls) == 1
+    assert results[0] is results[1]
+    # nothing in flight any more: the next one is sent
+    Scheduler().run(fetch, key="same")
+    assert len(calls) == 2
+
+
+def test_interactive_joiners_promote_the_batch_request():
+    scheduler = Scheduler(qps=0.01)
+    # the only token: nobody else gets one before everybody queued
+    scheduler.acquire()
+    order = []
+
+    def queue(name, **kwargs):
+        thread = threading.Thread(
+            target=scheduler.run,
+            args=(order.append, name),
+            kwargs={"priority": BATCH, **kwargs},
+        )
+        thread.start()
+        return thread
+
+    def waiting(n):
+        while len(scheduler._waiting) < n:
+            time.sleep(0.001)
+
+    threads = []
+    for n, name in enumerate(["bulk1", "bulk2", "bulk3", "shared"]):
+        threads.append(queue(name, key="shared" if name == "shared" else None))
+        waiting(n + 1)
+
+    joined = threading.Event()
+    threads.append(
+        threading.Thread(
+            target=Scheduler().run,
+            args=(order.append, "never sent"),
+            kwargs={"key": "shared", "onJoin": joined.set},
+        )
+    )
+    threads[-1].start()
+    assert joined.wait(5)
+    with scheduler._cond:
+        scheduler.queries.rate = 1e6
+        scheduler._cond.notify_all()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["shared", "bulk1", "bulk2", "bulk3"]
+
+
+def test_googlemaps_clients_leave_retries_to_the_scheduler(monkeypatch):
+    pytest.importorskip("googlemaps")
+    monkeypatch.setattr(backends, "_clients", {})
+
+    client = backends.sharedClient("AIza-not-a-real-key")
+
+    assert client.retry_over_query_limit is False
+    assert client.retry_timeout == timedelta(
+        seconds=backends.CLIENT_RETRY_TIMEOUT
+    )
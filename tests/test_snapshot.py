@@ -0,0 +1,91 @@
+"""
+Snapshots round trip, in the same bytes on every host.
+"""
+
+import struct
+import threading
+
+import pytest
+
+from whereshallwemeet import snapshot
+from whereshallwemeet.backends import SpeedModelBackend
+from whereshallwemeet.caller import WhereShallWeMeet
+
+FRIENDS = """name,address,preferred,host,joins
+Ann,"52.5200,13.4050",transit,yes,yes
+Ben,"52.4900,13.3500",driving,yes,yes
+Cid,"52.5400,13.4500",bicycling,no,yes
+"""
+
+
+@pytest.fixture
+def tensor(tmp_path):
+    friendsFile = tmp_path / "friends.csv"
+    friendsFile.write_text(FRIENDS)
+    planner = WhereShallWeMeet(friendsFile, backend=SpeedModelBackend())
+    planner.getMatrix(transitMode="custom")
+    return planner._parsed[1]
+
+
+def contents(tensor) -> tuple:
+    return (
+        tensor.names,
+        tensor.hosts,
+        tensor.modes,
+        {field: list(plane) for field, plane in tensor.fields.items()},
+        bytes(tensor.status),
+    )
+
+
+def test_numbers_are_little_endian(tensor, tmp_path):
+    path = tmp_path / "matrices.wswm"
+    snapshot.save(tensor, path)
+
+    data = path.read_bytes()
+    header = snapshot.HEADER.unpack_from(data)
+    nLabels = sum(header[2:6])
+    offsets = struct.unpack_from(
+        f"<{nLabels + 1}I", data, snapshot.HEADER.size
+    )
+    start = snapshot.HEADER.size + 4 * (nLabels + 1) + offsets[-1]
+    start += snapshot._pad(start)
+    shown = struct.unpack_from(f"<{len(tensor.data)}d", data, start)
+
+    assert list(shown) == list(tensor.data)
+
+
+def test_big_endian_hosts_swap(tensor, tmp_path, monkeypatch):
+    path = tmp_path / "matrices.wswm"
+    snapshot.save(tensor, path)
+    little = path.read_bytes()
+
+    # on a little-endian host: everything is swapped twice
+    monkeypatch.setattr(snapshot, "LITTLE_ENDIAN", False)
+    snapshot.save(tensor, path)
+    assert path.read_bytes() != little
+    assert contents(snapshot.load(path)) == contents(tensor)
+
+
+def test_concurrent_saves_replace_atomically(tensor, tmp_path):
+    path = tmp_path / "matrices.wswm"
+    errors = []
+
+    def save():
+        try:
+            snapshot.save(tensor, path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert contents(snapshot.load(path)) == contents(tensor)
+    # no temporary files left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "friends.csv",
+        "matrices.wswm",
+    ]
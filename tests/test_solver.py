@@ -0,0 +1,40 @@
+"""
+HostRanker ranks the same with numpy as in pure Python.
+"""
+
+import random
+from math import inf
+
+import pytest
+
+from whereshallwemeet import solver
+from whereshallwemeet.solver import OBJECTIVES, HostRanker
+
+
+def test_numpy_ranks_like_python(monkeypatch):
+    pytest.importorskip("numpy")
+
+    rng = random.Random(7)
+    names = [f"f{i}" for i in range(30)]
+    hosts = [f"h{j}" for j in range(40)]
+    M = [
+        [inf if rng.random() < 0.02 else rng.uniform(0, 3600) for _ in hosts]
+        for _ in names
+    ]
+    # friends weighted 0 don't count, even where they can't get there
+    weights = {name: rng.choice((0, 1, 2.5)) for name in names}
+
+    monkeypatch.setattr(solver, "VECTORIZE", 1)
+    vectorized = HostRanker(M, names, hosts)
+    monkeypatch.setattr(solver, "VECTORIZE", inf)
+    plain = HostRanker(M, names, hosts)
+    assert vectorized._array is not None and plain._array is None
+
+    for objective in OBJECTIVES:
+        w = weights if objective == "weighted" else None
+        expected = plain.rank(objective, k=len(hosts), weights=w)
+        result = vectorized.rank(objective, k=len(hosts), weights=w)
+        assert [s.host for s in result] == [s.host for s in expected]
+        assert [s.score for s in result] == pytest.approx(
+            [s.score for s in expected]
+        )